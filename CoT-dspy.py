@@ -1,38 +1,271 @@
+import argparse
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
-from typing import List
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM
+from cascade import CascadeChainOfThought, CascadeConfig, CascadeStats, display_cascade_report
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List
+from dspy.adapters.utils import parse_value
+from dspy.utils.exceptions import AdapterParseError
+
+class ParseStats:
+    """시그니처별 출력 파싱 실패율 및 재시도율 집계"""
+    _lock = threading.Lock()
+    _counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {'calls': 0, 'parse_failures': 0, 'retries': 0})
+    
+    @classmethod
+    def record(cls, signature, event: str) -> None:
+        with cls._lock:
+            cls._counts[signature.signature][event] += 1
+    
+    @classmethod
+    def report(cls) -> Dict[str, Dict[str, float]]:
+        """시그니처별 호출 수와 실패율/재시도율 반환"""
+        with cls._lock:
+            return {
+                name: {
+                    **counts,
+                    'parse_failure_rate': counts['parse_failures'] / max(counts['calls'], 1),
+                    'retry_rate': counts['retries'] / max(counts['calls'], 1)
+                }
+                for name, counts in cls._counts.items()
+            }
+
+class SchemaViolation(ValueError):
+    """스트리밍 중 출력 필드가 스키마를 위반했을 때 발생"""
+
+class IncrementalFieldValidator:
+    """JSON 출력을 토큰 단위로 받아 필드가 완성되는 즉시 타입을 검증하는 파서
+    
+    최상위 객체의 "필드": 값 쌍이 끝나는 시점(쉼표 또는 닫는 중괄호)마다 해당 필드를
+    시그니처의 타입으로 검증하므로, 잘못된 출력은 생성이 끝나기 전에 중단할 수 있습니다.
+    변환 규칙은 JSONAdapter와 같은 parse_value를 사용하므로 어댑터가 받아들이는 출력(str 필드의 42 등)은
+    중단하지 않습니다.
+    """
+    
+    def __init__(self, signature):
+        self.signature = signature
+        self.annotations = {name: field.annotation for name, field in signature.output_fields.items()}
+        self.fields: Dict[str, Any] = {}
+        self.started = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.segment: List[str] = []
+    
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """청크를 추가하고 이번에 새로 완성된 필드들을 반환"""
+        completed = {}
+        for char in chunk:
+            if self.done:
+                break
+            if not self.started:
+                # 코드 펜스 등 JSON 객체 이전의 텍스트는 무시
+                self.started = char == '{'
+                self.depth = 1 if self.started else 0
+                continue
+            
+            if self.in_string:
+                self.segment.append(char)
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            
+            if char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+            elif char in ']}':
+                self.depth -= 1
+            
+            if self.depth == 0 or (self.depth == 1 and char == ','):
+                completed.update(self._complete_segment())
+                self.done = self.depth == 0
+            else:
+                self.segment.append(char)
+        return completed
+    
+    def _complete_segment(self) -> Dict[str, Any]:
+        text = ''.join(self.segment).strip()
+        self.segment = []
+        if not text:
+            return {}
+        try:
+            (name, raw_value), = json.loads('{' + text + '}').items()
+        except ValueError as e:
+            raise SchemaViolation(f"JSON 형식 오류: {text[:100]}") from e
+        
+        if name not in self.annotations:
+            raise SchemaViolation(f"시그니처에 없는 출력 필드입니다: {name}")
+        try:
+            value = parse_value(raw_value, self.annotations[name])
+        except ValueError as e:
+            raise SchemaViolation(f"필드 '{name}' 타입 오류: {e}") from e
+        
+        self.fields[name] = value
+        return {name: value}
+
+class TrackedJSONAdapter(dspy.JSONAdapter):
+    """JSON 스키마 기반 구조화 출력 모드 + 파싱 실패/재시도 집계 어댑터
+    
+    모델이 지원하면 response_format에 JSON 스키마를 지정하여 출력을 제약하고,
+    파싱에 실패하면 제한된 횟수만큼 재시도합니다.
+    """
+    
+    def __init__(self, max_retries: int = 1, **kwargs):
+        super().__init__(**kwargs)
+        self.max_retries = max_retries
+    
+    def __call__(self, lm, lm_kwargs, signature, demos, inputs):
+        # 실패율/재시도율의 분모는 시도 수가 아닌 시그니처 호출 수
+        ParseStats.record(signature, 'calls')
+        for attempt in range(self.max_retries + 1):
+            try:
+                # 재시도 시에는 캐시된 실패 응답을 다시 받지 않도록 캐시를 우회합니다.
+                call_kwargs = {**lm_kwargs, 'cache': False} if attempt else lm_kwargs
+                return super().__call__(lm, call_kwargs, signature, demos, inputs)
+            except AdapterParseError:
+                ParseStats.record(signature, 'parse_failures')
+                if attempt == self.max_retries:
+                    raise
+                ParseStats.record(signature, 'retries')
+
+class ValidatingStreamListener(dspy.streaming.StreamListener):
+    """필드 스트리밍과 함께 원본 청크를 IncrementalFieldValidator에 전달하는 리스너
+    
+    같은 예측기의 청크는 모든 리스너에 전달되므로 검증기는 리스너 하나에만 연결합니다.
+    동기 스트리밍은 백그라운드 스레드의 예외를 전달하지 않으므로, 위반은 violation에 기록한 뒤
+    예외로 생성을 중단시키고 호출 측에서 다시 발생시킵니다.
+    """
+    
+    def __init__(self, signature_field_name: str, validator: IncrementalFieldValidator):
+        super().__init__(signature_field_name=signature_field_name)
+        self.validator = validator
+        self.violation = None
+    
+    def receive(self, chunk):
+        if getattr(chunk, 'choices', None):
+            try:
+                self.validator.feed(chunk.choices[0].delta.content or '')
+            except SchemaViolation as e:
+                self.violation = e
+                raise
+        return super().receive(chunk)
 
 def setup_environment():
     """환경 설정 및 LM 초기화"""
     dotenv.load_dotenv()
-    lm = dspy.LM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
-    dspy.configure(lm=lm)
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    lm = CachedLM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
+    # 구조화 출력(JSON 스키마) 모드로 List[str] 등 타입 필드의 파싱 실패를 줄입니다.
+    dspy.configure(lm=lm, adapter=TrackedJSONAdapter())
 
-def create_math_solver():
-    """수학 문제 해결을 위한 ChainOfThought 시그니처 정의"""
+def create_math_solver(cascade_stats: CascadeStats = None):
+    """수학 문제 해결을 위한 ChainOfThought 시그니처 정의
+    
+    cascade_stats가 주어지면 기본 LM으로 초안 여러 개를 만들고 최종 수치가 일치하지 않을 때만
+    CascadeConfig.STRONG_MODEL로 다시 푸는 캐스케이드 모듈을 반환합니다.
+    """
     class MathProblemSolver(dspy.Signature):
         """수학 문제를 단계별로 해결합니다."""
         question: str = dspy.InputField(desc="수학 문제")
         steps: List[str] = dspy.OutputField(desc="문제 해결 단계")
         answer: str = dspy.OutputField(desc="최종 답안")
     
+    if cascade_stats is not None:
+        strong_lm = CachedLM(CascadeConfig.STRONG_MODEL, api_key=os.getenv('OPENAI_API_KEY'))
+        return CascadeChainOfThought(MathProblemSolver, draft_lm=dspy.settings.lm, strong_lm=strong_lm,
+                                     check='self_consistency', stats=cascade_stats)
     return dspy.ChainOfThought(MathProblemSolver)
 
-def solve_math_problems(problems: list[str]) -> None:
+def stream_solution(solver, problem: str):
+    """추론(reasoning)과 답(answer) 필드의 부분 출력을 생성되는 대로 반환
+    
+    필드 경계는 StreamListener가 토큰 단위로 파싱하며,
+    마지막에는 전체 결과가 담긴 dspy.Prediction을 반환합니다.
+    완성된 필드가 스키마를 위반하면 생성이 끝나기를 기다리지 않고 SchemaViolation으로 중단합니다.
+    """
+    validating = ValidatingStreamListener("reasoning", IncrementalFieldValidator(solver.predict.signature))
+    listeners = [validating, dspy.streaming.StreamListener(signature_field_name="answer")]
+    stream_solver = dspy.streamify(solver, stream_listeners=listeners, async_streaming=False)
+    yield from stream_solver(question=problem)
+    if validating.violation is not None:
+        ParseStats.record(solver.predict.signature, 'parse_failures')
+        raise validating.violation
+
+def solve_math_problems(problems: list[str], cascade: bool = False) -> None:
     """수학 문제 리스트를 해결하고 결과 출력"""
-    solver = create_math_solver()
+    cascade_stats = CascadeStats() if cascade else None
+    solver = create_math_solver(cascade_stats)
     
     for problem in problems:
-        result = solver(question=problem)
         print(f"\n문제: {problem}")
-        print("\n풀이 과정:")
+        
+        if cascade:
+            # 캐스케이드는 초안 검증 후에야 최종 답이 정해지므로 스트리밍 없이 결과만 출력
+            result = solver(question=problem)
+            tier = "초안 모델" if result.cascade_tier == 'draft' else "강한 모델"
+            print(f"\n추론 ({tier}):\n{result.reasoning}")
+            print("\n풀이 과정:")
+            for i, step in enumerate(result.steps, 1):
+                print(f"{i}. {step}")
+            print(f"\n답: {result.answer}\n")
+            print("-" * 50)
+            continue
+        
+        # 추론과 답은 생성되는 대로 출력하고, 풀이 단계 목록은 완성된 결과에서 출력
+        headers = {'reasoning': "\n추론:", 'answer': "\n\n답:"}
+        streamed = set()
+        result = None
+        try:
+            for output in stream_solution(solver, problem):
+                if isinstance(output, dspy.streaming.StreamResponse):
+                    if output.signature_field_name not in streamed:
+                        print(headers[output.signature_field_name])
+                        streamed.add(output.signature_field_name)
+                    print(output.chunk, end="", flush=True)
+                elif isinstance(output, dspy.Prediction):
+                    result = output
+        except SchemaViolation as e:
+            # 스키마 위반으로 중단된 응답은 버리고 파싱 재시도가 있는 일반 호출로 다시 풀이
+            print(f"\n⚠️ 출력 형식 오류로 스트리밍을 중단하고 다시 시도합니다: {e}")
+            streamed.clear()
+            result = solver(question=problem, config={'cache': False})
+            print(f"\n추론:\n{result.reasoning}")
+        
+        print("\n\n풀이 과정:")
         for i, step in enumerate(result.steps, 1):
             print(f"{i}. {step}")
-        print(f"\n답: {result.answer}\n")
+        if 'answer' not in streamed:
+            print(f"\n답: {result.answer}")
+        print()
         print("-" * 50)
+    
+    # 시그니처별 파싱 통계 출력
+    for name, stats in ParseStats.report().items():
+        print(f"📊 {name}: 호출 {stats['calls']}회, 파싱 실패율 {stats['parse_failure_rate']:.1%}, 재시도율 {stats['retry_rate']:.1%}")
+    if cascade_stats is not None:
+        display_cascade_report(cascade_stats)
 
 def main():
+    parser = argparse.ArgumentParser(description='ChainOfThought로 수학 문제 풀이')
+    parser.add_argument('--cascade', action='store_true',
+                        help=f'초안 모델로 먼저 풀고 답이 일치하지 않을 때만 {CascadeConfig.STRONG_MODEL}로 승격')
+    args = parser.parse_args()
+
     # 환경 설정
     setup_environment()
     
@@ -43,7 +276,7 @@ def main():
     ]
     
     # 문제 해결 실행
-    solve_math_problems(test_problems)
+    solve_math_problems(test_problems, args.cascade)
 
 if __name__ == "__main__":
     main()
@@ -1,28 +1,219 @@
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from dspy.primitives import python_interpreter
+from dspy.primitives.python_interpreter import InterpreterError, PythonInterpreter
+
+class SandboxConfig:
+    """Deno/Pyodide 인터프리터 풀 설정"""
+    POOL_SIZE = 4            # 미리 띄워둘 인터프리터 수
+    MEMORY_MB = 512          # 인터프리터 V8 힙 제한(MB)
+    EXEC_TIMEOUT = 10.0      # 실행 1회당 벽시계 시간 제한(초)
 
 def setup_environment():
     """환경 설정 및 LM 초기화"""
     dotenv.load_dotenv()
-    lm = dspy.LM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    lm = CachedLM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
     dspy.configure(lm=lm)
 
-def create_algorithm_designer():
+def _deno_command() -> List[str]:
+    """dspy 기본 실행 명령(runner.js, 읽기 권한만 허용)에 메모리 제한만 추가"""
+    runner = os.path.join(os.path.dirname(python_interpreter.__file__), "runner.js")
+    return ["deno", "run", "--allow-read", f"--v8-flags=--max-old-space-size={SandboxConfig.MEMORY_MB}", runner]
+
+# 예열 직후의 전역 이름공간과 builtins를 저장하는 코드 (runner.js가 매 실행마다 sys를 import함)
+SNAPSHOT_CODE = """
+def _pool_reset(saved_globals, saved_builtins, namespace=globals(), builtins=vars(sys.modules['builtins'])):
+    for table, saved in ((namespace, saved_globals), (builtins, saved_builtins)):
+        for name in [name for name in table if name not in saved]:
+            del table[name]
+        table.update(saved)
+_POOL_STATE = (dict(globals()), dict(vars(sys.modules['builtins'])))
+_POOL_STATE[0]['_POOL_STATE'] = _POOL_STATE
+"""
+
+# 저장해 둔 상태로 되돌리는 코드 (사용자 코드가 저장 상태를 망가뜨렸으면 실패하고 인터프리터를 교체함)
+RESET_CODE = "_pool_reset(*_POOL_STATE)"
+
+class InterpreterPool:
+    """미리 띄워둔 dspy.PythonInterpreter(Deno/Pyodide) 풀
+    
+    인터프리터 시작 비용의 대부분은 Pyodide 로딩이므로 백그라운드 스레드에서 미리 띄워두고
+    요청마다 하나씩 빌려줍니다. 반납된 인터프리터는 전역 변수와 builtins를 예열 직후 상태로
+    되돌린 뒤 다시 대기열에 넣고, 되돌릴 수 없거나 시간 제한으로 종료된 인터프리터만
+    새로 예열한 인터프리터로 교체합니다.
+    """
+    
+    def __init__(self, size: int = SandboxConfig.POOL_SIZE):
+        self.idle: "queue.Queue" = queue.Queue()
+        self.lock = threading.Lock()
+        self.live = set()
+        self.closed = False
+        self.warmers = ThreadPoolExecutor(max_workers=size)
+        for _ in range(size):
+            self.warmers.submit(self._warm)
+    
+    def _warm(self) -> None:
+        """새 인터프리터를 시작하고 Pyodide 로딩이 끝나면 대기열에 추가"""
+        interpreter = PythonInterpreter(deno_command=_deno_command())
+        with self.lock:
+            if self.closed:
+                return
+            self.live.add(interpreter)
+        try:
+            interpreter.execute("None")
+            interpreter.execute(SNAPSHOT_CODE)
+        except Exception as e:
+            # Deno 미설치 등으로 시작할 수 없으면 대기 중인 요청이 멈추지 않도록 오류를 전달
+            self.retire(interpreter)
+            self.idle.put(e)
+            return
+        self._make_idle(interpreter)
+    
+    def _make_idle(self, interpreter: PythonInterpreter) -> None:
+        if self.closed:
+            self.retire(interpreter)
+        else:
+            self.idle.put(interpreter)
+    
+    def _recycle(self, interpreter: PythonInterpreter) -> None:
+        """상태를 초기화하여 대기열에 되돌리고, 실패하면 새 인터프리터로 교체"""
+        try:
+            interpreter.execute(RESET_CODE)
+        except Exception:
+            self.retire(interpreter)
+            self._warm()
+            return
+        self._make_idle(interpreter)
+    
+    def acquire(self) -> PythonInterpreter:
+        item = self.idle.get()
+        if isinstance(item, Exception):
+            self.idle.put(item)
+            raise InterpreterError(f"샌드박스 인터프리터를 시작할 수 없습니다: {item}") from item
+        return item
+    
+    def retire(self, interpreter: PythonInterpreter) -> None:
+        """인터프리터 프로세스 종료"""
+        with self.lock:
+            self.live.discard(interpreter)
+        try:
+            interpreter.shutdown()
+        except OSError:
+            # 시간 초과로 이미 강제 종료된 프로세스
+            interpreter.deno_process = None
+    
+    def release(self, interpreter: PythonInterpreter) -> None:
+        """사용한 인터프리터를 백그라운드에서 초기화하여 재사용"""
+        if self.closed:
+            self.retire(interpreter)
+        else:
+            self.warmers.submit(self._recycle, interpreter)
+    
+    def discard(self, interpreter: PythonInterpreter) -> None:
+        """종료된 인터프리터를 버리고 새 인터프리터 예열 시작"""
+        self.retire(interpreter)
+        if not self.closed:
+            self.warmers.submit(self._warm)
+    
+    def close(self) -> None:
+        """예열을 멈추고 모든 인터프리터 종료"""
+        with self.lock:
+            self.closed = True
+            live = list(self.live)
+        self.warmers.shutdown(wait=False, cancel_futures=True)
+        for interpreter in live:
+            self.retire(interpreter)
+
+class PooledInterpreter:
+    """풀에서 빌린 인터프리터로 코드를 실행하는 PythonInterpreter 대체 구현
+    
+    ProgramOfThought는 인터프리터 하나를 모든 호출에서 공유하고 forward가 끝날 때마다
+    shutdown()을 호출하므로, 인터프리터는 스레드별로 빌리고 shutdown() 시 풀에 반납합니다.
+    한 forward 안의 재시도는 같은 인터프리터를 사용합니다.
+    """
+    
+    def __init__(self, pool: InterpreterPool):
+        self.pool = pool
+        self.local = threading.local()
+    
+    def execute(self, code: str, variables: Optional[Dict[str, Any]] = None) -> Any:
+        interpreter = getattr(self.local, "interpreter", None)
+        if interpreter is None:
+            interpreter = self.local.interpreter = self.pool.acquire()
+        
+        # 시간 제한을 넘기면 Deno 프로세스를 종료하고, 응답 없음 오류를 InterpreterError로 전달
+        # 실행이 끝난 뒤에 타이머가 울려 프로세스를 죽이지 않도록 종료 여부를 잠금으로 확인
+        guard = threading.Lock()
+        state = {'finished': False, 'timed_out': False}
+        def kill():
+            with guard:
+                if state['finished']:
+                    return
+                state['timed_out'] = True
+                process = interpreter.deno_process
+                if process is not None:
+                    process.kill()
+        timer = threading.Timer(SandboxConfig.EXEC_TIMEOUT, kill)
+        timer.start()
+        try:
+            return interpreter.execute(code, variables)
+        except InterpreterError:
+            if state['timed_out']:
+                raise InterpreterError(f"실행 시간 제한({SandboxConfig.EXEC_TIMEOUT}초)을 초과했습니다.")
+            raise
+        finally:
+            timer.cancel()
+            with guard:
+                state['finished'] = True
+            if state['timed_out']:
+                # 종료된 인터프리터는 버리고 다음 실행에서 예열된 인터프리터를 새로 빌림
+                self.pool.discard(interpreter)
+                self.local.interpreter = None
+    
+    def __call__(self, code: str, variables: Optional[Dict[str, Any]] = None) -> Any:
+        return self.execute(code, variables)
+    
+    def shutdown(self) -> None:
+        interpreter = getattr(self.local, "interpreter", None)
+        if interpreter is not None:
+            self.pool.release(interpreter)
+            self.local.interpreter = None
+
+def create_algorithm_designer(pool: InterpreterPool):
     """알고리즘 설계를 위한 ProgramOfThought 시그니처 정의"""
     class AlgorithmDesigner(dspy.Signature):
         """주어진 문제에 대한 알고리즘을 설계하고 구현 단계를 제시합니다."""
         problem: str = dspy.InputField(desc="해결할 문제")
         solution: str = dspy.OutputField(desc="알고리즘 설계 및 구현 상세 정보")
     
-    return dspy.ProgramOfThought(AlgorithmDesigner)
+    designer = dspy.ProgramOfThought(AlgorithmDesigner)
+    # 요청마다 Pyodide를 새로 로딩하는 대신 미리 예열된 인터프리터 사용
+    designer.interpreter = PooledInterpreter(pool)
+    return designer
 
-def solve_programming_problems(problems: list[str]) -> None:
-    """프로그래밍 문제를 해결하고 결과 출력"""
-    designer = create_algorithm_designer()
+def solve_programming_problems(problems: list[str], num_threads: int = SandboxConfig.POOL_SIZE) -> None:
+    """프로그래밍 문제를 동시에 해결하고 결과를 입력 순서대로 출력"""
+    pool = InterpreterPool()
+    try:
+        designer = create_algorithm_designer(pool)
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            results = list(executor.map(lambda problem: designer(problem=problem), problems))
+    finally:
+        pool.close()
     
-    for problem in problems:
-        result = designer(problem=problem)
+    for problem, result in zip(problems, results):
         print(f"\n문제: {problem}\n")
         print("해결 방안:")
         print(result.solution)
@@ -1,26 +1,223 @@
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM
 import datetime
+import ast
+import asyncio
+import math
+import operator
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+from litellm import ContextWindowExceededError
+
+logger = logging.getLogger(__name__)
+
+# 한 단계에서 동시에 실행할 수 있는 최대 도구 호출 수
+MAX_PARALLEL_TOOL_CALLS = 4
+
+class TrajectoryBudget:
+    """ReAct 궤적 길이 및 토큰 예산 설정"""
+    MAX_ITERS = 5                 # 최대 반복 횟수 (LM 왕복 수)
+    MAX_TOTAL_TOKENS = 6000       # 한 입력 처리에서 보내는 프롬프트(지시문, 입력, 궤적) 토큰 총량
+    KEEP_RECENT_STEPS = 2         # 원문 그대로 유지할 최근 단계 수
+    MAX_OBSERVATION_CHARS = 200   # 오래된 관찰 결과를 잘라낼 길이
+    MAX_KEPT_STEPS = 6            # 궤적에 남길 최대 단계 수 (그 이전은 요약 한 줄로 대체)
 
 def setup_environment():
     """환경 설정 및 LM 초기화"""
     dotenv.load_dotenv()
-    lm = dspy.LM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    lm = CachedLM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
     dspy.configure(lm=lm)
 
+def ttl_cache(ttl: float = 300.0, maxsize: int = 256):
+    """순수 도구 함수의 결과를 TTL 동안 메모이제이션하는 데코레이터
+    
+    같은 인자로 반복 호출되는 도구는 캐시된 결과를 바로 반환하므로
+    ReAct 궤적에서 중복된 도구 실행 시간을 줄일 수 있습니다.
+    부수 효과가 있거나 시간에 따라 값이 바뀌는 도구(get_current_time 등)에는 사용하지 않습니다.
+    
+    Args:
+        ttl: 캐시 항목의 유효 시간(초)
+        maxsize: 보관할 최대 항목 수 (초과 시 가장 오래 사용되지 않은 항목부터 제거)
+    """
+    def decorator(func: Callable) -> Callable:
+        cache: "OrderedDict[Any, tuple]" = OrderedDict()
+        lock = threading.Lock()
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                # calculate("1+1")과 calculate(expression="1+1")이 같은 항목을 쓰도록 인자를 정규화
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = (bound.args, tuple(sorted(bound.kwargs.items())))
+                hash(key)
+            except TypeError:
+                # 시그니처에 맞지 않거나 해시할 수 없는 인자는 캐시하지 않고 그대로 실행
+                return func(*args, **kwargs)
+            
+            now = time.monotonic()
+            with lock:
+                entry = cache.get(key)
+                if entry is not None:
+                    if now - entry[0] < ttl:
+                        cache.move_to_end(key)
+                        return entry[1]
+                    del cache[key]
+            
+            result = func(*args, **kwargs)
+            
+            with lock:
+                cache.pop(key, None)
+                while len(cache) >= maxsize:
+                    cache.popitem(last=False)
+                cache[key] = (now, result)
+            return result
+        
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+def _safe_round(number, ndigits=None):
+    """자릿수 인자를 제한한 round (큰 음수 자릿수는 10의 거대한 거듭제곱 계산을 유발)"""
+    if ndigits is None:
+        return round(number)
+    if not isinstance(ndigits, int) or abs(ndigits) > SafeEvalConfig.MAX_ROUND_DIGITS:
+        raise ValueError(f"반올림 자릿수가 허용 범위를 벗어났습니다: {ndigits}")
+    return round(number, ndigits)
+
+class SafeEvalConfig:
+    """안전한 수식 계산기 설정"""
+    MAX_EXPONENT = 1000           # 거듭제곱 지수 상한
+    MAX_POWER_BITS = 10000        # 정수 연산 결과의 최대 비트 수 (str() 변환 한도인 4300자리 미만)
+    MAX_EXPRESSION_LENGTH = 500   # 수식 최대 길이
+    MAX_ROUND_DIGITS = 100        # round()의 자릿수 인자 절댓값 상한
+    BINARY_OPS = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv,
+        ast.FloorDiv: operator.floordiv,
+        ast.Mod: operator.mod,
+        ast.Pow: operator.pow,
+    }
+    UNARY_OPS = {
+        ast.UAdd: operator.pos,
+        ast.USub: operator.neg,
+    }
+    FUNCTIONS = {
+        "abs": abs,
+        "round": _safe_round,
+        "min": min,
+        "max": max,
+        "sqrt": math.sqrt,
+    }
+    CONSTANTS = {
+        "pi": math.pi,
+        "e": math.e,
+    }
+
+def _safe_pow(base, exponent):
+    """지수 크기를 제한한 거듭제곱"""
+    if abs(exponent) > SafeEvalConfig.MAX_EXPONENT:
+        raise ValueError(f"지수가 너무 큽니다: {exponent}")
+    if isinstance(base, int) and isinstance(exponent, int) and base.bit_length() * exponent > SafeEvalConfig.MAX_POWER_BITS:
+        raise ValueError("거듭제곱 결과가 너무 큽니다.")
+    result = operator.pow(base, exponent)
+    if isinstance(result, complex):
+        # 음수의 분수 거듭제곱 등 실수 범위를 벗어난 결과는 계산기 결과로 내보내지 않음
+        raise ValueError("실수 범위를 벗어난 결과입니다.")
+    return result
+
+def _limit_int_size(op: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    """이항 연산 결과가 너무 큰 정수이면 ValueError (곱셈을 반복해 한도를 넘는 경우 방지)"""
+    def checked(left, right):
+        result = op(left, right)
+        if isinstance(result, int) and result.bit_length() > SafeEvalConfig.MAX_POWER_BITS:
+            raise ValueError("계산 결과가 너무 큽니다.")
+        return result
+    return checked
+
+def _build_evaluator(node: ast.AST) -> Callable[[], Any]:
+    """허용된 노드만으로 이루어진 AST를 계산 함수(클로저)로 변환"""
+    if isinstance(node, ast.Expression):
+        return _build_evaluator(node.body)
+    
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        value = node.value
+        return lambda: value
+    
+    if isinstance(node, ast.Name) and node.id in SafeEvalConfig.CONSTANTS:
+        value = SafeEvalConfig.CONSTANTS[node.id]
+        return lambda: value
+    
+    if isinstance(node, ast.BinOp) and type(node.op) in SafeEvalConfig.BINARY_OPS:
+        left, right = _build_evaluator(node.left), _build_evaluator(node.right)
+        op = _limit_int_size(_safe_pow if isinstance(node.op, ast.Pow) else SafeEvalConfig.BINARY_OPS[type(node.op)])
+        return lambda: op(left(), right())
+    
+    if isinstance(node, ast.UnaryOp) and type(node.op) in SafeEvalConfig.UNARY_OPS:
+        operand, op = _build_evaluator(node.operand), SafeEvalConfig.UNARY_OPS[type(node.op)]
+        return lambda: op(operand())
+    
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in SafeEvalConfig.FUNCTIONS and not node.keywords):
+        func = SafeEvalConfig.FUNCTIONS[node.func.id]
+        args = [_build_evaluator(arg) for arg in node.args]
+        return lambda: func(*(arg() for arg in args))
+    
+    raise ValueError(f"허용되지 않는 구문입니다: {type(node).__name__}")
+
+@functools.lru_cache(maxsize=1024)
+def _compile_normalized(normalized: str) -> Callable[[], Any]:
+    return _build_evaluator(ast.parse(normalized, mode="eval"))
+
+def compile_expression(expression: str) -> Callable[[], Any]:
+    """수식을 검증 후 계산 함수로 컴파일 (공백만 다른 변형은 같은 캐시 항목 사용)"""
+    if len(expression) > SafeEvalConfig.MAX_EXPRESSION_LENGTH:
+        raise ValueError("수식이 너무 깁니다.")
+    normalized = "".join(expression.replace("×", "*").replace("÷", "/").split())
+    return _compile_normalized(normalized)
+
+def safe_eval(expression: str) -> Any:
+    """eval 없이 AST 화이트리스트 기반으로 산술식을 계산"""
+    return compile_expression(expression)()
+
 # 개별 도구 함수들을 정의
 def get_current_time():
     """현재 시간을 반환합니다."""
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+@ttl_cache(ttl=3600)
 def calculate(expression: str):
     """간단한 수식을 계산합니다."""
     try:
-        return eval(expression)
-    except:
+        return safe_eval(expression)
+    except (ValueError, SyntaxError, TypeError, ArithmeticError):
         return "계산할 수 없는 수식입니다."
 
+def calculate_batch(expressions: list[str]) -> list:
+    """여러 수식을 한 번에 계산합니다. 같은 수식은 한 번만 계산합니다."""
+    results = {}
+    for expression in dict.fromkeys(expressions):
+        results[expression] = calculate(expression)
+    return [str(results[expression]) for expression in expressions]
+
+@ttl_cache(ttl=600)
 def search_weather(city: str):
     """도시의 날씨를 검색합니다 (예시 데이터)."""
     weather_data = {
@@ -30,6 +227,186 @@ def search_weather(city: str):
     }
     return weather_data.get(city, "날씨 정보를 찾을 수 없습니다.")
 
+def execute_tool_calls(tools: Dict[str, Callable], calls: List[Dict[str, Any]]) -> List[Any]:
+    """서로 독립적인 도구 호출들을 동시에 실행하고 호출 순서대로 결과 반환
+    
+    동기 도구는 스레드 풀에서, 비동기 도구는 하나의 asyncio 이벤트 루프에서 함께 실행합니다.
+    개별 호출이 실패해도 나머지 결과는 유지되며, 실패한 자리에는 오류 메시지가 들어갑니다.
+    """
+    results: List[Any] = [None] * len(calls)
+    sync_calls, async_calls = [], []
+    
+    for i, call in enumerate(calls):
+        name = call.get("tool_name")
+        args = call.get("tool_args") or {}
+        if name not in tools:
+            results[i] = f"알 수 없는 도구입니다: {name}"
+        elif inspect.iscoroutinefunction(tools[name]):
+            async_calls.append((i, name, args))
+        else:
+            sync_calls.append((i, name, args))
+    
+    async def run_async_calls():
+        # 인자가 잘못된 호출은 코루틴 생성 단계에서 실패하므로 호출마다 따로 만들어 해당 호출의 오류로만 처리
+        indices, coroutines, outcomes = [], [], []
+        for i, name, args in async_calls:
+            try:
+                coroutines.append(tools[name](**args))
+                indices.append(i)
+            except Exception as e:
+                outcomes.append((i, e))
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+        return outcomes + list(zip(indices, results))
+    
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOL_CALLS) as executor:
+        futures = [(i, name, executor.submit(tools[name], **args)) for i, name, args in sync_calls]
+        async_future = executor.submit(asyncio.run, run_async_calls()) if async_calls else None
+        
+        for i, name, future in futures:
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = f"{name} 실행 오류: {str(e)}"
+        
+        if async_future is not None:
+            for i, outcome in async_future.result():
+                if isinstance(outcome, Exception):
+                    outcome = f"{calls[i]['tool_name']} 실행 오류: {str(outcome)}"
+                results[i] = outcome
+    
+    return results
+
+def make_parallel_tool(tools: List[Callable]) -> Callable:
+    """여러 도구 호출을 한 단계에서 동시에 실행하는 ReAct용 도구 생성"""
+    tool_map = {tool.__name__: tool for tool in tools}
+    
+    def run_tools_in_parallel(calls: list[dict]) -> list:
+        """서로 의존성이 없는 여러 도구 호출을 한 번에 동시에 실행합니다.
+        calls는 [{"tool_name": "search_weather", "tool_args": {"city": "서울"}}, ...] 형식의 리스트입니다."""
+        # 궤적 포맷터가 리스트 항목을 문자열로 다루므로 결과를 문자열로 변환
+        return [str(result) for result in execute_tool_calls(tool_map, calls)]
+    
+    return run_tools_in_parallel
+
+def estimate_tokens(text: str) -> int:
+    """문자 수 기반의 대략적인 토큰 수 추정"""
+    return len(text) // 3 + 1
+
+class BudgetedReAct(dspy.ReAct):
+    """반복/토큰 예산, 조기 종료, 궤적 압축을 지원하는 ReAct 모듈
+    
+    - 반복 횟수와 누적 프롬프트 토큰(지시문, 입력 필드, 궤적)이 예산을 넘으면 루프를 멈추고 바로 최종 응답을 추출합니다.
+    - 모델이 answer_ready로 "이번 도구 결과면 답을 낼 수 있다"고 표시했거나, 같은 도구 호출이 반복되면
+      finish를 고르기 위한 LM 왕복 없이 조기 종료합니다.
+    - 최근 단계만 원문으로 유지하고 오래된 관찰 결과는 잘라내어 단계별 프롬프트 크기를 제한합니다.
+    """
+    
+    def __init__(self, signature, tools, max_iters: int = TrajectoryBudget.MAX_ITERS,
+                 max_total_tokens: int = TrajectoryBudget.MAX_TOTAL_TOKENS):
+        super().__init__(signature, tools, max_iters=max_iters)
+        self.max_total_tokens = max_total_tokens
+        # 도구 선택과 함께 충분성 판단을 받아, 결과만 기다리면 되는 경우 finish 선택 왕복을 생략
+        self.react = dspy.Predict(self.react.signature.append(
+            "answer_ready",
+            dspy.OutputField(desc="이번 도구 결과만 받으면 추가 도구 호출 없이 모든 출력을 만들 수 있으면 True, "
+                                  "질문의 다른 부분에 아직 도구가 필요하면 False"),
+            type_=bool
+        ))
+    
+    def compact_trajectory(self, trajectory: Dict[str, Any]) -> Dict[str, Any]:
+        """오래된 단계를 요약/절단하여 궤적 크기를 일정하게 유지"""
+        steps = sorted({int(key.rsplit("_", 1)[1]) for key in trajectory})
+        if len(steps) <= TrajectoryBudget.KEEP_RECENT_STEPS:
+            return trajectory
+        
+        dropped = steps[:-TrajectoryBudget.MAX_KEPT_STEPS]
+        recent = set(steps[-TrajectoryBudget.KEEP_RECENT_STEPS:])
+        compacted = {}
+        if dropped:
+            used_tools = ", ".join(str(trajectory.get(f"tool_name_{idx}")) for idx in dropped)
+            compacted["summary"] = f"이전 {len(dropped)}단계 생략 (사용한 도구: {used_tools})"
+        
+        for idx in steps[len(dropped):]:
+            for field in ("thought", "tool_name", "tool_args", "observation"):
+                key = f"{field}_{idx}"
+                if key not in trajectory:
+                    continue
+                value = trajectory[key]
+                if field == "observation" and idx not in recent:
+                    value = str(value)
+                    if len(value) > TrajectoryBudget.MAX_OBSERVATION_CHARS:
+                        value = value[:TrajectoryBudget.MAX_OBSERVATION_CHARS] + "...(생략)"
+                compacted[key] = value
+        return compacted
+    
+    def _format_trajectory(self, trajectory: Dict[str, Any]):
+        return super()._format_trajectory(self.compact_trajectory(trajectory))
+    
+    def _call_with_potential_trajectory_truncation(self, module, trajectory, formatted_trajectory: str = None,
+                                                   **input_args):
+        """이미 포맷한 궤적 문자열이 있으면 재사용 (컨텍스트 초과로 궤적을 줄인 뒤에만 다시 포맷)"""
+        for _ in range(3):
+            if formatted_trajectory is None:
+                formatted_trajectory = self._format_trajectory(trajectory)
+            try:
+                return module(**input_args, trajectory=formatted_trajectory)
+            except ContextWindowExceededError:
+                logger.warning("궤적이 컨텍스트 길이를 넘어 가장 오래된 도구 호출을 잘라냅니다.")
+                trajectory = self.truncate_trajectory(trajectory)
+                formatted_trajectory = None
+        raise ValueError("궤적을 3번 잘라낸 뒤에도 컨텍스트 길이를 넘었습니다.")
+    
+    def forward(self, **input_args):
+        trajectory = {}
+        max_iters = input_args.pop("max_iters", self.max_iters)
+        used_tokens = 0
+        seen_calls = set()
+        # 매 단계 함께 전송되는 지시문과 입력 필드 (궤적만 세면 실제 전송량보다 적게 집계됨)
+        fixed_tokens = estimate_tokens(self.react.signature.instructions +
+                                       "".join(str(value) for value in input_args.values()))
+        
+        for idx in range(max_iters):
+            formatted_trajectory = self._format_trajectory(trajectory)
+            used_tokens += fixed_tokens + estimate_tokens(formatted_trajectory)
+            if used_tokens > self.max_total_tokens:
+                logger.warning("토큰 예산 초과 (%d/%d), 궤적을 종료합니다.", used_tokens, self.max_total_tokens)
+                break
+            
+            try:
+                pred = self._call_with_potential_trajectory_truncation(self.react, trajectory, formatted_trajectory,
+                                                                       **input_args)
+            except ValueError as e:
+                logger.warning("유효한 다음 단계를 만들지 못해 궤적을 종료합니다: %s", e)
+                break
+            
+            trajectory[f"thought_{idx}"] = pred.next_thought
+            trajectory[f"tool_name_{idx}"] = pred.next_tool_name
+            trajectory[f"tool_args_{idx}"] = pred.next_tool_args
+            
+            if pred.next_tool_name == "finish":
+                trajectory[f"observation_{idx}"] = "Completed."
+                break
+            
+            # 같은 도구를 같은 인자로 다시 호출하면 새 정보가 없으므로 종료
+            call_key = (pred.next_tool_name, str(sorted(pred.next_tool_args.items())))
+            if call_key in seen_calls:
+                trajectory[f"observation_{idx}"] = "이미 수행한 호출입니다."
+                break
+            seen_calls.add(call_key)
+            
+            try:
+                trajectory[f"observation_{idx}"] = self.tools[pred.next_tool_name](**pred.next_tool_args)
+            except Exception as e:
+                trajectory[f"observation_{idx}"] = f"{pred.next_tool_name} 실행 오류: {str(e)}"
+                continue
+            
+            # 모델이 이 결과로 답을 낼 수 있다고 판단한 경우에만 finish 선택 왕복 없이 종료
+            if pred.answer_ready:
+                break
+        
+        extract = self._call_with_potential_trajectory_truncation(self.extract, trajectory, **input_args)
+        return dspy.Prediction(trajectory=trajectory, **extract)
+
 def create_assistant():
     """ReAct 기반 어시스턴트 생성"""
     class Assistant(dspy.Signature):
@@ -40,8 +417,10 @@ def create_assistant():
         response: str = dspy.OutputField(desc="최종 응답")
     
     # 도구들을 리스트로 전달
-    tools = [get_current_time, calculate, search_weather]
-    return dspy.ReAct(Assistant, tools)
+    tools = [get_current_time, calculate, calculate_batch, search_weather]
+    # 독립적인 호출을 한 단계에서 병렬로 처리할 수 있도록 병렬 실행 도구 추가
+    tools.append(make_parallel_tool(tools))
+    return BudgetedReAct(Assistant, tools)
 
 def process_user_input(assistant, user_input: str) -> None:
     """사용자 입력을 처리하고 결과 출력"""
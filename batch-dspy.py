@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
+import dspy
+from columnar import ColumnType, PredictionTable
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+class BatchConfig:
+    """배치 실행 설정"""
+    CONCURRENCY = 8          # 동시 실행 수
+    MAX_ATTEMPTS = 3         # 항목별 최대 시도 횟수 (실패 항목은 다음 실행에서 재시도)
+    PARQUET_BATCH_ROWS = 1000  # Parquet 입력/출력 시 한 번에 처리할 행 수
+    PROGRESS_EVERY = 100     # 진행 상황 출력 간격(완료 항목 수)
+
+def load_script(filename: str):
+    """하이픈이 포함된 예제 스크립트를 모듈로 로드 (main()은 실행되지 않음)"""
+    path = SCRIPT_DIR / filename
+    module_name = path.stem.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def _require_pyarrow():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet 입출력에는 pyarrow가 필요합니다: pip install pyarrow") from e
+    return pq
+
+def read_inputs(path: str) -> Iterator[Dict[str, Any]]:
+    """JSONL 또는 Parquet 입력을 한 행씩 스트리밍 (전체를 메모리에 올리지 않음)"""
+    if path.endswith('.parquet'):
+        pq = _require_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=BatchConfig.PARQUET_BATCH_ROWS):
+            yield from batch.to_pylist()
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def item_key(index: int, row: Dict[str, Any]) -> str:
+    """입력 위치와 내용으로 항목 키 생성 (입력 파일이 바뀌면 다른 항목으로 취급)"""
+    digest = hashlib.sha1(json.dumps(row, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f"{index}:{digest[:16]}"
+
+def to_record(output: Any) -> Dict[str, Any]:
+    """Prediction/dict 출력을 JSON으로 저장 가능한 dict로 변환"""
+    if isinstance(output, dspy.Prediction):
+        output = output.toDict()
+    if not isinstance(output, dict):
+        output = {'output': output}
+    return json.loads(json.dumps(output, ensure_ascii=False, default=str))
+
+class Checkpoint:
+    """완료/실패 항목을 기록하는 SQLite 체크포인트
+
+    항목마다 즉시 커밋하므로 작업이 중단되어도 완료된 항목(유료 LM 호출)은 다시 실행하지 않습니다.
+    WAL 모드를 사용하여 쓰기 도중 중단되어도 파일이 손상되지 않습니다.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                key TEXT PRIMARY KEY,
+                idx INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                input TEXT NOT NULL,
+                output TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                exported INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def load_state(self) -> Dict[str, Tuple[str, int]]:
+        """항목 키 -> (상태, 시도 횟수)"""
+        return {key: (status, attempts)
+                for key, status, attempts in self.conn.execute('SELECT key, status, attempts FROM items')}
+
+    def record(self, key: str, index: int, row: Dict[str, Any],
+               output: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        status = 'done' if error is None else 'failed'
+        self.conn.execute("""
+            INSERT INTO items (key, idx, status, input, output, error, attempts, updated)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                status = excluded.status, output = excluded.output, error = excluded.error,
+                attempts = items.attempts + 1, updated = excluded.updated
+        """, (key, index, status, json.dumps(row, ensure_ascii=False, default=str),
+              json.dumps(output, ensure_ascii=False) if output is not None else None, error, time.time()))
+        self.conn.commit()
+
+    def unexported(self) -> Iterator[Tuple[str, int, Dict[str, Any], Dict[str, Any]]]:
+        """완료되었지만 아직 출력 파일에 쓰지 않은 항목 (출력 직전에 중단된 경우)"""
+        rows = self.conn.execute(
+            "SELECT key, idx, input, output FROM items WHERE status = 'done' AND exported = 0 ORDER BY idx")
+        for key, index, row, output in rows.fetchall():
+            yield key, index, json.loads(row), json.loads(output)
+
+    def mark_exported(self, keys: Iterable[str]) -> None:
+        """출력 파일에 완전히 기록된 항목 표시 (한 번의 커밋)"""
+        self.conn.executemany('UPDATE items SET exported = 1 WHERE key = ?', ((key,) for key in keys))
+        self.conn.commit()
+
+    def summary(self) -> Dict[str, int]:
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM items GROUP BY status').fetchall())
+
+    def close(self) -> None:
+        self.conn.close()
+
+class ResultWriter:
+    """완료된 결과를 출력 파일에 스트리밍 (JSONL은 줄 단위, Parquet은 행 그룹 단위로 기록)
+
+    write()와 close()는 이번에 파일에 완전히 기록된 항목 키 목록을 반환하며, 체크포인트의
+    exported 표시는 이 키들에 대해서만 합니다. 버퍼에만 있던 항목은 중단 후 재실행 시 다시 기록됩니다.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        # 행 그룹 버퍼: 행마다 dict를 유지하지 않고 열 단위로 쌓음 (input/output은 JSON 문자열 열)
+        self.buffer = PredictionTable({'index': ColumnType.INT, 'input': ColumnType.JSON, 'output': ColumnType.JSON})
+        self.pending_keys: List[str] = []
+        if self.parquet:
+            self.pq = _require_pyarrow()
+            # Parquet 파일은 footer를 쓰기 전까지 읽을 수 없으므로 행 그룹마다 완결된 part 파일을 만듭니다.
+            # (결과는 pyarrow.parquet.read_table(glob) 또는 디렉터리 단위 데이터셋으로 읽음)
+            stem = Path(path)
+            stem.parent.mkdir(parents=True, exist_ok=True)
+            # 같은 초에 다시 실행해도 이미 기록된 part 파일을 덮어쓰지 않도록 실행마다 고유한 접두어 사용
+            # (시각을 앞에 두어 이름순 정렬이 기록 순서와 같도록 함)
+            self.part_prefix = str(stem.with_name(f"{stem.stem}.part-{int(time.time())}-{uuid.uuid4().hex[:12]}"))
+            self.part_suffix = stem.suffix
+            self.parts = 0
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, key: str, index: int, row: Dict[str, Any], output: Dict[str, Any]) -> List[str]:
+        record = {'index': index, 'input': row, 'output': output}
+        if not self.parquet:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.file.flush()
+            return [key]
+        self.buffer.append(record)
+        self.pending_keys.append(key)
+        if len(self.buffer) >= BatchConfig.PARQUET_BATCH_ROWS:
+            return self._flush_parquet()
+        return []
+
+    def _flush_parquet(self) -> List[str]:
+        if not len(self.buffer):
+            return []
+        # 열 버퍼를 복사 없이 Arrow 테이블로 감싸 임시 파일에 기록한 뒤 이름을 바꿔 완결된 파일만 남김
+        path = f"{self.part_prefix}-{self.parts:05d}{self.part_suffix}"
+        table = self.buffer.to_arrow()
+        self.pq.write_table(table, f"{path}.tmp")
+        del table
+        os.replace(f"{path}.tmp", path)
+        self.parts += 1
+        self.buffer.clear()
+        written, self.pending_keys = self.pending_keys, []
+        return written
+
+    def close(self) -> List[str]:
+        if self.parquet:
+            return self._flush_parquet()
+        self.file.close()
+        return []
+
+def run_batch(program, input_path: str, output_path: str, checkpoint_path: Optional[str] = None,
+              concurrency: int = BatchConfig.CONCURRENCY, input_fields: Optional[list] = None) -> Dict[str, int]:
+    """입력 파일의 모든 항목을 program으로 실행하고 결과를 스트리밍 저장
+
+    이미 완료된 항목과 최대 시도 횟수를 넘긴 실패 항목은 건너뛰므로, 같은 명령을 다시 실행하면
+    중단된 지점부터 이어서 처리합니다.
+    """
+    checkpoint = Checkpoint(checkpoint_path or f"{output_path}.checkpoint.sqlite")
+    writer = ResultWriter(output_path)
+    state = checkpoint.load_state()
+    counts = {'done': 0, 'failed': 0, 'skipped': 0}
+
+    # 이전 실행에서 체크포인트에는 기록되었지만 출력 파일에 쓰지 못한 결과부터 기록
+    for key, index, row, output in checkpoint.unexported():
+        checkpoint.mark_exported(writer.write(key, index, row, output))
+
+    def run_one(row: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = {field: row[field] for field in input_fields} if input_fields else row
+        return to_record(program(**inputs))
+
+    def handle(future, key: str, index: int, row: Dict[str, Any]) -> None:
+        # 체크포인트와 출력 파일은 메인 스레드에서만 기록
+        try:
+            output, error = future.result(), None
+        except Exception as e:
+            output, error = None, f"{type(e).__name__}: {e}"
+        checkpoint.record(key, index, row, output, error)
+        if error is None:
+            checkpoint.mark_exported(writer.write(key, index, row, output))
+            counts['done'] += 1
+        else:
+            counts['failed'] += 1
+            print(f"⚠️ 항목 {index} 실패: {error[:120]}")
+        finished = counts['done'] + counts['failed']
+        if finished % BatchConfig.PROGRESS_EVERY == 0:
+            print(f"🔄 진행 중: 완료 {counts['done']}, 실패 {counts['failed']}, 건너뜀 {counts['skipped']}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = {}
+            for index, row in enumerate(read_inputs(input_path)):
+                key = item_key(index, row)
+                status, attempts = state.get(key, (None, 0))
+                if status == 'done' or attempts >= BatchConfig.MAX_ATTEMPTS:
+                    counts['skipped'] += 1
+                    continue
+
+                # 동시 실행 중인 항목 수를 제한하여 입력 크기와 무관하게 메모리 사용량 유지
+                if len(in_flight) >= concurrency * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle(future, *in_flight.pop(future))
+                in_flight[executor.submit(run_one, row)] = (key, index, row)
+
+            for future in list(in_flight):
+                handle(future, *in_flight.pop(future))
+    finally:
+        checkpoint.mark_exported(writer.close())
+        counts['checkpoint'] = checkpoint.summary()
+        checkpoint.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='예제 프로그램을 대량 입력에 대해 중단/재개 가능하게 실행')
+    parser.add_argument('--script', default='predict-dspy.py', help='프로그램을 정의한 예제 스크립트')
+    parser.add_argument('--factory', default='create_sentiment_classifier', help='인자 없이 프로그램을 만드는 함수 이름')
+    parser.add_argument('--input', required=True, help='입력 파일 (.jsonl 또는 .parquet)')
+    parser.add_argument('--output', required=True, help='결과 파일 (.jsonl 또는 .parquet)')
+    parser.add_argument('--checkpoint', help='체크포인트 SQLite 경로 (기본: <output>.checkpoint.sqlite)')
+    parser.add_argument('--concurrency', type=int, default=BatchConfig.CONCURRENCY)
+    parser.add_argument('--input-fields', nargs='+', help='프로그램에 전달할 입력 필드 (기본: 행의 모든 필드)')
+    parser.add_argument('--base-url', help='OpenAI 호환 서버 주소 (지정 시 스크립트의 setup_environment 대신 사용)')
+    args = parser.parse_args()
+
+    script = load_script(args.script)
+    if args.base_url:
+        dspy.configure(lm=dspy.LM('openai/mock-model', api_base=args.base_url, api_key='mock'))
+    elif hasattr(script, 'setup_environment'):
+        script.setup_environment()
+    program = getattr(script, args.factory)()
+
+    print(f"🚀 배치 실행 시작: {args.input} → {args.output} (동시성 {args.concurrency})")
+    started = time.perf_counter()
+    counts = run_batch(program, args.input, args.output, args.checkpoint, args.concurrency, args.input_fields)
+    elapsed = time.perf_counter() - started
+
+    print("\n" + "="*50)
+    print(f"✅ 이번 실행 완료: {counts['done']}건, 실패: {counts['failed']}건, 건너뜀: {counts['skipped']}건")
+    print(f"💾 체크포인트 누적 상태: {counts['checkpoint']}")
+    print(f"⏱️ 소요 시간: {elapsed:.1f}초")
+    print("="*50)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import importlib.util
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
+import dspy
+from http_pool import configure_http_pool, connection_stats
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+class BenchmarkConfig:
+    """벤치마크 설정"""
+    CONCURRENCY = 8        # 동시 실행 수
+    REQUESTS = 40          # 프로그램별 총 요청 수
+    SAMPLE_CORPUS = [
+        "리눅스는 가상 메모리와 페이지 캐시를 사용하여 메모리를 관리합니다.",
+        "클라우드 컴퓨팅은 필요한 만큼 컴퓨팅 자원을 빌려 쓰는 방식입니다.",
+        "블록체인은 분산 원장 기술로 거래 기록을 여러 노드에 저장합니다.",
+        "인공지능 윤리는 공정성, 투명성, 책임성을 다룹니다.",
+    ]
+
+def load_script(filename: str):
+    """하이픈이 포함된 예제 스크립트를 모듈로 로드 (main()은 실행되지 않음)"""
+    path = SCRIPT_DIR / filename
+    module_name = path.stem.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def build_rag(base_url: str, cleanup: List[Callable]):
+    rag_script = load_script('rag_with_signature.py')
+    embedder = dspy.Embedder('openai/text-embedding-3-small', api_base=base_url, api_key='mock',
+                             dimensions=64, caching=False)
+    retriever = dspy.retrievers.Embeddings(embedder=embedder, corpus=BenchmarkConfig.SAMPLE_CORPUS, k=2)
+    return rag_script.RAG(retriever)
+
+def build_pot(base_url: str, cleanup: List[Callable]):
+    pot_script = load_script('PoT-dspy.py')
+    pool = pot_script.InterpreterPool()
+    cleanup.append(pool.close)
+    return pot_script.create_algorithm_designer(pool)
+
+# 프로그램 이름 -> (프로그램 생성 함수, 입력 목록)
+PROGRAMS: Dict[str, Any] = {
+    'predict': (
+        lambda base_url, cleanup: load_script('predict-dspy.py').create_sentiment_classifier(),
+        [{'text': "오늘 날씨가 정말 좋아서 기분이 너무 좋아요!"}, {'text': "시험에 떨어져서 너무 실망스럽네요."}]
+    ),
+    'cot': (
+        lambda base_url, cleanup: load_script('CoT-dspy.py').create_math_solver(),
+        [{'question': "철수가 사과 5개를 가지고 있었습니다. 영희가 3개를 더 주었습니다. 몇 개인가요?"}]
+    ),
+    'simple': (
+        lambda base_url, cleanup: load_script('dspy-simple.py').create_answer_module(),
+        [{'question': "대한민국의 수도는 어디인가요?"}]
+    ),
+    'pot': (
+        build_pot,
+        [{'problem': "두 문자열이 서로 애너그램인지 확인하는 알고리즘을 설계하세요."}]
+    ),
+    'react': (
+        lambda base_url, cleanup: load_script('ReAct-dspy.py').create_assistant(),
+        [{'user_input': "지금 몇 시야?"}, {'user_input': "서울 날씨 어때?"}]
+    ),
+    'rag': (
+        build_rag,
+        [{'question': "리눅스의 메모리 관리 방식은?"}, {'question': "클라우드 컴퓨팅의 장단점은?"}]
+    ),
+    'multichain': (
+        lambda base_url, cleanup: load_script('multichaincomparison-dspy.py').MathProblemSolver(),
+        [{'question': "어떤 수에 7을 더하면 15가 됩니다. 이 수를 구하세요."}]
+    ),
+}
+
+def percentile(values: List[float], pct: float) -> float:
+    """nearest-rank 방식 백분위수"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def failed_result(name: str, total_requests: int, error: str) -> Dict[str, Any]:
+    """프로그램 생성에 실패한 경우의 결과 (모든 요청을 오류로 집계)"""
+    return {
+        'program': name,
+        'requests': total_requests,
+        'errors': total_requests,
+        'first_error': error,
+        'p50': float('nan'),
+        'p95': float('nan'),
+        'p99': float('nan'),
+        'throughput': 0.0,
+        'lm_calls_per_request': 0.0,
+        'tokens_per_request': 0.0,
+        'connection_reuse': 0.0,
+    }
+
+def run_benchmark(name: str, base_url: str, concurrency: int, total_requests: int) -> Dict[str, Any]:
+    """하나의 프로그램을 동시 실행하며 지연 시간, 처리량, 토큰 사용량 측정"""
+    build_program, inputs = PROGRAMS[name]
+    lm = dspy.LM('openai/mock-model', api_base=base_url, api_key='mock', cache=False)
+    dspy.configure(lm=lm, adapter=dspy.ChatAdapter())
+
+    cleanup: List[Callable] = []
+    try:
+        program = build_program(base_url, cleanup)
+    except Exception as e:
+        # 프로그램을 만들 수 없어도 다른 프로그램의 결과는 출력되도록 전체 요청을 오류로 기록
+        for close in cleanup:
+            close()
+        return failed_result(name, total_requests, f"{type(e).__name__}: {e}")
+    connections_before = connection_stats()
+
+    def run_one(i: int):
+        start = time.perf_counter()
+        try:
+            program(**inputs[i % len(inputs)])
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(run_one, range(total_requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        for close in cleanup:
+            close()
+
+    latencies = [latency for latency, error in outcomes if error is None]
+    errors = [error for _, error in outcomes if error is not None]
+    total_tokens = sum((entry.get('usage') or {}).get('total_tokens', 0) for entry in lm.history)
+    connections_after = connection_stats()
+    http_requests = connections_after['requests'] - connections_before['requests']
+    new_connections = connections_after['new_connections'] - connections_before['new_connections']
+
+    return {
+        'program': name,
+        'requests': total_requests,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'lm_calls_per_request': len(lm.history) / total_requests,
+        'tokens_per_request': total_tokens / total_requests,
+        'connection_reuse': 1 - new_connections / http_requests if http_requests else 0.0,
+    }
+
+def display_results(results: List[Dict[str, Any]]) -> None:
+    """결과 표 출력"""
+    print("\n" + "="*110)
+    print(f"{'프로그램':<12}{'요청':>6}{'오류':>6}{'p50(s)':>10}{'p95(s)':>10}{'p99(s)':>10}"
+          f"{'req/s':>10}{'LM호출/req':>12}{'토큰/req':>12}{'연결재사용':>10}")
+    print("-"*110)
+    for r in results:
+        print(f"{r['program']:<12}{r['requests']:>6}{r['errors']:>6}{r['p50']:>10.3f}{r['p95']:>10.3f}"
+              f"{r['p99']:>10.3f}{r['throughput']:>10.2f}{r['lm_calls_per_request']:>12.1f}{r['tokens_per_request']:>12.0f}"
+              f"{r['connection_reuse']:>10.1%}")
+        if r['first_error']:
+            print(f"  ⚠️ {r['first_error'][:90]}")
+    print("="*110)
+
+def main():
+    parser = argparse.ArgumentParser(description='모의 LM 서버 기반 예제 프로그램 부하 테스트')
+    parser.add_argument('--programs', nargs='+', choices=list(PROGRAMS), default=list(PROGRAMS))
+    parser.add_argument('--concurrency', type=int, default=BenchmarkConfig.CONCURRENCY)
+    parser.add_argument('--requests', type=int, default=BenchmarkConfig.REQUESTS)
+    parser.add_argument('--base-url', help='이미 실행 중인 OpenAI 호환 서버 주소 (없으면 내장 모의 서버 실행)')
+    parser.add_argument('--latency-mean', type=float, help='내장 모의 서버의 평균 지연(초)')
+    parser.add_argument('--error-rate', type=float, help='내장 모의 서버의 500 오류 비율')
+    parser.add_argument('--rate-limit-rate', type=float, help='내장 모의 서버의 429 비율')
+    parser.add_argument('--output', help='결과를 저장할 JSON 파일 경로')
+    args = parser.parse_args()
+
+    base_url = args.base_url
+    server = None
+    if base_url is None:
+        mock_server = load_script('mockserver-dspy.py')
+        config = mock_server.MockServerConfig
+        if args.latency_mean is not None:
+            config.LATENCY_MEAN = args.latency_mean
+        if args.error_rate is not None:
+            config.ERROR_RATE = args.error_rate
+        if args.rate_limit_rate is not None:
+            config.RATE_LIMIT_RATE = args.rate_limit_rate
+        server, base_url = mock_server.start_mock_server(port=0)
+        print(f"🧪 내장 모의 서버 시작: {base_url}")
+
+    # 모든 프로그램이 같은 연결 풀을 공유하도록 설정
+    configure_http_pool(max_connections=max(args.concurrency * 2, 10))
+
+    results = []
+    try:
+        for name in args.programs:
+            print(f"🔄 벤치마크 실행 중: {name} (동시성 {args.concurrency}, 요청 {args.requests})")
+            results.append(run_benchmark(name, base_url, args.concurrency, args.requests))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    display_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 결과 저장: {args.output}")
+
+if __name__ == "__main__":
+    main()
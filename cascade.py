@@ -0,0 +1,156 @@
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from fractions import Fraction
+from typing import Dict, List, Optional
+
+import dspy
+
+class CascadeConfig:
+    """저렴한 모델 → 강력한 모델 캐스케이드 설정"""
+    STRONG_MODEL = 'openai/gpt-4o'
+    SAMPLES = 3                    # self-consistency 초안 수
+    AGREEMENT = 2 / 3              # 최다 답의 비율이 이 값 이상이면 초안 채택
+    DRAFT_TEMPERATURE = 0.7        # 초안 샘플링 온도 (서로 다른 추론 경로를 얻기 위함)
+    VERIFIER_CONFIDENCE = 0.7      # verifier 모드에서 채택에 필요한 최소 확신도
+
+class VerifyDraft(dspy.Signature):
+    """초안 답변이 문제에 대해 올바른지 검증합니다."""
+    task: str = dspy.InputField(desc="원래 문제와 입력")
+    reasoning: str = dspy.InputField(desc="초안의 추론 과정")
+    answer: str = dspy.InputField(desc="초안 답변")
+    is_correct: bool = dspy.OutputField(desc="초안 답변이 올바른지 여부")
+    confidence: float = dspy.OutputField(desc="판단에 대한 확신도 (0-1)")
+
+def final_number(answer) -> Optional[Fraction]:
+    """답에 나온 마지막 수 (정수/소수/분수, 없으면 None)
+
+    "x = 12이므로 답은 12개"와 "12"처럼 표현이 달라도 최종 값만 같으면 같은 답으로 봅니다.
+    """
+    numbers = re.findall(r'-?\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?', str(answer).replace(',', ''))
+    for number in reversed(numbers):
+        # 3.5/7처럼 소수가 섞인 분수도 받도록 분자와 분모를 따로 변환 (분모가 0이면 이전 수로)
+        numerator, _, denominator = number.partition('/')
+        try:
+            return Fraction(numerator) / Fraction(denominator or 1)
+        except (ValueError, ZeroDivisionError):
+            continue
+    return None
+
+class CascadeStats:
+    """단계별 처리 수, 지연 시간과 강한 모델만 사용했을 때 대비 절감 추정"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, tier: str, latency: float, strong_latency: Optional[float] = None) -> None:
+        with self.lock:
+            self.counts[tier] += 1
+            self.latencies[tier].append(latency)
+            if strong_latency is not None:
+                self.latencies['strong_call'].append(strong_latency)
+
+    def report(self) -> Dict[str, float]:
+        with self.lock:
+            total = sum(self.counts.values())
+            draft, escalated = self.counts['draft'], self.counts['strong']
+            mean = {tier: sum(values) / len(values) for tier, values in self.latencies.items() if values}
+            actual = sum(sum(values) for tier, values in self.latencies.items() if tier != 'strong_call')
+        report = {
+            'requests': total,
+            'draft_hit_rate': draft / total if total else 0.0,
+            'strong_hit_rate': escalated / total if total else 0.0,
+            'draft_latency': mean.get('draft', 0.0),
+            'escalated_latency': mean.get('strong', 0.0),
+            'saved_seconds': None
+        }
+        # 강한 모델 호출 지연을 관측한 경우에만 "모든 요청을 강한 모델로 처리" 대비 절감 시간 추정
+        if 'strong_call' in mean:
+            report['saved_seconds'] = mean['strong_call'] * total - actual
+        return report
+
+class CascadeChainOfThought(dspy.Module):
+    """저렴한 모델로 초안을 만들고 검증에 실패할 때만 강력한 모델로 승격하는 ChainOfThought
+
+    - self_consistency: 초안 모델로 여러 추론 경로를 샘플링하여 최종 수치가 충분히 일치하면 채택 (수학 문제용)
+    - verifier: 초안 하나를 만든 뒤 초안 모델이 VerifyDraft로 정답 여부를 판단 (자유 서술 답변용)
+    답의 형태에 따라 알맞은 방식이 다르므로 check는 호출하는 쪽에서 지정합니다.
+    반환되는 Prediction의 cascade_tier 필드로 어느 단계에서 답했는지 알 수 있습니다.
+    """
+
+    def __init__(self, signature, draft_lm: dspy.LM, strong_lm: dspy.LM, check: str,
+                 samples: int = CascadeConfig.SAMPLES, answer_field: Optional[str] = None,
+                 stats: Optional[CascadeStats] = None):
+        super().__init__()
+        if check not in ('self_consistency', 'verifier'):
+            raise ValueError(f"지원하지 않는 검증 방식: {check}")
+        self.cot = dspy.ChainOfThought(signature)
+        self.verifier = dspy.Predict(VerifyDraft)
+        self.draft_lm = draft_lm
+        self.strong_lm = strong_lm
+        self.check = check
+        self.samples = samples
+        output_fields = list(self.cot.predict.signature.output_fields)
+        self.answer_field = answer_field or ('answer' if 'answer' in output_fields else output_fields[-1])
+        self.stats = stats or CascadeStats()
+
+    def _sample_drafts(self, inputs) -> List[dspy.Prediction]:
+        """한 번의 n=samples 요청으로 초안을 샘플링하고, 제공자가 n을 무시하면 부족한 만큼 추가 요청"""
+        prediction = self.cot(**inputs, config={'n': self.samples, 'temperature': CascadeConfig.DRAFT_TEMPERATURE})
+        drafts = [prediction.completions[i] for i in range(len(prediction.completions))]
+        for i in range(len(drafts), self.samples):
+            # 온도를 조금씩 달리하여 캐시된 같은 응답이 반복되지 않도록 함
+            temperature = CascadeConfig.DRAFT_TEMPERATURE + 0.001 * i
+            drafts.append(self.cot(**inputs, config={'temperature': temperature}))
+        return drafts
+
+    def _self_consistent_draft(self, inputs) -> Optional[dspy.Prediction]:
+        drafts = self._sample_drafts(inputs)
+        values = [final_number(draft[self.answer_field]) for draft in drafts]
+        # 수치가 없는 초안은 어느 답에도 투표하지 않음 (모두 없으면 승격)
+        votes = Counter(value for value in values if value is not None)
+        if not votes:
+            return None
+        answer, count = votes.most_common(1)[0]
+        if count / len(drafts) < CascadeConfig.AGREEMENT:
+            return None
+        return drafts[values.index(answer)]
+
+    def _verified_draft(self, inputs) -> Optional[dspy.Prediction]:
+        draft = self.cot(**inputs)
+        task = '\n'.join(f"{name}: {value}" for name, value in inputs.items())
+        verdict = self.verifier(task=task, reasoning=draft.reasoning, answer=str(draft[self.answer_field]))
+        if verdict.is_correct and verdict.confidence >= CascadeConfig.VERIFIER_CONFIDENCE:
+            return draft
+        return None
+
+    def forward(self, **inputs):
+        start = time.perf_counter()
+        with dspy.context(lm=self.draft_lm):
+            draft = self._self_consistent_draft(inputs) if self.check == 'self_consistency' else self._verified_draft(inputs)
+        if draft is not None:
+            self.stats.record('draft', time.perf_counter() - start)
+            return dspy.Prediction(**draft.toDict(), cascade_tier='draft')
+
+        strong_start = time.perf_counter()
+        with dspy.context(lm=self.strong_lm):
+            result = self.cot(**inputs)
+        now = time.perf_counter()
+        self.stats.record('strong', now - start, strong_latency=now - strong_start)
+        return dspy.Prediction(**result.toDict(), cascade_tier='strong')
+
+def display_cascade_report(stats: CascadeStats) -> None:
+    """단계별 처리 비율, 평균 지연, 절감 시간 출력"""
+    report = stats.report()
+    print("\n" + "="*50)
+    print(f"🪜 캐스케이드 결과 ({report['requests']}건)")
+    print(f"- 초안 모델에서 완료: {report['draft_hit_rate']:.0%} (평균 {report['draft_latency']:.2f}초)")
+    print(f"- 강한 모델로 승격: {report['strong_hit_rate']:.0%} (초안 포함 평균 {report['escalated_latency']:.2f}초)")
+    if report['saved_seconds'] is None:
+        print("- 지연 절감: 강한 모델 호출이 없어 추정 불가")
+    else:
+        print(f"- 지연 절감(강한 모델만 사용 대비 추정): {report['saved_seconds']:.2f}초")
+    print("="*50)
@@ -0,0 +1,291 @@
+import json
+import numbers
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import dspy
+
+class ColumnType:
+    """열 저장 형식"""
+    STRING = 'string'    # UTF-8 바이트 + 오프셋 (Arrow large_string 레이아웃)
+    FLOAT = 'float'      # float64 배열
+    INT = 'int'          # int64 배열
+    BOOL = 'bool'        # uint8 배열
+    JSON = 'json'        # 목록/딕셔너리 등은 JSON 문자열로 저장하고 읽을 때 복원
+
+_ARRAY_CODES = {ColumnType.FLOAT: 'd', ColumnType.INT: 'q', ColumnType.BOOL: 'B'}
+_ANNOTATION_TYPES = {str: ColumnType.STRING, float: ColumnType.FLOAT, int: ColumnType.INT, bool: ColumnType.BOOL}
+
+_INT64_RANGE = (-2 ** 63, 2 ** 63)
+
+def infer_column_type(value: Any) -> str:
+    """첫 값으로 열 형식 추론 (bool은 int의 하위 클래스이므로 먼저 확인)"""
+    if isinstance(value, bool):
+        return ColumnType.BOOL
+    if isinstance(value, int):
+        return ColumnType.INT
+    if isinstance(value, float):
+        return ColumnType.FLOAT
+    if isinstance(value, str):
+        return ColumnType.STRING
+    return ColumnType.JSON
+
+def convert_value(kind: str, value: Any) -> Any:
+    """값을 열 형식의 저장 값(문자열/JSON은 UTF-8 바이트, 숫자는 파이썬 숫자)으로 변환
+
+    형식이 맞지 않으면 TypeError를 발생시키며 열 상태는 바꾸지 않습니다.
+    """
+    if value is None:
+        return None
+    if kind == ColumnType.JSON:
+        return json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+    if kind == ColumnType.STRING:
+        if not isinstance(value, str):
+            raise TypeError(f"{kind} 열에 저장할 수 없는 값입니다: {value!r}")
+        return value.encode('utf-8')
+    if kind == ColumnType.BOOL:
+        if not isinstance(value, bool):
+            raise TypeError(f"{kind} 열에 저장할 수 없는 값입니다: {value!r}")
+        return int(value)
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        raise TypeError(f"{kind} 열에 저장할 수 없는 값입니다: {value!r}")
+    if kind == ColumnType.INT:
+        if not isinstance(value, numbers.Integral) or not _INT64_RANGE[0] <= value < _INT64_RANGE[1]:
+            raise TypeError(f"{kind} 열에 저장할 수 없는 값입니다: {value!r}")
+        return int(value)
+    return float(value)
+
+def widened_type(kind: str, value: Any) -> str:
+    """value를 담을 수 있도록 넓힌 열 형식 (정수 → 실수, 그 외 혼합 형식은 JSON)"""
+    if kind == ColumnType.INT and isinstance(value, numbers.Real) and not isinstance(value, bool):
+        return ColumnType.FLOAT
+    return ColumnType.JSON
+
+class Column:
+    """Arrow 메모리 레이아웃 그대로 값을 쌓는 열
+
+    문자열은 하나의 bytearray와 int64 오프셋 배열에, 숫자는 array 모듈 배열에 저장하고
+    null은 Arrow와 같은 LSB 순서의 validity 비트맵으로 표시합니다.
+    행마다 파이썬 객체를 유지하지 않으므로 dict/Prediction보다 메모리가 훨씬 적게 듭니다.
+    """
+    __slots__ = ('kind', 'length', 'null_count', 'validity', 'values', 'offsets', 'data')
+
+    def __init__(self, kind: str, length: int = 0):
+        self.kind = kind
+        self.length = 0
+        self.null_count = 0
+        self.validity = bytearray()
+        if kind in (ColumnType.STRING, ColumnType.JSON):
+            self.offsets = array('q', [0])
+            self.data = bytearray()
+            self.values = None
+        else:
+            self.values = array(_ARRAY_CODES[kind])
+            self.offsets = self.data = None
+        for _ in range(length):
+            self.append(None)
+
+    def append(self, value: Any) -> None:
+        self.append_converted(convert_value(self.kind, value))
+
+    def append_converted(self, stored: Any) -> None:
+        """convert_value로 변환을 마친 값 추가 (실패하지 않음)"""
+        index = self.length
+        if index % 8 == 0:
+            self.validity.append(0)
+        if stored is None:
+            self.null_count += 1
+        else:
+            self.validity[index >> 3] |= 1 << (index & 7)
+
+        if self.offsets is not None:
+            if stored is not None:
+                self.data += stored
+            self.offsets.append(len(self.data))
+        else:
+            self.values.append(0 if stored is None else stored)
+        self.length += 1
+
+    def widened(self, kind: str) -> 'Column':
+        """기존 값을 kind 형식으로 옮긴 새 열 (정수 → 실수, 또는 모든 형식 → JSON)"""
+        column = Column(kind)
+        for index in range(self.length):
+            column.append(self.get(index))
+        return column
+
+    def is_valid(self, index: int) -> bool:
+        return bool(self.validity[index >> 3] >> (index & 7) & 1)
+
+    def get(self, index: int) -> Any:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        if not self.is_valid(index):
+            return None
+        if self.offsets is None:
+            value = self.values[index]
+            return bool(value) if self.kind == ColumnType.BOOL else value
+        text = self.data[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+        return json.loads(text) if self.kind == ColumnType.JSON else text
+
+    @property
+    def nbytes(self) -> int:
+        buffers = [self.validity, self.values, self.offsets, self.data]
+        return sum(len(b) * getattr(b, 'itemsize', 1) for b in buffers if b is not None)
+
+    def to_arrow(self):
+        """버퍼를 복사하지 않고 감싼 pyarrow 배열 (bool 열만 uint8 → bool 변환 시 복사)
+
+        반환된 배열이 살아 있는 동안에는 버퍼 크기를 바꿀 수 없으므로 append 시 BufferError가 발생합니다.
+        """
+        import pyarrow as pa
+        validity = pa.py_buffer(self.validity) if self.null_count else None
+        if self.offsets is not None:
+            return pa.Array.from_buffers(pa.large_string(), self.length,
+                                         [validity, pa.py_buffer(self.offsets), pa.py_buffer(self.data)],
+                                         null_count=self.null_count)
+        arrow_type = {ColumnType.FLOAT: pa.float64(), ColumnType.INT: pa.int64(), ColumnType.BOOL: pa.uint8()}[self.kind]
+        values = pa.Array.from_buffers(arrow_type, self.length, [validity, pa.py_buffer(self.values)],
+                                       null_count=self.null_count)
+        return values.cast(pa.bool_()) if self.kind == ColumnType.BOOL else values
+
+class PredictionRow:
+    """PredictionTable의 한 행을 가리키는 가벼운 뷰 (값은 접근할 때 열에서 읽음)
+
+    dspy.Prediction과 결과 dict 양쪽의 접근 방식(row.answer, row['answer'], row.get(...))을 지원합니다.
+    """
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: 'PredictionTable', index: int):
+        self._table = table
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        column = self._table.columns.get(name)
+        if column is None:
+            raise AttributeError(name)
+        return column.get(self._index)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._table.columns[key].get(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._table.columns
+
+    def get(self, key: str, default: Any = None) -> Any:
+        column = self._table.columns.get(key)
+        return default if column is None else column.get(self._index)
+
+    def keys(self) -> List[str]:
+        return list(self._table.columns)
+
+    def values(self) -> List[Any]:
+        return [column.get(self._index) for column in self._table.columns.values()]
+
+    def items(self) -> List[tuple]:
+        return list(zip(self.keys(), self.values()))
+
+    def toDict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{key}={value!r}" for key, value in self.items())
+        return f"PredictionRow({fields})"
+
+class PredictionTable:
+    """한 시그니처의 배치 결과를 열 단위로 저장하는 컨테이너
+
+    dspy.Prediction이나 결과 dict를 append하면 필드별 열에 값을 쌓고, 행은 PredictionRow 뷰로
+    읽습니다. to_arrow()는 열 버퍼를 그대로 Arrow 배열로 감싸므로 Parquet 저장 시 추가 복사가 없습니다.
+    처음 보는 필드는 새 열로 추가되며 이전 행은 null로 채워집니다.
+    열 형식에 맞지 않는 값이 오면 정수 열은 실수 열로, 그 외에는 JSON 열로 넓힙니다.
+    """
+
+    def __init__(self, fields: Optional[Dict[str, str]] = None):
+        self.columns: Dict[str, Column] = {name: Column(kind) for name, kind in (fields or {}).items()}
+        self.length = 0
+
+    @classmethod
+    def from_signature(cls, signature, include_inputs: bool = False) -> 'PredictionTable':
+        """시그니처의 출력(선택 시 입력) 필드 타입으로 열 구성"""
+        signature = dspy.ensure_signature(signature)
+        fields = {**(signature.input_fields if include_inputs else {}), **signature.output_fields}
+        return cls({name: _ANNOTATION_TYPES.get(field.annotation, ColumnType.JSON) for name, field in fields.items()})
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], fields: Optional[Dict[str, str]] = None) -> 'PredictionTable':
+        table = cls(fields)
+        table.extend(rows)
+        return table
+
+    def append(self, row: Any) -> None:
+        """Prediction/Example/dict 한 행 추가
+
+        모든 값을 먼저 변환한 뒤 열을 바꾸므로, 변환에 실패해도 열 길이가 어긋나지 않습니다.
+        """
+        if hasattr(row, 'toDict'):
+            row = row.toDict()
+        plan = {}
+        for name, value in row.items():
+            column = self.columns.get(name)
+            if column is not None:
+                kind = column.kind
+            else:
+                kind = infer_column_type(value) if value is not None else ColumnType.JSON
+            try:
+                stored = convert_value(kind, value)
+            except TypeError:
+                kind = widened_type(kind, value)
+                stored = convert_value(kind, value)
+            plan[name] = (kind, stored)
+
+        for name, (kind, _) in plan.items():
+            column = self.columns.get(name)
+            if column is None:
+                self.columns[name] = Column(kind, self.length)
+            elif column.kind != kind:
+                self.columns[name] = column.widened(kind)
+        for name, column in self.columns.items():
+            column.append_converted(plan[name][1] if name in plan else None)
+        self.length += 1
+
+    def extend(self, rows: Iterable[Any]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int) -> PredictionRow:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return PredictionRow(self, index)
+
+    def __iter__(self) -> Iterator[PredictionRow]:
+        return (PredictionRow(self, index) for index in range(self.length))
+
+    def column(self, name: str) -> List[Any]:
+        """한 열의 값 목록"""
+        column = self.columns[name]
+        return [column.get(index) for index in range(self.length)]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+    def clear(self) -> None:
+        """모든 행 삭제 (열 구성은 유지, 내보낸 Arrow 배열이 있어도 새 버퍼를 사용하므로 안전)"""
+        self.columns = {name: Column(column.kind) for name, column in self.columns.items()}
+        self.length = 0
+
+    def to_arrow(self):
+        """열 버퍼를 복사 없이 감싼 pyarrow.Table"""
+        import pyarrow as pa
+        return pa.table({name: column.to_arrow() for name, column in self.columns.items()})
+
+    def to_parquet(self, path: str, **kwargs) -> None:
+        import pyarrow.parquet as pq
+        pq.write_table(self.to_arrow(), path, **kwargs)
@@ -1,13 +1,19 @@
+from __future__ import annotations
+
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
 import json
-import pandas as pd
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any
 from pathlib import Path
-import requests
 from dspy.utils import download
 
+# pandas와 requests는 무거우므로 실제로 사용하는 시점에 import합니다.
+if TYPE_CHECKING:
+    import pandas as pd
+
 class DataConfig:
     """데이터 설정"""
     DATASETS = {
@@ -52,6 +58,7 @@ class CustomDataLoader(dspy.Module):
                 print(f"📥 다운로드 시작: {dataset_key}")
                 
                 # requests를 사용하여 파일 다운로드
+                import requests
                 response = requests.get(config['url'])
                 response.raise_for_status()
                 
@@ -123,6 +130,7 @@ class CustomDataLoader(dspy.Module):
     
     def preprocess_data(self, data: List[Dict], dataset_key: str) -> pd.DataFrame:
         """데이터 전처리"""
+        import pandas as pd
         df = pd.DataFrame(data)
         
         # 데이터셋별 전처리 로직
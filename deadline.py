@@ -0,0 +1,188 @@
+import asyncio
+import contextlib
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+import dspy
+
+class HedgeConfig:
+    """헤지 요청 설정"""
+    PERCENTILE = 95              # 이 백분위 지연을 넘기면 중복 요청 발송
+    MIN_SAMPLES = 20             # 백분위 계산에 필요한 최소 관측 수
+    WINDOW = 500                 # 지연 시간 관측 창 크기
+    INITIAL_HEDGE_AFTER = 5.0    # 관측이 부족할 때 사용할 헤지 대기 시간(초)
+
+class DeadlineExceeded(TimeoutError):
+    """요청 마감 시간 초과"""
+
+# 현재 요청의 마감 시각 (time.monotonic 기준, 중첩 모듈 호출과 스레드 작업으로 전파)
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+@contextlib.contextmanager
+def deadline(seconds: float):
+    """이 블록 안의 모든 단계가 seconds 안에 끝나도록 마감 시간 지정
+
+    중첩해서 사용하면 바깥 마감 시간보다 늦출 수 없으므로, 각 단계는 항상 남은 예산만 사용합니다.
+    """
+    expires_at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(expires_at if outer is None else min(outer, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_time() -> Optional[float]:
+    """남은 예산(초), 마감 시간이 없으면 None"""
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+def check_deadline(stage: str) -> None:
+    """예산이 남지 않았으면 다음 단계를 시작하지 않고 DeadlineExceeded 발생"""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"마감 시간 초과로 '{stage}' 단계를 건너뜁니다")
+
+def is_deadline_exceeded(error: BaseException) -> bool:
+    """예외 체인에 DeadlineExceeded가 있는지 확인 (어댑터가 원래 예외를 감싸서 다시 던지는 경우 대비)"""
+    while error is not None:
+        if isinstance(error, DeadlineExceeded):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class LatencyTracker:
+    """최근 LM 응답 지연 시간으로 헤지 기준 백분위 계산"""
+
+    def __init__(self, window: int = HedgeConfig.WINDOW):
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        with self.lock:
+            self.samples.append(latency)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self.lock:
+            if len(self.samples) < HedgeConfig.MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[max(math.ceil(pct / 100 * len(ordered)), 1) - 1]
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """헤지 요청을 실행할 프로세스 공용 이벤트 루프 (백그라운드 스레드)
+
+    패배한 요청은 이 루프에서 태스크 취소로 HTTP 연결까지 중단됩니다.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='hedged-lm-loop', daemon=True).start()
+        return _loop
+
+def _reset_after_fork() -> None:
+    """fork된 자식 프로세스에는 루프 스레드가 없으므로 첫 호출 시 새 루프를 만들도록 초기화"""
+    global _loop, _loop_lock
+    _loop = None
+    _loop_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+class HedgedLM(dspy.LM):
+    """마감 시간을 지키고 느린 응답에 대해 중복(헤지) 요청을 보내는 dspy.LM
+
+    - 호출 시점의 남은 예산을 넘기면 DeadlineExceeded를 발생시키고 진행 중인 요청을 취소합니다.
+    - 응답이 최근 p95 지연을 넘기면 같은 모델(또는 backup 모델)로 중복 요청을 보내고,
+      먼저 도착한 응답을 사용하며 나머지 요청은 취소합니다. p95는 이 모델의 응답 지연만으로 계산합니다.
+    - 동기 호출은 공용 이벤트 루프에서, 비동기 호출(acall)은 호출한 쪽의 이벤트 루프에서 경쟁시킵니다.
+    """
+
+    def __init__(self, model: str, backup: Optional[dspy.LM] = None, hedge: bool = True, **kwargs):
+        super().__init__(model, **kwargs)
+        self.backup = backup
+        self.hedge = hedge
+        self.latencies = LatencyTracker()
+        self.stats: Dict[str, int] = defaultdict(int)
+        self.stats_lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        # 호출 스레드들과 공용 이벤트 루프 스레드에서 함께 갱신하므로 잠금 필요
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def hedge_after(self) -> Optional[float]:
+        """중복 요청을 보내기 전 대기 시간(초)"""
+        if not self.hedge:
+            return None
+        observed = self.latencies.percentile(HedgeConfig.PERCENTILE)
+        return HedgeConfig.INITIAL_HEDGE_AFTER if observed is None else observed
+
+    async def _timed_call(self, lm: dspy.LM, prompt, messages, kwargs):
+        if lm is not self:
+            # backup 모델의 지연은 이 모델의 헤지 기준을 왜곡하므로 기록하지 않음
+            return await lm.aforward(prompt=prompt, messages=messages, **kwargs)
+        start = time.perf_counter()
+        # aforward를 재정의했으므로 실제 전송은 dspy.LM.aforward로 호출
+        response = await super().aforward(prompt=prompt, messages=messages, **kwargs)
+        if not getattr(response, 'cache_hit', False):
+            self.latencies.record(time.perf_counter() - start)
+        return response
+
+    async def _race(self, prompt, messages, kwargs, budget: Optional[float]):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        primary = asyncio.ensure_future(self._timed_call(self, prompt, messages, kwargs))
+        pending = {primary}
+
+        hedge_after = self.hedge_after()
+        if hedge_after is not None and (budget is None or hedge_after < budget):
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                self._count('hedged')
+                pending.add(asyncio.ensure_future(
+                    self._timed_call(self.backup or self, prompt, messages, kwargs)))
+            else:
+                pending = done
+
+        errors = []
+        while pending:
+            timeout = None if budget is None else max(budget - (loop.time() - started), 0)
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if task is not primary:
+                        self._count('hedge_wins')
+                    return task.result()
+                errors.append(task.exception())
+
+        for task in pending:
+            task.cancel()
+        if pending or not errors:
+            self._count('deadline_exceeded')
+            raise DeadlineExceeded(f"LM 호출이 남은 예산 {budget:.2f}초 안에 끝나지 않았습니다")
+        raise errors[0]
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        check_deadline(f"LM({self.model})")
+        self._count('calls')
+        future = asyncio.run_coroutine_threadsafe(
+            self._race(prompt, messages, kwargs, remaining_time()), _event_loop())
+        return future.result()
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        check_deadline(f"LM({self.model})")
+        self._count('calls')
+        return await self._race(prompt, messages, kwargs, remaining_time())
@@ -1,23 +1,56 @@
+import argparse
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
-dotenv.load_dotenv()
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM
+from cascade import CascadeChainOfThought, CascadeConfig, CascadeStats, display_cascade_report
 
-# OpenAI의 gpt-4o-mini 모델을 설정합니다.
-lm = dspy.LM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
-dspy.configure(lm=lm)
+def setup_environment():
+    """환경 설정 및 LM 초기화"""
+    dotenv.load_dotenv()
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    # OpenAI의 gpt-4o-mini 모델을 설정합니다.
+    lm = CachedLM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
+    dspy.configure(lm=lm)
 
 # 질문에 대한 답변을 생성하는 모듈을 정의합니다.
 class AnswerQuestion(dspy.Signature):
     question = dspy.InputField()
     answer = dspy.OutputField()
 
-# Chain of Thought 방식을 사용하여 답변을 생성하는 모듈을 설정합니다.
-answer_module = dspy.ChainOfThought(AnswerQuestion)
+def create_answer_module(cascade_stats: CascadeStats = None):
+    """Chain of Thought 방식을 사용하여 답변을 생성하는 모듈을 설정합니다.
+
+    cascade_stats가 주어지면 기본 LM의 초안을 검증하고 실패할 때만 강한 모델로 답합니다.
+    """
+    if cascade_stats is not None:
+        strong_lm = CachedLM(CascadeConfig.STRONG_MODEL, api_key=os.getenv('OPENAI_API_KEY'))
+        return CascadeChainOfThought(AnswerQuestion, draft_lm=dspy.settings.lm, strong_lm=strong_lm,
+                                     check='verifier', stats=cascade_stats)
+    return dspy.ChainOfThought(AnswerQuestion)
+
+def main():
+    parser = argparse.ArgumentParser(description='Chain of Thought로 질문에 답변')
+    parser.add_argument('--cascade', action='store_true', help='초안 모델 → 강한 모델 캐스케이드 사용')
+    args = parser.parse_args()
+
+    setup_environment()
+    cascade_stats = CascadeStats() if args.cascade else None
+    answer_module = create_answer_module(cascade_stats)
+
+    # 예시 질문을 입력하여 답변을 생성합니다.
+    question = "대한민국의 수도는 어디인가요?"
+    prediction = answer_module(question=question)
 
-# 예시 질문을 입력하여 답변을 생성합니다.
-question = "대한민국의 수도는 어디인가요?"
-prediction = answer_module(question=question)
+    print(f"질문: {question}")
+    print(f"답변: {prediction.answer}")
+    if cascade_stats is not None:
+        display_cascade_report(cascade_stats)
 
-print(f"질문: {question}")
-print(f"답변: {prediction.answer}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import importlib.util
+import os
+import threading
+from typing import Dict, List, Optional
+
+import httpx
+import litellm
+
+class HTTPPoolConfig:
+    """프로세스 공용 HTTP 연결 풀 설정"""
+    MAX_CONNECTIONS = int(os.getenv('DSPY_HTTP_MAX_CONNECTIONS', 100))      # 최대 동시 연결 수
+    MAX_KEEPALIVE = int(os.getenv('DSPY_HTTP_MAX_KEEPALIVE', 20))           # 유휴 상태로 유지할 연결 수
+    KEEPALIVE_EXPIRY = float(os.getenv('DSPY_HTTP_KEEPALIVE_EXPIRY', 120))  # 유휴 연결 유지 시간(초)
+    TIMEOUT = 600.0                                                         # 요청 타임아웃(초)
+    CONNECT_TIMEOUT = 10.0                                                  # 연결 타임아웃(초)
+    # h2 패키지가 설치되어 있으면 HTTP/2 멀티플렉싱 사용 (서버가 지원하지 않으면 HTTP/1.1로 협상)
+    HTTP2 = importlib.util.find_spec('h2') is not None
+    WARM_UP_URLS = [os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')]
+
+class ConnectionStats:
+    """요청 수와 새로 연결한 횟수를 세어 연결 재사용률 계산"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self) -> None:
+        with self.lock:
+            self.requests += 1
+
+    def record_connection(self) -> None:
+        with self.lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reuse_rate': reused / self.requests if self.requests else 0.0
+            }
+
+STATS = ConnectionStats()
+
+class CountingTransport(httpx.HTTPTransport):
+    """httpcore 트레이스 이벤트로 새 TCP 연결 수를 세는 동기 전송 계층"""
+
+    def _trace(self, event_name: str, info: Dict) -> None:
+        if event_name == 'connection.connect_tcp.complete':
+            STATS.record_connection()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        STATS.record_request()
+        request.extensions = {**request.extensions, 'trace': self._trace}
+        return super().handle_request(request)
+
+class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    """httpcore 트레이스 이벤트로 새 TCP 연결 수를 세는 비동기 전송 계층"""
+
+    async def _trace(self, event_name: str, info: Dict) -> None:
+        if event_name == 'connection.connect_tcp.complete':
+            STATS.record_connection()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        STATS.record_request()
+        request.extensions = {**request.extensions, 'trace': self._trace}
+        return await super().handle_async_request(request)
+
+_configure_lock = threading.Lock()
+
+def configure_http_pool(
+    max_connections: int = HTTPPoolConfig.MAX_CONNECTIONS,
+    max_keepalive: int = HTTPPoolConfig.MAX_KEEPALIVE,
+    http2: bool = HTTPPoolConfig.HTTP2
+) -> httpx.Client:
+    """모든 dspy.LM / dspy.Embedder 호출이 공유할 HTTP 클라이언트 설정
+
+    litellm은 OpenAI 호환 제공자(LM과 Embedder 모두)에 대해 litellm.client_session /
+    litellm.aclient_session을 그대로 사용하므로, 이를 한 번만 설정하면 프로세스 전체가
+    같은 연결 풀을 공유합니다. 이미 설정되어 있으면 기존 클라이언트를 반환합니다.
+    """
+    with _configure_lock:
+        if litellm.client_session is not None:
+            return litellm.client_session
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=HTTPPoolConfig.KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(HTTPPoolConfig.TIMEOUT, connect=HTTPPoolConfig.CONNECT_TIMEOUT)
+
+        litellm.client_session = httpx.Client(
+            transport=CountingTransport(limits=limits, http2=http2),
+            timeout=timeout,
+            follow_redirects=True
+        )
+        litellm.aclient_session = httpx.AsyncClient(
+            transport=AsyncCountingTransport(limits=limits, http2=http2),
+            timeout=timeout,
+            follow_redirects=True
+        )
+        return litellm.client_session
+
+def _connect(urls: List[str]) -> None:
+    client = configure_http_pool()
+    for url in urls:
+        try:
+            client.get(url.rstrip('/') + '/models', timeout=HTTPPoolConfig.CONNECT_TIMEOUT)
+        except httpx.HTTPError as e:
+            print(f"⚠️ 연결 예열 실패 ({url}): {str(e)}")
+
+def warm_up(urls: Optional[List[str]] = None, background: bool = True) -> Optional[threading.Thread]:
+    """제공자 엔드포인트에 미리 연결해 첫 요청의 TLS 핸드셰이크 비용 제거
+
+    인증 없이 요청하므로 401 등이 반환될 수 있지만 연결은 풀에 남습니다.
+    기본적으로 백그라운드 스레드에서 연결하여 스크립트 시작을 막지 않으며, 그 스레드를 반환합니다.
+    """
+    urls = urls or HTTPPoolConfig.WARM_UP_URLS
+    if not background:
+        _connect(urls)
+        return None
+    thread = threading.Thread(target=_connect, args=(urls,), name='http-pool-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def connection_stats() -> Dict[str, float]:
+    """요청 수, 새 연결 수, 연결 재사용률"""
+    return STATS.snapshot()
+
+def _reset_after_fork() -> None:
+    """fork된 자식 프로세스는 부모의 소켓과 잠금을 공유하지 않도록 새 연결 풀을 사용
+
+    litellm이 캐시해 둔 OpenAI 클라이언트도 부모의 연결을 들고 있으므로 함께 비웁니다.
+    (비우지 않으면 여러 자식이 같은 keep-alive 소켓에서 응답을 나눠 읽다가 멈춥니다)
+    """
+    global _configure_lock
+    _configure_lock = threading.Lock()
+    STATS.lock = threading.Lock()
+    litellm.in_memory_llm_clients_cache.flush_cache()
+    if litellm.client_session is not None:
+        litellm.client_session = None
+        litellm.aclient_session = None
+        configure_http_pool()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+class ImportTimeConfig:
+    """-X importtime 회귀 벤치마크 설정
+
+    import dspy 자체의 시간은 설치된 dspy/litellm 버전과 머신에 따라 크게 달라지므로,
+    스크립트의 회귀 검사는 dspy 외에 추가로 import하는 시간(extra_ms)에 대해서만 수행합니다.
+    first-predict는 import dspy부터 첫 Predict 호출까지의 벽시계 시간 자체를 기준과 비교합니다.
+    """
+    BASELINE_PATH = SCRIPT_DIR / 'importtime_baseline.json'
+    REPEATS = 3              # 반복 측정 후 최솟값 사용 (디스크 캐시 등 잡음 제거)
+    TOLERANCE = 0.20         # 기준 대비 허용 증가율
+    SLACK_MS = 50.0          # 작은 값에서의 잡음을 흡수하는 절대 허용치(ms)
+    TOP_IMPORTS = 8          # 출력할 최상위 import 수
+    ENTRY_POINTS = [
+        'predict-dspy.py', 'dspy-simple.py', 'CoT-dspy.py', 'PoT-dspy.py', 'ReAct-dspy.py',
+        'lm-dspy.py', 'dataloader-dspy.py', 'retrieve-dspy.py', 'rag_with_signature.py',
+        'template-dspy.py', 'multichain-dspy.py',
+    ]
+
+# 스크립트를 main() 실행 없이 모듈로 로드하는 코드
+LOAD_SCRIPT = (
+    "import importlib.util, sys; sys.path.insert(0, {dir!r}); "
+    "spec = importlib.util.spec_from_file_location('entry', {path!r}); "
+    "module = importlib.util.module_from_spec(spec); spec.loader.exec_module(module)"
+)
+
+# import dspy 후 Predict 한 번 호출까지의 시간 (DummyLM 사용, 네트워크 없음)
+FIRST_PREDICT = (
+    "import time; start = time.perf_counter(); import dspy; from dspy.utils import DummyLM; "
+    "dspy.configure(lm=DummyLM([{'answer': 'ok'}])); dspy.Predict('question -> answer')(question='q'); "
+    "print(f'FIRST_PREDICT_MS={(time.perf_counter() - start) * 1000:.1f}')"
+)
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def parse_importtime(stderr: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """-X importtime 출력에서 (전체 import 시간 ms, 최상위 import별 누적 시간 ms) 추출"""
+    total_us = 0
+    top_level = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        total_us += int(self_us)
+        if len(indent) == 1:
+            top_level.append((name, int(cumulative_us) / 1000))
+    return total_us / 1000, sorted(top_level, key=lambda item: -item[1])
+
+def measure(target: str, code: str) -> Tuple[float, List[Tuple[str, float]], str]:
+    """새 인터프리터에서 code를 실행하여 import 시간 측정"""
+    env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '0'}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, env=env, cwd=SCRIPT_DIR)
+    if result.returncode != 0:
+        # stderr에는 -X importtime 출력이 섞여 있으므로 제외하고 traceback의 마지막 줄(예외)만 사용
+        errors = [line for line in result.stderr.splitlines()
+                  if line.strip() and not line.startswith('import time:')]
+        raise RuntimeError(f"{target} 측정 실패: {errors[-1] if errors else f'종료 코드 {result.returncode}'}")
+    total_ms, top_level = parse_importtime(result.stderr)
+    return total_ms, top_level, result.stdout
+
+def run_benchmarks(targets: List[str], repeats: int) -> Dict[str, Dict]:
+    """대상별로 repeats번 측정하여 최솟값 기록"""
+    results = {}
+    for target in targets:
+        runs = []
+        for _ in range(repeats):
+            if target == 'first-predict':
+                _, top_level, stdout = measure(target, FIRST_PREDICT)
+                # 벽시계 시간과 -X importtime 누적값은 단위가 달라 빼지 않고 벽시계 시간을 그대로 비교
+                total_ms = float(re.search(r'FIRST_PREDICT_MS=([\d.]+)', stdout).group(1))
+                runs.append((total_ms, total_ms, top_level))
+                continue
+            code = LOAD_SCRIPT.format(dir=str(SCRIPT_DIR), path=str(SCRIPT_DIR / target))
+            total_ms, top_level, _ = measure(target, code)
+            dspy_ms = dict(top_level).get('dspy', 0.0)
+            runs.append((total_ms, total_ms - dspy_ms, top_level))
+        best_ms, extra_ms, top_level = min(runs, key=lambda run: run[1])
+        results[target] = {'ms': best_ms, 'extra_ms': extra_ms, 'top_imports': top_level[:ImportTimeConfig.TOP_IMPORTS]}
+    return results
+
+def check_regressions(results: Dict[str, Dict], baseline: Dict[str, float]) -> List[str]:
+    """비교값(스크립트는 dspy 외 추가 import 시간, first-predict는 벽시계 시간)이 허용치 이상 늘어난 대상 목록"""
+    regressions = []
+    for target, result in results.items():
+        if target not in baseline:
+            continue
+        limit = baseline[target] * (1 + ImportTimeConfig.TOLERANCE) + ImportTimeConfig.SLACK_MS
+        if result['extra_ms'] > limit:
+            regressions.append(f"{target}: {result['extra_ms']:.0f}ms > 허용치 {limit:.0f}ms "
+                               f"(기준 {baseline[target]:.0f}ms)")
+    return regressions
+
+def display_results(results: Dict[str, Dict], baseline: Dict[str, float], verbose: bool) -> None:
+    print("\n" + "="*80)
+    print(f"{'대상':<28}{'전체(ms)':>12}{'비교값(ms)':>14}{'기준(ms)':>12}{'변화(ms)':>12}")
+    print("-"*80)
+    for target, result in results.items():
+        base = baseline.get(target)
+        change = f"{result['extra_ms'] - base:+.0f}" if base is not None else '-'
+        print(f"{target:<28}{result['ms']:>12.0f}{result['extra_ms']:>14.0f}"
+              f"{(f'{base:.0f}' if base is not None else '-'):>12}{change:>12}")
+        if verbose:
+            for name, ms in result['top_imports']:
+                print(f"    └ {name}: {ms:.0f}ms")
+    print("="*80)
+
+def main():
+    parser = argparse.ArgumentParser(description='예제 스크립트 시작 시간(-X importtime) 회귀 벤치마크')
+    parser.add_argument('--targets', nargs='+', default=['first-predict'] + ImportTimeConfig.ENTRY_POINTS)
+    parser.add_argument('--repeats', type=int, default=ImportTimeConfig.REPEATS)
+    parser.add_argument('--update-baseline', action='store_true', help='현재 측정값을 기준으로 저장')
+    parser.add_argument('--verbose', action='store_true', help='대상별 최상위 import 시간 출력')
+    args = parser.parse_args()
+
+    # litellm이 import 시점에 원격 모델 가격표를 받아오지 않도록 (측정 잡음 제거)
+    os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
+
+    baseline = {}
+    if ImportTimeConfig.BASELINE_PATH.exists():
+        baseline = json.loads(ImportTimeConfig.BASELINE_PATH.read_text(encoding='utf-8'))
+
+    results = run_benchmarks(args.targets, args.repeats)
+    display_results(results, baseline, args.verbose)
+
+    if args.update_baseline:
+        baseline.update({target: round(result['extra_ms'], 1) for target, result in results.items()})
+        ImportTimeConfig.BASELINE_PATH.write_text(json.dumps(baseline, indent=2, ensure_ascii=False) + '\n',
+                                                  encoding='utf-8')
+        print(f"💾 기준 저장: {ImportTimeConfig.BASELINE_PATH.name}")
+        return
+
+    regressions = check_regressions(results, baseline)
+    if regressions:
+        print("❌ 시작 시간 회귀 발견:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("✅ 시작 시간 회귀 없음")
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,282 @@
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
-from typing import Dict, List
+from http_pool import configure_http_pool, warm_up
+import asyncio
+import contextlib
+import contextvars
+import functools
+import hashlib
+import heapq
+import inspect
+import itertools
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import litellm
 
 def setup_environment():
     """환경 설정 로드"""
     dotenv.load_dotenv()
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
 
 class ModelConfig:
-    """언어 모델 설정"""
+    """언어 모델 설정 (rpm/tpm: 분당 요청 수/토큰 수 한도, price: 1K 토큰당 입력/출력 가격(USD))"""
     MODELS = {
         'gpt4': {
             'name': 'openai/gpt-4-turbo',
-            'desc': 'GPT-4 Turbo - 가장 강력한 추론 능력'
+            'desc': 'GPT-4 Turbo - 가장 강력한 추론 능력',
+            'rpm': 500,
+            'tpm': 300_000,
+            'price': (0.01, 0.03)
         },
         'gpt35': {
             'name': 'openai/gpt-3.5-turbo',
-            'desc': 'GPT-3.5 Turbo - 빠른 응답과 비용 효율'
+            'desc': 'GPT-3.5 Turbo - 빠른 응답과 비용 효율',
+            'rpm': 3_500,
+            'tpm': 1_000_000,
+            'price': (0.0005, 0.0015)
         },
         'claude': {
             'name': 'anthropic/claude-3-sonnet',
-            'desc': 'Claude 3 Sonnet - 학술적 분석에 강점'
+            'desc': 'Claude 3 Sonnet - 학술적 분석에 강점',
+            'rpm': 1_000,
+            'tpm': 400_000,
+            'price': (0.003, 0.015)
         }
     }
 
+class RouterConfig:
+    """모델 라우터 설정"""
+    ROUTE_ORDER = ['gpt35', 'claude', 'gpt4']   # 저렴한 모델 → 강력한 모델 순서
+    CONFIDENCE_THRESHOLD = 0.7                  # 이 확률 이상이면 해당 모델로 처리
+    LEARNING_RATE = 0.1                         # 분류기 온라인 학습률
+    MIN_RESPONSE_CHARS = 20                     # 검증 통과를 위한 최소 응답 길이
+    REPLAY_LOG_PATH = 'logs/route_replay.jsonl' # 오프라인 재생용 모델별 결과 기록
+    REPLAY_HOLDOUT = 0.3                        # 재생 벤치마크에서 학습에 쓰지 않고 평가만 할 프롬프트 비율
+    REASONING_KEYWORDS = ['분석', '비교', '증명', '설계', '추론', '평가', '윤리', '복잡도', '왜',
+                          'analy', 'prove', 'compare', 'design', 'why']
+    # 모델별 초기 가중치 (bias와 각 특징의 가중치, 학습하며 갱신됨)
+    PRIOR_WEIGHTS = {
+        'gpt35': {'bias': 2.0, 'length': -1.5, 'code': -1.0, 'math': -0.5, 'reasoning': -0.6, 'questions': -0.3},
+        'claude': {'bias': 2.5, 'length': -0.8, 'code': -0.5, 'math': -0.3, 'reasoning': -0.2, 'questions': -0.2},
+        'gpt4': {'bias': 3.0, 'length': -0.3, 'code': -0.2, 'math': -0.2, 'reasoning': -0.1, 'questions': -0.1}
+    }
+
+class SchedulerConfig:
+    """요청 스케줄러 설정"""
+    PRIORITIES = {'interactive': 0, 'batch': 1}   # 숫자가 작을수록 먼저 처리
+    MAX_RETRIES = 4              # 429 발생 시 재시도 횟수
+    DECREASE_FACTOR = 0.5        # AIMD: 429 발생 시 한도에 곱할 비율
+    INCREASE_FRACTION = 0.02     # AIMD: 성공 시 설정 한도 대비 증가 비율
+    MIN_FRACTION = 0.05          # 설정 한도 대비 최소 비율
+    DEFAULT_RETRY_AFTER = 1.0    # Retry-After 헤더가 없을 때 대기 시간(초)
+
+# 현재 호출의 우선순위와 프로그램 이름 (스레드/비동기 작업별로 전파)
+_schedule_context = contextvars.ContextVar('schedule_context', default=('interactive', 'default'))
+
+@contextlib.contextmanager
+def scheduling(priority: str = 'interactive', program: str = 'default'):
+    """이 블록 안의 LM 호출에 우선순위와 프로그램 이름 지정"""
+    token = _schedule_context.set((priority, program))
+    try:
+        yield
+    finally:
+        _schedule_context.reset(token)
+
+class TokenBucket:
+    """분당 한도 기반 토큰 버킷 (한도는 AIMD로 조정됨)"""
+
+    def __init__(self, per_minute: float):
+        self.max_rate = per_minute
+        self.rate = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount만큼 사용 가능해질 때까지의 대기 시간(초)"""
+        amount = min(amount, self.rate)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) * 60 / self.rate
+
+class RateLimitScheduler:
+    """여러 LM 인스턴스가 공유하는 클라이언트 측 요청 스케줄러
+
+    - 제공자/모델별 RPM·TPM 토큰 버킷으로 요청을 보내기 전에 속도를 제한합니다.
+    - 대기열은 우선순위(interactive → batch) 순이며, 같은 우선순위에서는 처리량이 적은 프로그램을 먼저 보냅니다.
+    - 429 응답 시 한도를 곱셈으로 줄이고(AIMD), 성공할 때마다 조금씩 늘려 제공자 한도에 적응합니다.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.limits: Dict[str, Dict[str, TokenBucket]] = {}
+        self.queues: Dict[str, list] = defaultdict(list)
+        self.served: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.blocked_until: Dict[str, float] = defaultdict(float)
+        self.sequence = itertools.count()
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def register(self, model: str, rpm: float, tpm: float) -> None:
+        with self.condition:
+            if model not in self.limits:
+                self.limits[model] = {'rpm': TokenBucket(rpm), 'tpm': TokenBucket(tpm)}
+
+    def acquire(self, model: str, tokens: int) -> None:
+        """요청 차례가 되고 RPM/TPM 여유가 생길 때까지 대기"""
+        priority, program = _schedule_context.get()
+        with self.condition:
+            buckets = self.limits[model]
+            queue = self.queues[model]
+            entry = (SchedulerConfig.PRIORITIES.get(priority, 1), self.served[model][program], next(self.sequence))
+            heapq.heappush(queue, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    for bucket in buckets.values():
+                        bucket.refill(now)
+                    wait = max(
+                        self.blocked_until[model] - now,
+                        buckets['rpm'].wait_time(1),
+                        buckets['tpm'].wait_time(tokens)
+                    )
+                    if queue[0] == entry and wait <= 0:
+                        heapq.heappop(queue)
+                        buckets['rpm'].tokens -= 1
+                        buckets['tpm'].tokens -= tokens
+                        self.served[model][program] += 1
+                        self.stats[model]['sent'] += 1
+                        return
+                    self.condition.wait(timeout=wait if wait > 0 else None)
+            finally:
+                # 대기 중 예외(인터럽트 등)로 빠져나가도 대기열 맨 앞에 남아 다른 요청을 막지 않도록 제거
+                if entry in queue:
+                    queue.remove(entry)
+                    heapq.heapify(queue)
+                self.condition.notify_all()
+
+    def on_success(self, model: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """성공 시 실제 토큰 사용량 반영 및 한도 가산 증가"""
+        with self.condition:
+            buckets = self.limits[model]
+            if actual_tokens:
+                buckets['tpm'].tokens -= actual_tokens - estimated_tokens
+            for bucket in buckets.values():
+                bucket.rate = min(bucket.max_rate, bucket.rate + bucket.max_rate * SchedulerConfig.INCREASE_FRACTION)
+            self.condition.notify_all()
+
+    def on_rate_limited(self, model: str, retry_after: Optional[float]) -> None:
+        """429 응답 시 한도를 곱셈 감소시키고 Retry-After 동안 해당 모델 전송 중단"""
+        with self.condition:
+            self.stats[model]['rate_limited'] += 1
+            for bucket in self.limits[model].values():
+                bucket.rate = max(bucket.max_rate * SchedulerConfig.MIN_FRACTION, bucket.rate * SchedulerConfig.DECREASE_FACTOR)
+                bucket.tokens = min(bucket.tokens, bucket.rate)
+            delay = retry_after if retry_after is not None else SchedulerConfig.DEFAULT_RETRY_AFTER
+            self.blocked_until[model] = max(self.blocked_until[model], time.monotonic() + delay)
+            self.condition.notify_all()
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """모델별 전송/429 횟수와 현재 한도"""
+        with self.condition:
+            return {
+                model: {
+                    **self.stats[model],
+                    'rpm_limit': buckets['rpm'].rate,
+                    'tpm_limit': buckets['tpm'].rate
+                }
+                for model, buckets in self.limits.items()
+            }
+
+# 프로세스 전체에서 공유하는 스케줄러
+SCHEDULER = RateLimitScheduler()
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """429 응답의 Retry-After 헤더 값(초) 추출"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def _estimate_request_tokens(request: Dict) -> int:
+    """전송 전 TPM 버킷에서 차감할 토큰 수 추정 (응답 후 실제 사용량으로 보정)"""
+    text = ''.join(str(m.get('content', '')) for m in request.get('messages') or [])
+    return len(text) // 4 + request.get('max_tokens', 1000)
+
+class ScheduledLM(dspy.LM):
+    """공유 스케줄러를 거쳐 요청을 보내는 dspy.LM
+
+    재시도는 litellm 대신 스케줄러가 담당하여 429 발생 시 재시도 폭주를 막습니다.
+    스케줄러는 dspy 캐시 래퍼 안쪽의 실제 전송 함수에서만 거치므로 캐시 적중은 한도를 소비하지 않습니다.
+    비동기 호출(acall)도 같은 스케줄러를 거치며, 대기는 이벤트 루프를 막지 않도록 스레드에서 합니다.
+    """
+
+    def __init__(self, model: str, rpm: float, tpm: float, scheduler: RateLimitScheduler = SCHEDULER, **kwargs):
+        kwargs.setdefault('num_retries', 0)
+        super().__init__(model, **kwargs)
+        self.scheduler = scheduler
+        self.scheduler.register(model, rpm, tpm)
+
+    def _get_cached_completion_fn(self, completion_fn, cache, enable_memory_cache):
+        if inspect.iscoroutinefunction(completion_fn):
+            completion_fn = self._ascheduled(completion_fn)
+        else:
+            completion_fn = self._scheduled(completion_fn)
+        return super()._get_cached_completion_fn(completion_fn, cache, enable_memory_cache)
+
+    def _scheduled(self, completion_fn):
+        """전송 전에 스케줄러 차례를 기다리고 429는 스케줄러 기준으로 재시도하는 전송 함수
+
+        functools.wraps로 원래 함수 이름을 유지하므로 dspy 캐시 키는 일반 dspy.LM과 같습니다.
+        """
+        @functools.wraps(completion_fn)
+        def send(request, num_retries, cache=None):
+            estimated_tokens = _estimate_request_tokens(request)
+            for attempt in range(SchedulerConfig.MAX_RETRIES + 1):
+                self.scheduler.acquire(self.model, estimated_tokens)
+                try:
+                    response = completion_fn(request=request, num_retries=num_retries, cache=cache)
+                except litellm.RateLimitError as e:
+                    self.scheduler.on_rate_limited(self.model, _retry_after_seconds(e))
+                    if attempt == SchedulerConfig.MAX_RETRIES:
+                        raise
+                    continue
+                usage = dict(getattr(response, 'usage', None) or {})
+                self.scheduler.on_success(self.model, estimated_tokens, usage.get('total_tokens'))
+                return response
+        return send
+
+    def _ascheduled(self, completion_fn):
+        """_scheduled의 비동기 버전 (스케줄러 대기는 asyncio.to_thread로 실행, 우선순위 컨텍스트도 함께 전달됨)"""
+        @functools.wraps(completion_fn)
+        async def send(request, num_retries, cache=None):
+            estimated_tokens = _estimate_request_tokens(request)
+            for attempt in range(SchedulerConfig.MAX_RETRIES + 1):
+                await asyncio.to_thread(self.scheduler.acquire, self.model, estimated_tokens)
+                try:
+                    response = await completion_fn(request=request, num_retries=num_retries, cache=cache)
+                except litellm.RateLimitError as e:
+                    self.scheduler.on_rate_limited(self.model, _retry_after_seconds(e))
+                    if attempt == SchedulerConfig.MAX_RETRIES:
+                        raise
+                    continue
+                usage = dict(getattr(response, 'usage', None) or {})
+                self.scheduler.on_success(self.model, estimated_tokens, usage.get('total_tokens'))
+                return response
+        return send
+
 class LanguageModelSignature(dspy.Signature):
     """언어 모델 입출력 시그니처"""
     prompt = dspy.InputField(desc="사용자의 입력 프롬프트")
@@ -31,6 +284,91 @@ class LanguageModelSignature(dspy.Signature):
     response = dspy.OutputField(desc="모델의 응답")
     analysis = dspy.OutputField(desc="응답에 대한 분석")
 
+def extract_prompt_features(prompt: str) -> Dict[str, float]:
+    """라우팅 분류기에 사용할 프롬프트 특징 추출 (모두 0~3 범위로 정규화)"""
+    text = prompt.lower()
+    return {
+        'bias': 1.0,
+        'length': min(len(prompt) / 1000, 3.0),
+        'code': float(bool(re.search(r'\bdef |\breturn\b|\bclass |[{};]|```', prompt))),
+        'math': min(len(re.findall(r'\d+\s*[-+*/^=]\s*\d+', prompt)) / 3, 1.0),
+        'reasoning': min(sum(text.count(k) for k in RouterConfig.REASONING_KEYWORDS) / 3, 1.0),
+        'questions': min(prompt.count('?') / 3, 1.0)
+    }
+
+class RouteClassifier:
+    """프롬프트 특징으로 모델별 성공 확률을 예측하는 경량 로지스틱 회귀 분류기
+
+    검증 결과로 온라인 학습하므로 실제 사용량이 쌓일수록 라우팅이 정확해집니다.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, Dict[str, float]]] = None):
+        self.weights = {key: dict(w) for key, w in (weights or RouterConfig.PRIOR_WEIGHTS).items()}
+        self.lock = threading.Lock()
+
+    def predict(self, model_key: str, features: Dict[str, float]) -> float:
+        """해당 모델이 검증을 통과할 확률"""
+        weights = self.weights[model_key]
+        z = sum(weights.get(name, 0.0) * value for name, value in features.items())
+        return 1 / (1 + math.exp(-z))
+
+    def update(self, model_key: str, features: Dict[str, float], success: bool) -> None:
+        """검증 결과로 가중치 갱신 (확률적 경사 하강)"""
+        with self.lock:
+            error = float(success) - self.predict(model_key, features)
+            weights = self.weights[model_key]
+            for name, value in features.items():
+                weights[name] = weights.get(name, 0.0) + RouterConfig.LEARNING_RATE * error * value
+
+    def choose(self, features: Dict[str, float], candidates: List[str]) -> Tuple[str, float]:
+        """신뢰도가 임계값을 넘는 가장 저렴한 모델 선택 (없으면 가장 강력한 모델)"""
+        for model_key in candidates:
+            confidence = self.predict(model_key, features)
+            if confidence >= RouterConfig.CONFIDENCE_THRESHOLD:
+                return model_key, confidence
+        return candidates[-1], self.predict(candidates[-1], features)
+
+class RouteStats:
+    """라우팅 경로별 지연 시간, 비용, 검증 실패 집계"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes: Dict[str, Dict[str, list]] = defaultdict(lambda: {'latencies': [], 'costs': [], 'failures': []})
+
+    def record(self, route: str, latency: float, cost: float, valid: bool) -> None:
+        with self.lock:
+            stats = self.routes[route]
+            stats['latencies'].append(latency)
+            stats['costs'].append(cost)
+            stats['failures'].append(not valid)
+
+    def dashboard(self) -> Dict[str, Dict[str, float]]:
+        """경로별 요청 수, 평균/p95 지연, 총/평균 비용, 검증 실패 수"""
+        with self.lock:
+            report = {}
+            for route, stats in self.routes.items():
+                latencies = sorted(stats['latencies'])
+                count = len(latencies)
+                report[route] = {
+                    'count': count,
+                    'avg_latency': sum(latencies) / count,
+                    'p95_latency': latencies[max(math.ceil(0.95 * count), 1) - 1],
+                    'total_cost': sum(stats['costs']),
+                    'avg_cost': sum(stats['costs']) / count,
+                    'failures': sum(stats['failures'])
+                }
+            return report
+
+def estimate_cost(model_key: str, usage: Dict) -> float:
+    """토큰 사용량으로 호출 비용(USD) 계산 (캐시 적중 시 사용량이 비어 있어 0)"""
+    input_price, output_price = ModelConfig.MODELS[model_key]['price']
+    return (usage.get('prompt_tokens', 0) * input_price + usage.get('completion_tokens', 0) * output_price) / 1000
+
+def validate_result(result: Dict) -> bool:
+    """응답과 분석이 모두 있고 응답이 너무 짧지 않은지 검증"""
+    response = (result.get('response') or '').strip()
+    return bool(result.get('analysis')) and len(response) >= RouterConfig.MIN_RESPONSE_CHARS
+
 class MultiModelProcessor(dspy.Module):
     """여러 언어 모델을 처리하는 모듈"""
     
@@ -38,13 +376,18 @@ class MultiModelProcessor(dspy.Module):
         super().__init__()
         self.models: Dict[str, dspy.LM] = {}
         self.predictor = dspy.Predict(LanguageModelSignature)
+        self.classifier = RouteClassifier()
+        self.route_stats = RouteStats()
     
     def initialize_model(self, model_key: str) -> None:
         """특정 모델 초기화"""
         try:
             model_config = ModelConfig.MODELS[model_key]
-            model = dspy.LM(
+            # 모든 모델이 공유 스케줄러를 통해 RPM/TPM 한도를 지키도록 생성
+            model = ScheduledLM(
                 model_config['name'],
+                rpm=model_config['rpm'],
+                tpm=model_config['tpm'],
                 api_key=os.getenv('OPENAI_API_KEY')
             )
             self.models[model_key] = model
@@ -62,12 +405,17 @@ class MultiModelProcessor(dspy.Module):
         if model_key not in self.models:
             self.initialize_model(model_key)
         
-        dspy.configure(lm=self.models[model_key])
+        lm = self.models[model_key]
+        dspy.configure(lm=lm)
+        history_size = len(lm.history)
+        start = time.perf_counter()
         
         result = self.predictor(
             prompt=prompt,
             model_name=ModelConfig.MODELS[model_key]['name']
         )
+        latency = time.perf_counter() - start
+        usage = (lm.history[-1].get('usage') or {}) if len(lm.history) > history_size else {}
         
         return {
             'model': model_key,
@@ -75,7 +423,47 @@ class MultiModelProcessor(dspy.Module):
             'model_desc': ModelConfig.MODELS[model_key]['desc'],
             'prompt': prompt,
             'response': result.response,
-            'analysis': result.analysis
+            'analysis': result.analysis,
+            'latency': latency,
+            'cost': estimate_cost(model_key, usage)
+        }
+    
+    def process_with_router(self, prompt: str) -> Dict:
+        """성공 가능성이 충분한 가장 저렴한 모델로 처리하고, 검증 실패 시 더 강력한 모델로 승격"""
+        features = extract_prompt_features(prompt)
+        model_key, confidence = self.classifier.choose(features, RouterConfig.ROUTE_ORDER)
+        
+        path, result, valid = [], None, False
+        total_latency = total_cost = 0.0
+        for candidate in RouterConfig.ROUTE_ORDER[RouterConfig.ROUTE_ORDER.index(model_key):]:
+            path.append(candidate)
+            try:
+                attempt = self.process_with_model(prompt, candidate)
+            except Exception as e:
+                print(f"⚠️ 처리 실패 ({candidate}): {str(e)}")
+                self.classifier.update(candidate, features, False)
+                continue
+            result = attempt
+            total_latency += attempt['latency']
+            total_cost += attempt['cost']
+            valid = validate_result(attempt)
+            self.classifier.update(candidate, features, valid)
+            if valid:
+                break
+            print(f"⚠️ 응답 검증 실패 ({candidate})")
+        
+        route = '→'.join(path)
+        self.route_stats.record(route, total_latency, total_cost, valid)
+        if result is None:
+            raise RuntimeError(f"모든 모델 처리 실패 (경로: {route})")
+        
+        return {
+            **result,
+            'route': route,
+            'confidence': confidence,
+            'valid': valid,
+            'latency': total_latency,
+            'cost': total_cost
         }
     
     def process_with_all_models(self, prompt: str) -> List[Dict]:
@@ -89,6 +477,102 @@ class MultiModelProcessor(dspy.Module):
                 print(f"❌ 처리 실패 ({model_key}): {str(e)}")
         return results
 
+def append_replay_record(prompt: str, results: List[Dict], path: str = RouterConfig.REPLAY_LOG_PATH) -> None:
+    """모든 모델의 처리 결과를 오프라인 재생 벤치마크용으로 기록"""
+    record = {
+        'prompt': prompt,
+        'outcomes': {
+            result['model']: {
+                'valid': validate_result(result),
+                'latency': result['latency'],
+                'cost': result['cost']
+            }
+            for result in results
+        }
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def _is_holdout(prompt: str, fraction: float) -> bool:
+    """프롬프트 해시로 평가용 여부 결정 (같은 프롬프트는 여러 번 기록되어도 항상 같은 쪽에 속함)"""
+    bucket = int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:4], 'big') / 2 ** 32
+    return bucket < fraction
+
+def replay_benchmark(path: str = RouterConfig.REPLAY_LOG_PATH,
+                     holdout: float = RouterConfig.REPLAY_HOLDOUT) -> Dict[str, Dict[str, float]]:
+    """기록된 모델별 결과로 라우팅 정책을 오프라인 재생하여 성공률/지연/비용 비교
+
+    기록을 프롬프트 단위로 학습용과 평가용으로 나누어, 라우터 분류기는 사전 가중치에서 시작해
+    학습용 기록으로만 학습하고 모든 정책은 평가용 기록에서만 비교합니다 (표본 내 평가 방지).
+    라우터 정책은 선택한 모델이 실패하면 상위 모델로 승격하며 지연과 비용을 누적합니다.
+    """
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    evaluation = [record for record in records if _is_holdout(record['prompt'], holdout)]
+    training = [record for record in records if not _is_holdout(record['prompt'], holdout)]
+    if not evaluation:
+        return {}
+    
+    classifier = RouteClassifier()
+    for record in training:
+        features = extract_prompt_features(record['prompt'])
+        for model_key, outcome in record['outcomes'].items():
+            if model_key in classifier.weights:
+                classifier.update(model_key, features, outcome['valid'])
+    
+    policies = {'router': None, **{f'always-{key}': key for key in RouterConfig.ROUTE_ORDER}}
+    summary = {}
+    for name, fixed_model in policies.items():
+        successes = 0
+        total_latency = total_cost = 0.0
+        for record in evaluation:
+            if fixed_model is None:
+                start, _ = classifier.choose(extract_prompt_features(record['prompt']), RouterConfig.ROUTE_ORDER)
+                chain = RouterConfig.ROUTE_ORDER[RouterConfig.ROUTE_ORDER.index(start):]
+            else:
+                chain = [fixed_model]
+            for model_key in chain:
+                outcome = record['outcomes'].get(model_key)
+                if outcome is None:
+                    continue
+                total_latency += outcome['latency']
+                total_cost += outcome['cost']
+                if outcome['valid']:
+                    successes += 1
+                    break
+        summary[name] = {
+            'success_rate': successes / len(evaluation),
+            'avg_latency': total_latency / len(evaluation),
+            'avg_cost': total_cost / len(evaluation),
+            'train_records': len(training),
+            'eval_records': len(evaluation)
+        }
+    return summary
+
+def display_route_dashboard(route_stats: RouteStats) -> None:
+    """경로별 지연/비용 대시보드 출력"""
+    print("\n" + "="*50)
+    print("🧭 라우팅 경로별 대시보드")
+    for route, stats in sorted(route_stats.dashboard().items()):
+        print(f"- {route}: {stats['count']}건, 평균 {stats['avg_latency']:.2f}s (p95 {stats['p95_latency']:.2f}s), "
+              f"비용 ${stats['total_cost']:.4f} (건당 ${stats['avg_cost']:.4f}), 검증 실패 {stats['failures']}건")
+    print("="*50)
+
+def display_replay_benchmark(summary: Dict[str, Dict[str, float]]) -> None:
+    """오프라인 재생 벤치마크 결과 출력"""
+    print("\n" + "="*50)
+    if not summary:
+        print("📼 오프라인 재생 벤치마크: 평가용으로 남겨둔 기록이 아직 없습니다")
+        print("="*50)
+        return
+    counts = next(iter(summary.values()))
+    print(f"📼 오프라인 재생 벤치마크 (정책별, 학습 {counts['train_records']}건 / 평가 {counts['eval_records']}건)")
+    for name, stats in summary.items():
+        print(f"- {name}: 성공률 {stats['success_rate']:.0%}, 평균 지연 {stats['avg_latency']:.2f}s, "
+              f"평균 비용 ${stats['avg_cost']:.4f}")
+    print("="*50)
+
 def display_results(results: List[Dict]) -> None:
     """결과 출력"""
     for result in results:
@@ -129,9 +613,27 @@ def main():
         # 각 프롬프트에 대해 모든 모델로 처리
         for prompt in test_prompts:
             print("\n🔄 새로운 프롬프트 처리 시작")
-            results = processor.process_with_all_models(prompt)
+            with scheduling(priority='interactive', program='lm-dspy'):
+                results = processor.process_with_all_models(prompt)
             display_results(results)
+            append_replay_record(prompt, results)
             print("\n" + "="*50)
+
+        # 라우터로 처리: 성공 가능성이 충분한 가장 저렴한 모델부터 시도
+        print("\n🧭 라우터 기반 처리 시작")
+        for prompt in test_prompts:
+            with scheduling(priority='interactive', program='lm-dspy'):
+                result = processor.process_with_router(prompt)
+            print(f"🧭 경로: {result['route']} (신뢰도 {result['confidence']:.2f})")
+            display_results([result])
+        display_route_dashboard(processor.route_stats)
+        # 온라인 학습으로 갱신된 라우터 분류기를 재생 벤치마크에서 평가
+        display_replay_benchmark(replay_benchmark())
+
+        # 모델별 스케줄러 상태 출력
+        for model, stats in SCHEDULER.report().items():
+            print(f"⏱️ {model}: 전송 {stats.get('sent', 0)}회, 429 {stats.get('rate_limited', 0)}회, "
+                  f"현재 한도 {stats['rpm_limit']:.0f} RPM / {stats['tpm_limit']:.0f} TPM")
     
     except Exception as e:
         print(f"❌ 메인 프로세스 에러: {str(e)}")
@@ -0,0 +1,348 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import dspy
+import litellm
+
+class LMCacheConfig:
+    """2단계 LM 응답 캐시 설정"""
+    PATH = os.getenv('DSPY_LM_CACHE_PATH', str(Path.home() / '.cache' / 'dspy-examples' / 'lm_cache.sqlite'))
+    MEMORY_ENTRIES = int(os.getenv('DSPY_LM_CACHE_MEMORY_ENTRIES', 1000))       # 프로세스 내 LRU 항목 수
+    DISK_MAX_BYTES = int(os.getenv('DSPY_LM_CACHE_DISK_MAX_BYTES', 512 * 1024**2))  # 디스크 계층 최대 크기
+    EVICTION = os.getenv('DSPY_LM_CACHE_EVICTION', 'lru')                        # 'lru' 또는 'lfu'
+    EVICT_TARGET = 0.9          # 축출 시 최대 크기의 이 비율까지 줄임 (매 쓰기마다 축출하지 않도록)
+    BUSY_TIMEOUT_MS = 30000     # 다른 프로세스가 쓰는 중일 때 대기 시간 (쓰기에만 적용)
+    TOUCH_BATCH = 64            # 디스크 적중의 접근 기록(LRU 시각/LFU 횟수)을 모아서 갱신할 개수
+    # 응답 내용에 영향을 주지 않는 인자 (키에서 제외)
+    NON_SEMANTIC_PARAMS = ('api_key', 'api_base', 'base_url', 'num_retries', 'cache', 'cache_in_memory', 'timeout')
+
+def canonical_key(model: str, params: Dict[str, Any], messages: Any) -> str:
+    """(모델, 생성 인자, 메시지)의 정규화된 해시 키
+
+    키 순서와 공백이 달라도 같은 요청이면 같은 키가 되도록 정렬된 JSON으로 직렬화합니다.
+    """
+    payload = {
+        'model': model,
+        'params': {k: v for k, v in params.items() if k not in LMCacheConfig.NON_SEMANTIC_PARAMS},
+        'messages': messages
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class CacheStats:
+    """계층별 적중/미스, 읽기/쓰기 바이트, 축출 수"""
+    FIELDS = ('memory_hits', 'disk_hits', 'misses', 'bytes_read', 'bytes_written', 'evictions')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, field: str, value: int = 1) -> None:
+        with self.lock:
+            self.counts[field] += value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.lock:
+            counts = dict(self.counts)
+        lookups = counts['memory_hits'] + counts['disk_hits'] + counts['misses']
+        counts['hit_rate'] = (counts['memory_hits'] + counts['disk_hits']) / lookups if lookups else 0.0
+        return counts
+
+class MemoryTier:
+    """프로세스 내 LRU 계층 (직렬화된 바이트를 저장하여 항목 크기를 일정하게 유지)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: 'OrderedDict[str, bytes]' = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: bytes) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class DiskTier:
+    """여러 프로세스가 공유하는 SQLite 계층
+
+    WAL 모드로 읽기는 쓰기와 동시에 진행되고, 쓰기는 BEGIN IMMEDIATE로 직렬화됩니다.
+    전체 크기는 meta 테이블에 같은 트랜잭션으로 기록하여 매번 합계를 계산하지 않으며,
+    최대 크기를 넘으면 LRU(마지막 접근 시각) 또는 LFU(적중 수) 순서로 축출합니다.
+    적중 시의 접근 기록은 읽기 경로에서 쓰기 잠금을 기다리지 않도록 모아 두었다가 다음 쓰기
+    트랜잭션에서 함께 반영하거나, TOUCH_BATCH개가 쌓이면 잠금을 기다리지 않는 트랜잭션으로 반영합니다.
+    연결은 스레드와 프로세스마다 따로 열어 fork 후에도 부모의 연결을 공유하지 않습니다.
+    """
+
+    def __init__(self, path: str, max_bytes: int, eviction: str, stats: CacheStats):
+        if eviction not in ('lru', 'lfu'):
+            raise ValueError(f"지원하지 않는 축출 정책: {eviction}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.stats = stats
+        self.local = threading.local()
+        self.touch_lock = threading.Lock()
+        self.touches: Dict[str, int] = {}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lfu ON entries (hits, last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('total_bytes', 0)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=LMCacheConfig.BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.touch_lock:
+            self.touches[key] = self.touches.get(key, 0) + 1
+            pending = len(self.touches)
+        if pending >= LMCacheConfig.TOUCH_BATCH:
+            self._flush_touches(conn)
+        return row[0]
+
+    def _take_touches(self) -> Dict[str, int]:
+        with self.touch_lock:
+            touches, self.touches = self.touches, {}
+        return touches
+
+    def _restore_touches(self, touches: Dict[str, int]) -> None:
+        with self.touch_lock:
+            for key, count in touches.items():
+                self.touches[key] = self.touches.get(key, 0) + count
+
+    @staticmethod
+    def _apply_touches(conn: sqlite3.Connection, touches: Dict[str, int]) -> None:
+        now = time.time()
+        conn.executemany("UPDATE entries SET last_access = ?, hits = hits + ? WHERE key = ?",
+                         [(now, count, key) for key, count in touches.items()])
+
+    def _flush_touches(self, conn: sqlite3.Connection) -> None:
+        """모아 둔 접근 기록을 잠금 대기 없이 반영 (다른 프로세스가 쓰는 중이면 다음 기회로 미룸)"""
+        touches = self._take_touches()
+        if not touches:
+            return
+        conn.execute('PRAGMA busy_timeout = 0')
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            self._restore_touches(touches)
+            return
+        finally:
+            conn.execute(f'PRAGMA busy_timeout = {LMCacheConfig.BUSY_TIMEOUT_MS}')
+        try:
+            self._apply_touches(conn, touches)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            self._restore_touches(touches)
+            raise
+
+    def put(self, key: str, value: bytes) -> None:
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        # 이미 쓰기 잠금을 잡았으므로 모아 둔 접근 기록도 같은 트랜잭션에서 반영 (축출 순서에도 반영됨)
+        touches = self._take_touches()
+        try:
+            self._apply_touches(conn, touches)
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO entries (key, value, size, last_access, hits) VALUES (?, ?, ?, ?, 0)",
+                         (key, value, len(value), time.time()))
+            delta = len(value) - (old[0] if old else 0)
+            total = conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes' RETURNING value",
+                                 (delta,)).fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            self._restore_touches(touches)
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, total: int) -> None:
+        order = 'last_access' if self.eviction == 'lru' else 'hits, last_access'
+        target = int(self.max_bytes * LMCacheConfig.EVICT_TARGET)
+        freed = evicted = 0
+        for key, size in conn.execute(f"SELECT key, size FROM entries ORDER BY {order}").fetchall():
+            if total - freed <= target:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            freed += size
+            evicted += 1
+        conn.execute("UPDATE meta SET value = value - ? WHERE name = 'total_bytes'", (freed,))
+        self.stats.add('evictions', evicted)
+
+    def usage(self) -> Tuple[int, int]:
+        """(항목 수, 전체 바이트)"""
+        conn = self._conn()
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+        return count, total
+
+class TwoTierCache:
+    """프로세스 내 LRU → 공유 SQLite 순서로 조회하는 2단계 캐시"""
+
+    def __init__(self, path: str = LMCacheConfig.PATH, memory_entries: int = LMCacheConfig.MEMORY_ENTRIES,
+                 disk_max_bytes: int = LMCacheConfig.DISK_MAX_BYTES, eviction: str = LMCacheConfig.EVICTION):
+        self.stats = CacheStats()
+        self.memory = MemoryTier(memory_entries)
+        self.disk = DiskTier(path, disk_max_bytes, eviction, self.stats)
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats.add('memory_hits')
+            return value
+        value = self.disk.get(key)
+        if value is not None:
+            self.stats.add('disk_hits')
+            self.stats.add('bytes_read', len(value))
+            self.memory.put(key, value)
+            return value
+        self.stats.add('misses')
+        return None
+
+    def put(self, key: str, value: bytes) -> None:
+        self.memory.put(key, value)
+        self.disk.put(key, value)
+        self.stats.add('bytes_written', len(value))
+
+    def report(self) -> Dict[str, float]:
+        entries, total = self.disk.usage()
+        return {**self.stats.snapshot(), 'disk_entries': entries, 'disk_bytes': total}
+
+_caches: Dict[str, TwoTierCache] = {}
+_caches_lock = threading.Lock()
+
+def get_cache(path: str = LMCacheConfig.PATH) -> TwoTierCache:
+    """경로별 프로세스 공용 캐시 (같은 경로를 쓰는 LM은 메모리 계층과 통계를 공유)"""
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = TwoTierCache(path, LMCacheConfig.MEMORY_ENTRIES, LMCacheConfig.DISK_MAX_BYTES,
+                                         LMCacheConfig.EVICTION)
+        return _caches[path]
+
+def _reset_after_fork() -> None:
+    """fork 시점에 다른 스레드가 잡고 있던 잠금이 자식 프로세스에서 풀리지 않는 문제 방지"""
+    global _caches_lock
+    _caches_lock = threading.Lock()
+    for cache in _caches.values():
+        cache.memory.lock = threading.Lock()
+        cache.stats.lock = threading.Lock()
+        # 부모가 모아 둔 접근 기록은 부모가 반영하므로 자식에서는 버림
+        cache.disk.touch_lock = threading.Lock()
+        cache.disk.touches = {}
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def encode_response(response) -> bytes:
+    return zlib.compress(json.dumps(response.model_dump(), ensure_ascii=False, default=str).encode('utf-8'))
+
+def decode_response(value: bytes):
+    return litellm.ModelResponse(**json.loads(zlib.decompress(value)))
+
+def _cached_response(value: bytes):
+    response = decode_response(value)
+    response.cache_hit = True
+    return response
+
+class CachedLM(dspy.LM):
+    """2단계 캐시(프로세스 내 LRU + 공유 SQLite)를 사용하는 dspy.LM
+
+    dspy 기본 캐시와 중복 저장하지 않도록 cache=False로 생성합니다. 캐시에서 반환한 응답은
+    cache_hit으로 표시되어 사용량 집계에서 제외됩니다. 호출 시 cache=False를 주면(파싱 실패 재시도 등)
+    두 계층을 모두 거치지 않고 새로 요청합니다. 캐시 객체는 경로로만 참조하므로
+    LM을 복사하거나 스냅샷으로 저장해도 SQLite 연결이 함께 복사되지 않습니다.
+    """
+
+    def __init__(self, model: str, cache_path: str = LMCacheConfig.PATH, **kwargs):
+        kwargs['cache'] = False
+        super().__init__(model, **kwargs)
+        self.cache_path = cache_path
+
+    @property
+    def response_cache(self) -> TwoTierCache:
+        return get_cache(self.cache_path)
+
+    def init_kwargs(self) -> Dict[str, Any]:
+        """스냅샷 복원 시 생성자에 전달할 추가 인자"""
+        return {'cache_path': self.cache_path}
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        messages = messages or [{'role': 'user', 'content': prompt}]
+        if not kwargs.pop('cache', True):
+            return super().forward(messages=messages, **kwargs)
+        key = canonical_key(self.model, {**self.kwargs, **kwargs}, messages)
+        cache = self.response_cache
+        value = cache.get(key)
+        if value is not None:
+            return _cached_response(value)
+
+        response = super().forward(messages=messages, **kwargs)
+        cache.put(key, encode_response(response))
+        return response
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        messages = messages or [{'role': 'user', 'content': prompt}]
+        if not kwargs.pop('cache', True):
+            return await super().aforward(messages=messages, **kwargs)
+        key = canonical_key(self.model, {**self.kwargs, **kwargs}, messages)
+        cache = self.response_cache
+        # SQLite 계층 접근이 이벤트 루프를 막지 않도록 스레드에서 실행
+        value = await asyncio.to_thread(cache.get, key)
+        if value is not None:
+            return _cached_response(value)
+
+        response = await super().aforward(messages=messages, **kwargs)
+        await asyncio.to_thread(cache.put, key, encode_response(response))
+        return response
+
+def display_cache_report(lm: Optional[CachedLM] = None) -> None:
+    """캐시 적중률, 계층별 적중 수, 바이트 통계 출력"""
+    cache = lm.response_cache if lm is not None else get_cache()
+    report = cache.report()
+    print("\n" + "="*50)
+    print("🗄️ LM 응답 캐시")
+    print(f"- 적중률: {report['hit_rate']:.0%} (메모리 {report['memory_hits']}건, 디스크 {report['disk_hits']}건, "
+          f"미스 {report['misses']}건)")
+    print(f"- 읽기 {report['bytes_read'] / 1024:.1f} KB, 쓰기 {report['bytes_written'] / 1024:.1f} KB, "
+          f"축출 {report['evictions']}건")
+    print(f"- 디스크 계층: {report['disk_entries']}개 항목, {report['disk_bytes'] / 1024:.1f} KB")
+    print("="*50)
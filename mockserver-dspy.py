@@ -0,0 +1,416 @@
+import argparse
+import email.parser
+import email.policy
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+class MockServerConfig:
+    """모의 LM 서버 설정"""
+    HOST = '127.0.0.1'
+    PORT = 8765
+    LATENCY = 'lognormal'        # 첫 토큰까지의 지연 분포: constant / uniform / lognormal
+    LATENCY_MEAN = 0.3           # 평균 지연(초)
+    LATENCY_JITTER = 0.5         # uniform: ±비율, lognormal: 로그 표준편차
+    TOKENS_PER_SECOND = 200.0    # 출력 토큰 생성 속도 (0이면 즉시)
+    ERROR_RATE = 0.0             # 500 오류 주입 비율
+    RATE_LIMIT_RATE = 0.0        # 429 오류 주입 비율
+    RETRY_AFTER = 1              # 429 응답의 Retry-After(초)
+    EMBEDDING_DIM = 512          # 임베딩 차원
+    BATCH_DURATION = 1.0         # 배치 작업이 완료되기까지 걸리는 시간(초)
+
+# 출력 필드 이름별 고정 응답 (설정 파일로 덮어쓸 수 있음)
+CANNED_FIELD_VALUES: Dict[str, Any] = {
+    'generated_code': "final_answer({'solution': 'mock'})",
+    'final_generated_code': "final_answer({'solution': 'mock'})",
+    'next_tool_args': {},
+    'score': 0.8,
+}
+
+def estimate_tokens(text: str) -> int:
+    """문자 수 기반의 대략적인 토큰 수 추정"""
+    return len(text) // 4 + 1
+
+def sample_latency(config: MockServerConfig) -> float:
+    """설정된 분포에서 첫 토큰까지의 지연 시간 샘플링"""
+    if config.LATENCY == 'constant':
+        return config.LATENCY_MEAN
+    if config.LATENCY == 'uniform':
+        spread = config.LATENCY_MEAN * config.LATENCY_JITTER
+        return random.uniform(config.LATENCY_MEAN - spread, config.LATENCY_MEAN + spread)
+    # lognormal: 평균이 LATENCY_MEAN이 되도록 mu 보정
+    sigma = config.LATENCY_JITTER
+    mu = math.log(max(config.LATENCY_MEAN, 1e-6)) - sigma ** 2 / 2
+    return random.lognormvariate(mu, sigma)
+
+def parse_output_fields(messages: List[Dict[str, Any]]) -> Dict[str, str]:
+    """DSPy 어댑터가 만든 시스템 메시지에서 출력 필드 이름과 타입 추출"""
+    system = next((m['content'] for m in messages if m.get('role') == 'system'), '')
+    if isinstance(system, list):
+        system = ''.join(part.get('text', '') for part in system)
+    section = system.split('Your output fields are:', 1)
+    if len(section) < 2:
+        return {'response': 'str'}
+    section = section[1].split('All interactions will be structured', 1)[0]
+    return dict(re.findall(r"^\d+\. `(\w+)` \(([^)]*)\)", section, re.MULTILINE))
+
+def canned_value(name: str, type_name: str) -> Any:
+    """필드 타입에 맞는 모의 값 생성"""
+    if name in CANNED_FIELD_VALUES:
+        return CANNED_FIELD_VALUES[name]
+    if type_name.startswith('Literal['):
+        options = re.findall(r"'([^']*)'", type_name)
+        # ReAct는 finish를 선택해야 궤적이 바로 끝납니다.
+        return 'finish' if 'finish' in options else (options[0] if options else '')
+    if type_name == 'float':
+        return 0.5
+    if type_name == 'int':
+        return 1
+    if type_name == 'bool':
+        return True
+    if type_name.startswith(('list', 'List')):
+        element = re.search(r'\[(\w+)\]', type_name)
+        if element and element.group(1) in ('float', 'int', 'bool'):
+            return [canned_value(name, element.group(1))] * 2
+        return ['모의 단계 1', '모의 단계 2']
+    if type_name.startswith(('dict', 'Dict')):
+        return {}
+    return f'모의 {name} 응답입니다.'
+
+def build_completion_text(body: Dict[str, Any]) -> str:
+    """요청된 출력 필드를 채운 구조화 응답 생성 (JSON 모드면 JSON 객체)"""
+    fields = parse_output_fields(body.get('messages', []))
+    values = {name: canned_value(name, type_name) for name, type_name in fields.items()}
+    if body.get('response_format'):
+        return json.dumps(values, ensure_ascii=False)
+
+    parts = []
+    for name, value in values.items():
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        parts.append(f'[[ ## {name} ## ]]\n{text}')
+    parts.append('[[ ## completed ## ]]')
+    return '\n\n'.join(parts)
+
+def build_chat_completion(body: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenAI chat.completion 형식의 응답 본문 생성"""
+    text = build_completion_text(body)
+    prompt_tokens = sum(estimate_tokens(json.dumps(m.get('content', ''), ensure_ascii=False))
+                        for m in body.get('messages', []))
+    completion_tokens = estimate_tokens(text) * (body.get('n') or 1)
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex[:12]}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'mock-model'),
+        # n개 샘플 요청이면 같은 응답을 n개의 choice로 반환
+        'choices': [{'index': i, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}
+                    for i in range(body.get('n') or 1)],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+    }
+
+class MockBatchStore:
+    """/v1/files, /v1/batches 모의 저장소 (배치는 BATCH_DURATION 뒤 백그라운드에서 완료)"""
+
+    def __init__(self, config=MockServerConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> Dict[str, Any]:
+        file_id = f'file-{uuid.uuid4().hex[:12]}'
+        meta = {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'status': 'processed'}
+        with self.lock:
+            self.files[file_id] = {'meta': meta, 'content': content}
+        return meta
+
+    def create_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        batch = {
+            'id': f'batch_{uuid.uuid4().hex[:12]}',
+            'object': 'batch',
+            'endpoint': body.get('endpoint', '/v1/chat/completions'),
+            'input_file_id': body['input_file_id'],
+            'completion_window': body.get('completion_window', '24h'),
+            'status': 'validating',
+            'output_file_id': None,
+            'error_file_id': None,
+            'created_at': int(time.time()),
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+            'metadata': body.get('metadata')
+        }
+        with self.lock:
+            self.batches[batch['id']] = batch
+        threading.Thread(target=self._run_batch, args=(batch['id'],), daemon=True).start()
+        return dict(batch)
+
+    def _run_batch(self, batch_id: str) -> None:
+        with self.lock:
+            batch = self.batches[batch_id]
+            lines = self.files[batch['input_file_id']]['content'].decode('utf-8').splitlines()
+            batch['status'] = 'in_progress'
+            batch['request_counts'] = {'total': len(list(filter(str.strip, lines))), 'completed': 0, 'failed': 0}
+        time.sleep(self.config.BATCH_DURATION)
+
+        outputs, errors = [], []
+        for line in filter(str.strip, lines):
+            request = json.loads(line)
+            record = {'id': f'batch_req_{uuid.uuid4().hex[:12]}', 'custom_id': request['custom_id']}
+            if random.random() < self.config.ERROR_RATE:
+                record.update(response=None, error={'code': 'server_error', 'message': 'Internal server error (mock)'})
+                errors.append(record)
+            else:
+                record.update(response={'status_code': 200, 'request_id': uuid.uuid4().hex[:12],
+                                        'body': build_chat_completion(request['body'])}, error=None)
+                outputs.append(record)
+
+        def to_file(records: List[Dict[str, Any]], suffix: str) -> Optional[str]:
+            if not records:
+                return None
+            content = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+            return self.add_file(f'{batch_id}_{suffix}.jsonl', 'batch_output', content)['id']
+
+        output_file_id, error_file_id = to_file(outputs, 'output'), to_file(errors, 'error')
+        with self.lock:
+            batch.update(status='completed', output_file_id=output_file_id, error_file_id=error_file_id,
+                         completed_at=int(time.time()),
+                         request_counts={'total': len(outputs) + len(errors),
+                                         'completed': len(outputs), 'failed': len(errors)})
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            return dict(batch) if batch else None
+
+    def get_file(self, file_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.files.get(file_id)
+
+class MockServerStats:
+    """서버 측 요청 통계"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'errors': 0, 'rate_limited': 0}
+
+    def record(self, key: str) -> None:
+        with self.lock:
+            self.counts[key] += 1
+
+class MockLMHandler(BaseHTTPRequestHandler):
+    """OpenAI 호환 /v1/chat/completions, /v1/embeddings 엔드포인트 처리"""
+    protocol_version = 'HTTP/1.1'
+    config = MockServerConfig
+    stats: Optional[MockServerStats] = None
+    batch_store: Optional[MockBatchStore] = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        batch_match = re.search(r'/batches/([\w-]+)$', path)
+        file_match = re.search(r'/files/([\w-]+)(/content)?$', path)
+        if path.endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock-model', 'object': 'model'}]})
+        elif batch_match and self.batch_store.get_batch(batch_match.group(1)):
+            self._send_json(200, self.batch_store.get_batch(batch_match.group(1)))
+        elif file_match and self.batch_store.get_file(file_match.group(1)):
+            stored = self.batch_store.get_file(file_match.group(1))
+            if not file_match.group(2):
+                self._send_json(200, stored['meta'])
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(stored['content'])))
+            self.end_headers()
+            self.wfile.write(stored['content'])
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def handle_file_upload(self, raw: bytes) -> None:
+        """multipart/form-data 파일 업로드 처리"""
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8')
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + raw)
+        fields, filename, content = {}, 'upload.jsonl', b''
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if part.get_filename():
+                filename, content = part.get_filename(), part.get_payload(decode=True)
+            else:
+                fields[name] = part.get_payload(decode=True).decode('utf-8')
+        self._send_json(200, self.batch_store.add_file(filename, fields.get('purpose', 'batch'), content))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length)
+
+        # 배치 API (오류 주입은 배치 안의 개별 요청에 적용)
+        if self.path.rstrip('/').endswith('/files'):
+            self.handle_file_upload(raw)
+            return
+        if self.path.rstrip('/').endswith('/batches'):
+            self._send_json(200, self.batch_store.create_batch(json.loads(raw or b'{}')))
+            return
+
+        body = json.loads(raw or b'{}')
+        self.stats.record('requests')
+
+        # 오류 및 429 주입
+        roll = random.random()
+        if roll < self.config.RATE_LIMIT_RATE:
+            self.stats.record('rate_limited')
+            self._send_json(429, {'error': {'message': 'Rate limit exceeded (mock)', 'type': 'rate_limit_error'}},
+                            {'Retry-After': str(self.config.RETRY_AFTER)})
+            return
+        if roll < self.config.RATE_LIMIT_RATE + self.config.ERROR_RATE:
+            self.stats.record('errors')
+            self._send_json(500, {'error': {'message': 'Internal server error (mock)', 'type': 'server_error'}})
+            return
+
+        if self.path.rstrip('/').endswith('/embeddings'):
+            self.handle_embeddings(body)
+        elif self.path.rstrip('/').endswith('/chat/completions'):
+            self.handle_chat(body)
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def handle_embeddings(self, body: Dict[str, Any]) -> None:
+        inputs = body.get('input', [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        dim = body.get('dimensions') or self.config.EMBEDDING_DIM
+        time.sleep(sample_latency(self.config) / 4)
+
+        data = []
+        for i, text in enumerate(inputs):
+            # 같은 텍스트는 항상 같은 벡터가 나오도록 텍스트 기반 시드 사용
+            rng = random.Random(str(text))
+            data.append({'object': 'embedding', 'index': i, 'embedding': [rng.uniform(-1, 1) for _ in range(dim)]})
+        tokens = sum(estimate_tokens(str(text)) for text in inputs)
+        self._send_json(200, {
+            'object': 'list',
+            'data': data,
+            'model': body.get('model', 'mock-embedding'),
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}
+        })
+
+    def handle_chat(self, body: Dict[str, Any]) -> None:
+        completion = build_chat_completion(body)
+        text = completion['choices'][0]['message']['content']
+        usage = completion['usage']
+        completion_id = completion['id']
+        model = completion['model']
+        rate = self.config.TOKENS_PER_SECOND
+
+        time.sleep(sample_latency(self.config))
+
+        if not body.get('stream'):
+            time.sleep(usage['completion_tokens'] / rate if rate else 0)
+            self._send_json(200, completion)
+            return
+
+        # 스트리밍 응답: 약 4글자(1토큰)씩 토큰 속도에 맞춰 전송
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        def send_event(payload: Dict[str, Any]) -> None:
+            self.wfile.write(f'data: {json.dumps(payload, ensure_ascii=False)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+
+        for start in range(0, len(text), 4):
+            send_event({
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': text[start:start + 4]}, 'finish_reason': None}]
+            })
+            time.sleep(1 / rate if rate else 0)
+        send_event({
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            'usage': usage
+        })
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+        self.close_connection = True
+
+class MockHTTPServer(ThreadingHTTPServer):
+    """클라이언트가 요청을 취소해 연결을 끊은 경우(헤지 요청, 마감 시간 초과 등)는 오류로 출력하지 않는 서버"""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+def start_mock_server(config=MockServerConfig, port: Optional[int] = None):
+    """모의 서버를 백그라운드 스레드에서 시작하고 (서버, 기본 URL) 반환"""
+    handler = type('ConfiguredMockLMHandler', (MockLMHandler,),
+                   {'config': config, 'stats': MockServerStats(), 'batch_store': MockBatchStore(config)})
+    server = MockHTTPServer((config.HOST, config.PORT if port is None else port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, bound_port = server.server_address[:2]
+    return server, f'http://{host}:{bound_port}/v1'
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI 호환 모의 LM 서버')
+    parser.add_argument('--port', type=int, default=MockServerConfig.PORT)
+    parser.add_argument('--latency', choices=['constant', 'uniform', 'lognormal'], default=MockServerConfig.LATENCY)
+    parser.add_argument('--latency-mean', type=float, default=MockServerConfig.LATENCY_MEAN)
+    parser.add_argument('--latency-jitter', type=float, default=MockServerConfig.LATENCY_JITTER)
+    parser.add_argument('--tokens-per-second', type=float, default=MockServerConfig.TOKENS_PER_SECOND)
+    parser.add_argument('--error-rate', type=float, default=MockServerConfig.ERROR_RATE)
+    parser.add_argument('--rate-limit-rate', type=float, default=MockServerConfig.RATE_LIMIT_RATE)
+    parser.add_argument('--responses', help='필드 이름별 고정 응답을 담은 JSON 파일')
+    args = parser.parse_args()
+
+    MockServerConfig.LATENCY = args.latency
+    MockServerConfig.LATENCY_MEAN = args.latency_mean
+    MockServerConfig.LATENCY_JITTER = args.latency_jitter
+    MockServerConfig.TOKENS_PER_SECOND = args.tokens_per_second
+    MockServerConfig.ERROR_RATE = args.error_rate
+    MockServerConfig.RATE_LIMIT_RATE = args.rate_limit_rate
+    if args.responses:
+        with open(args.responses, encoding='utf-8') as f:
+            CANNED_FIELD_VALUES.update(json.load(f))
+
+    server, base_url = start_mock_server(port=args.port)
+    print(f"🧪 모의 LM 서버 실행 중: {base_url}")
+    print(f"   dspy.LM('openai/mock-model', api_base='{base_url}', api_key='mock')")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n📊 요청 통계: {server.RequestHandlerClass.stats.counts}")
+
+if __name__ == "__main__":
+    main()
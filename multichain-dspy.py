@@ -1,12 +1,25 @@
+import argparse
+import hashlib
+import math
+from collections import Counter
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
+from dspy.utils.exceptions import AdapterParseError
 import dotenv
-import os
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM
 
 def setup_environment():
     """환경 설정 및 LM 초기화"""
     dotenv.load_dotenv()
-    lm = dspy.LM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
-    dspy.configure(lm=lm)
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    lm = CachedLM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
+    # 구조화 출력(JSON 스키마) 모드로 score: float 등 타입 필드를 제약하여 파싱 실패 재시도를 줄입니다.
+    dspy.configure(lm=lm, adapter=dspy.JSONAdapter())
 
 class AnswerGenerator(dspy.Signature):
     """질문에 대한 답변을 생성합니다."""
@@ -22,27 +35,115 @@ class AnswerValidator(dspy.Signature):
     score: float = dspy.OutputField(desc="답변의 품질 점수 (0-1)")
     explanation: str = dspy.OutputField(desc="평가 설명")
 
-def process_question(question: str) -> None:
+class ListwiseValidator(dspy.Signature):
+    """여러 후보 답변의 품질을 한 번에 비교 평가합니다."""
+    question: str = dspy.InputField(desc="원래 질문")
+    candidates: list[str] = dspy.InputField(desc="번호가 매겨진 후보 답변과 추론 과정 목록")
+    scores: list[float] = dspy.OutputField(desc="후보 순서대로 각 답변의 품질 점수 (0-1), 후보 수와 같은 길이")
+    explanation: str = dspy.OutputField(desc="평가 설명")
+
+class ScoringConfig:
+    """후보 답변 평가 설정"""
+    NUM_CANDIDATES = 3           # 생성할 후보 답변 수
+    MODE = 'listwise'            # 'listwise': 한 번의 호출로 모든 후보 평가, 'pointwise': 후보마다 호출
+    PREFILTER = True             # 평가 전에 거의 같은 후보를 제거 (최종 답이 같은 후보끼리만)
+    SIMILARITY_THRESHOLD = 0.9   # 이 코사인 유사도 이상이면 중복 후보로 간주
+    EMBEDDING_DIM = 2048         # 로컬 해시 임베딩 차원
+    NGRAM = 3                    # 문자 n-gram 크기 (한국어는 띄어쓰기보다 문자 단위가 안정적)
+
+def embed_locally(texts: list[str]) -> list[dict[int, float]]:
+    """문자 n-gram 해시 벡터로 만든 L2 정규화 희소 임베딩 (API 호출 없음, numpy 불필요)"""
+    def bucket(ngram: str) -> int:
+        digest = hashlib.blake2b(ngram.encode('utf-8'), digest_size=4).digest()
+        return int.from_bytes(digest, 'little') % ScoringConfig.EMBEDDING_DIM
+
+    vectors = []
+    for text in texts:
+        text = ' '.join(text.split())
+        counts = Counter(bucket(text[i:i + ScoringConfig.NGRAM])
+                         for i in range(max(len(text) - ScoringConfig.NGRAM + 1, 1)))
+        norm = max(math.sqrt(sum(count * count for count in counts.values())), 1e-12)
+        vectors.append({bucket: count / norm for bucket, count in counts.items()})
+    return vectors
+
+def cosine_similarity(a: dict[int, float], b: dict[int, float]) -> float:
+    """정규화된 희소 벡터의 코사인 유사도 (작은 쪽 벡터만 순회)"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(bucket, 0.0) for bucket, value in a.items())
+
+def prefilter_candidates(answers: list, threshold: float = ScoringConfig.SIMILARITY_THRESHOLD) -> list[int]:
+    """후보별 대표 후보 인덱스 목록 반환
+
+    앞서 남긴 후보와 최종 답이 같고 유사도가 threshold 이상이면 그 후보를 대표로, 아니면 자기 자신을
+    대표로 삼습니다. 추론이 비슷해도 답이 다르면 점수를 공유하지 않도록 답 일치를 먼저 확인합니다.
+    유사도는 답이 같은 후보 쌍에 대해서만 계산합니다.
+    """
+    vectors = embed_locally([f"{ans.reasoning}\n{ans.answer}" for ans in answers])
+    final_answers = [' '.join(str(ans.answer).split()).lower() for ans in answers]
+    kept = []
+    representatives = []
+    for i in range(len(answers)):
+        duplicate_of = next((k for k in kept if final_answers[i] == final_answers[k]
+                             and cosine_similarity(vectors[i], vectors[k]) >= threshold), None)
+        if duplicate_of is None:
+            kept.append(i)
+        representatives.append(i if duplicate_of is None else duplicate_of)
+    return representatives
+
+def score_pointwise(question: str, answers: list) -> tuple[list[float], int]:
+    """후보마다 AnswerValidator를 호출하여 점수 계산 (호출 수 N)"""
+    validator = dspy.Predict(AnswerValidator)
+    scores = []
+    for ans in answers:
+        validation = validator(
+            question=question,
+            candidate_answer=ans.answer,
+            reasoning=ans.reasoning
+        )
+        scores.append(validation.score)
+    return scores, len(answers)
+
+def score_listwise(question: str, answers: list) -> tuple[list[float], int]:
+    """모든 후보를 한 번의 구조화 출력 호출로 평가 (호출 수 1)
+
+    출력을 파싱하지 못하거나 반환된 점수 수가 후보 수와 다르면 후보별 평가로 대체합니다.
+    """
+    validator = dspy.Predict(ListwiseValidator)
+    candidates = [f"후보 {i}: {ans.answer}\n추론: {ans.reasoning}" for i, ans in enumerate(answers, 1)]
+    try:
+        result = validator(question=question, candidates=candidates)
+    except (AdapterParseError, RuntimeError) as e:
+        # JSONAdapter는 점수 타입 변환 실패를 구조화 출력/JSON 모드 모두 실패한 RuntimeError로 보고함
+        print(f"⚠️ 일괄 평가 결과를 파싱하지 못해 후보별 평가로 대체합니다: {e}")
+        scores, calls = score_pointwise(question, answers)
+        return scores, calls + 1
+    if len(result.scores) != len(answers):
+        print(f"⚠️ 점수 {len(result.scores)}개가 후보 {len(answers)}개와 맞지 않아 후보별 평가로 대체합니다")
+        scores, calls = score_pointwise(question, answers)
+        return scores, calls + 1
+    return [float(score) for score in result.scores], 1
+
+def process_question(question: str, mode: str = ScoringConfig.MODE, prefilter: bool = ScoringConfig.PREFILTER) -> None:
     """질문을 처리하고 최적의 답변을 선택"""
-    # 생성기와 검증기 생성
+    # 생성기 생성
     generator = dspy.Predict(AnswerGenerator)
-    validator = dspy.Predict(AnswerValidator)
     
     # 여러 답변 생성
     answers = []
-    for _ in range(3):  # 3개의 답변 생성
+    for _ in range(ScoringConfig.NUM_CANDIDATES):
         result = generator(question=question)
         answers.append(result)
     
-    # 각 답변 평가
-    scored_answers = []
-    for ans in answers:
-        validation = validator(
-            question=question,
-            candidate_answer=ans.answer,
-            reasoning=ans.reasoning
-        )
-        scored_answers.append((ans, validation.score))
+    # 거의 같은 후보는 평가하지 않고 대표 후보의 점수를 공유
+    representatives = prefilter_candidates(answers) if prefilter else list(range(len(answers)))
+    unique = sorted(set(representatives))
+    
+    # 남은 후보 평가 (listwise: 1회 호출, pointwise: 후보 수만큼 호출)
+    score_fn = score_listwise if mode == 'listwise' else score_pointwise
+    unique_scores, calls = score_fn(question, [answers[i] for i in unique])
+    score_by_index = dict(zip(unique, unique_scores))
+    scored_answers = [(ans, score_by_index[representatives[i]]) for i, ans in enumerate(answers)]
     
     # 최고 점수의 답변 선택
     best_answer = max(scored_answers, key=lambda x: x[1])
@@ -51,16 +152,24 @@ def process_question(question: str) -> None:
     print(f"\n질문: {question}\n")
     print("생성된 답변들:")
     for i, (answer, score) in enumerate(scored_answers, 1):
-        print(f"\n답변 {i} (점수: {score:.2f}):")
+        duplicate = f", 답변 {representatives[i - 1] + 1}과 중복" if representatives[i - 1] != i - 1 else ""
+        print(f"\n답변 {i} (점수: {score:.2f}{duplicate}):")
         print(f"추론: {answer.reasoning}")
         print(f"답변: {answer.answer}")
     
     print(f"\n👑 최적의 답변 (점수: {best_answer[1]:.2f}):")
     print(f"추론: {best_answer[0].reasoning}")
     print(f"답변: {best_answer[0].answer}")
+    print(f"\n🧮 평가 호출: {calls}회 ({mode}, 후보 {len(answers)}개 중 {len(unique)}개 평가)")
     print("\n" + "="*50)
 
 def main():
+    parser = argparse.ArgumentParser(description='여러 답변을 생성하고 검증기로 최적의 답변 선택')
+    parser.add_argument('--scoring', choices=['listwise', 'pointwise'], default=ScoringConfig.MODE,
+                        help='listwise: 모든 후보를 한 번에 평가, pointwise: 후보마다 평가')
+    parser.add_argument('--no-prefilter', action='store_true', help='유사 후보 사전 제거 비활성화')
+    args = parser.parse_args()
+
     # 환경 설정
     setup_environment()
     
@@ -73,7 +182,7 @@ def main():
     
     # 각 질문에 대해 처리
     for question in test_questions:
-        process_question(question)
+        process_question(question, args.scoring, not args.no_prefilter)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
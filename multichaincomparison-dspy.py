@@ -1,11 +1,18 @@
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM
 
 def setup_environment():
     """환경 설정 및 LM 초기화"""
     dotenv.load_dotenv()
-    lm = dspy.LM('openai/gpt-4-turbo', api_key=os.getenv('OPENAI_API_KEY'))
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    lm = CachedLM('openai/gpt-4-turbo', api_key=os.getenv('OPENAI_API_KEY'))
     dspy.configure(lm=lm)
 
 class MathProblemSignature(dspy.Signature):
@@ -0,0 +1,328 @@
+import argparse
+import contextvars
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
+import dspy
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+class OptimizeConfig:
+    """최적화/평가 엔진 설정"""
+    NUM_THREADS = 16            # (후보, 예제) 평가 동시 실행 수
+    NUM_CANDIDATES = 6          # 제안할 후보 프로그램 수 (zero-shot, labeled few-shot 포함)
+    TRAIN_SIZE = 20             # 데모 부트스트랩용 예제 수
+    DEV_SIZE = 64               # 평가용 예제 수
+    MIN_EXAMPLES = 8            # successive halving 첫 단계의 예제 수
+    ETA = 2                     # 단계마다 남길 후보 비율(1/ETA)과 예제 증가 배수
+    MAX_BOOTSTRAPPED_DEMOS = 3
+    MAX_LABELED_DEMOS = 4
+    BOOTSTRAP_MIN_F1 = 0.5      # 부트스트랩 데모로 채택할 교사 답변의 최소 토큰 F1
+    MAX_MEMO_ENTRIES = 50000    # 중복 제거용 응답 메모 최대 항목 수
+    SEED = 0
+
+# 최적화 대상 프로그램: (스크립트, 입력 필드)
+PROGRAMS = {
+    'template': ('template-dspy.py', ('question', 'context')),
+    'rag': ('retrieve-dspy.py', ('question',)),
+}
+
+# 예측 결과에서 답변으로 사용할 필드 (프로그램마다 출력 필드 이름이 다름)
+ANSWER_FIELDS = ('response', 'final_answer', 'detailed_answer', 'answer')
+
+def load_script(filename: str):
+    """하이픈이 포함된 예제 스크립트를 모듈로 로드 (main()은 실행되지 않음)"""
+    path = SCRIPT_DIR / filename
+    module_name = path.stem.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def request_key(model: str, prompt: Any, messages: Any, kwargs: Dict[str, Any]) -> str:
+    """모델, 프롬프트/메시지, 생성 인자로 만든 요청 식별 키 (API 키는 제외)"""
+    payload = {'model': model, 'prompt': prompt, 'messages': messages,
+               'kwargs': {k: v for k, v in kwargs.items() if k != 'api_key'}}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+class SingleFlightLM(dspy.LM):
+    """후보 프로그램과 시행 사이에서 같은 (프롬프트, 입력) 호출을 한 번만 보내는 dspy.LM
+
+    - 이미 응답을 받은 요청은 메모에서 바로 반환합니다.
+    - 같은 요청이 진행 중이면 새로 보내지 않고 먼저 보낸 요청의 응답을 기다립니다.
+      (dspy 디스크 캐시는 완료된 요청만 재사용하므로 병렬 평가에서 동시에 발생하는 중복은 막지 못합니다)
+    - cache=False 요청(파싱 실패 재시도 등)은 메모와 진행 중 요청을 거치지 않고 항상 새로 보냅니다.
+    """
+
+    def __init__(self, model: str, max_entries: int = OptimizeConfig.MAX_MEMO_ENTRIES, **kwargs):
+        super().__init__(model, **kwargs)
+        self.max_entries = max_entries
+        self.flight_lock = threading.Lock()
+        self.inflight: Dict[str, Future] = {}
+        self.memo: 'OrderedDict[str, Any]' = OrderedDict()
+        self.dedup_stats: Dict[str, int] = defaultdict(int)
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        if not kwargs.get('cache', self.cache):
+            with self.flight_lock:
+                self.dedup_stats['requests'] += 1
+                self.dedup_stats['sent'] += 1
+            return super().forward(prompt=prompt, messages=messages, **kwargs)
+
+        key = request_key(self.model, prompt, messages, {**self.kwargs, **kwargs})
+        with self.flight_lock:
+            self.dedup_stats['requests'] += 1
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                self.dedup_stats['memo_hits'] += 1
+                return self.memo[key]
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+                self.dedup_stats['sent'] += 1
+            else:
+                self.dedup_stats['joined'] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            response = super().forward(prompt=prompt, messages=messages, **kwargs)
+        except BaseException as e:
+            with self.flight_lock:
+                self.inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self.flight_lock:
+            self.inflight.pop(key, None)
+            self.memo[key] = response
+            if len(self.memo) > self.max_entries:
+                self.memo.popitem(last=False)
+        future.set_result(response)
+        return response
+
+def build_examples(df, size: int, seed: int = OptimizeConfig.SEED) -> List[dspy.Example]:
+    """CustomDataLoader.load_dataset('qa') 결과(text 컬럼)에서 질문/참고 정보/참조 답변 예제 생성
+
+    기술 QA 코퍼스에는 질문-정답 쌍이 없으므로 각 문서의 첫 문장을 질문으로, 바로 다음 문장을
+    참조 답변으로, 그 뒤의 문장들을 참고 정보로 사용합니다. 참조 답변은 입력에 포함되지 않으므로
+    참고 정보를 그대로 옮겨 적는 후보가 높은 점수를 받지 않습니다. 세 문장 미만의 문서는 건너뜁니다.
+    """
+    rows = df.sample(n=min(size, len(df)), random_state=seed)['text'].tolist()
+    examples = []
+    for text in rows:
+        sentences = [part.strip() for part in re.split(r'(?<=[.?!])\s+|\n+', text.strip()) if part.strip()]
+        if len(sentences) < 3:
+            continue
+        question, answer = sentences[0][:300], sentences[1][:1000]
+        context = ' '.join(sentences[2:])[:2000]
+        examples.append(dspy.Example(question=question, context=context, answer=answer))
+    return examples
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r'\w+', (text or '').lower())
+
+def token_f1(example: dspy.Example, prediction: Any, trace=None) -> float:
+    """예측 답변과 참조 답변의 토큰 F1 (LM 호출 없는 결정적 지표)"""
+    answer = next((prediction.get(field) for field in ANSWER_FIELDS if prediction.get(field)), '') \
+        if hasattr(prediction, 'get') else str(prediction)
+    predicted, reference = _tokens(str(answer)), _tokens(example.answer)
+    if not predicted or not reference:
+        return 0.0
+    reference_counts = defaultdict(int)
+    for token in reference:
+        reference_counts[token] += 1
+    common = 0
+    for token in predicted:
+        if reference_counts[token] > 0:
+            reference_counts[token] -= 1
+            common += 1
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(predicted), common / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+def bootstrap_metric(example: dspy.Example, prediction: Any, trace=None) -> bool:
+    """부트스트랩용 통과/실패 지표 (토큰 하나만 겹쳐도 F1이 0보다 커서 실수 점수는 데모 선별에 부적합)"""
+    return token_f1(example, prediction, trace) >= OptimizeConfig.BOOTSTRAP_MIN_F1
+
+class ParallelEvaluator:
+    """(후보, 예제) 쌍을 스레드 풀에서 병렬 평가하고 점수를 저장하는 평가 엔진
+
+    한 번 평가한 쌍은 다시 실행하지 않으므로 successive halving의 다음 단계에서는
+    추가된 예제만 평가합니다.
+    """
+
+    def __init__(self, devset: Sequence[dspy.Example], metric: Callable, input_fields: Sequence[str],
+                 num_threads: int = OptimizeConfig.NUM_THREADS):
+        self.devset = list(devset)
+        self.metric = metric
+        self.input_fields = tuple(input_fields)
+        self.num_threads = num_threads
+        self.scores: Dict[Tuple[int, int], float] = {}
+        self.errors: Dict[Tuple[int, int], str] = {}
+
+    def _run_one(self, program: dspy.Module, example: dspy.Example) -> Tuple[float, Optional[str]]:
+        try:
+            prediction = program(**{field: example[field] for field in self.input_fields})
+            return float(self.metric(example, prediction)), None
+        except Exception as e:
+            return 0.0, str(e)
+
+    def evaluate(self, candidates: Sequence[dspy.Module], candidate_ids: Sequence[int],
+                 example_ids: Sequence[int]) -> Dict[int, float]:
+        """후보별로 주어진 예제에 대한 평균 점수 (아직 평가하지 않은 쌍만 실행)"""
+        pending = [(c, e) for c in candidate_ids for e in example_ids if (c, e) not in self.scores]
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+                # 각 작업에 현재 컨텍스트(dspy.context, 마감 시간 등)를 복사하여 전달
+                futures = {
+                    executor.submit(contextvars.copy_context().run, self._run_one, candidates[c], self.devset[e]): (c, e)
+                    for c, e in pending
+                }
+                for future, pair in futures.items():
+                    score, error = future.result()
+                    self.scores[pair] = score
+                    if error:
+                        self.errors[pair] = error
+        return {c: sum(self.scores[(c, e)] for e in example_ids) / max(len(example_ids), 1) for c in candidate_ids}
+
+    def successive_halving(self, candidates: Sequence[dspy.Module], min_examples: int = OptimizeConfig.MIN_EXAMPLES,
+                           eta: int = OptimizeConfig.ETA) -> Tuple[int, List[Dict[str, Any]]]:
+        """적은 예제로 모든 후보를 평가한 뒤 상위 1/eta만 남기고 예제를 eta배로 늘려 반복
+
+        명확히 뒤처진 후보는 전체 devset을 평가하기 전에 탈락하므로 평가 호출 수가 크게 줄어듭니다.
+        마지막 순위와 점수가 같은 후보는 함께 남깁니다.
+        """
+        alive = list(range(len(candidates)))
+        budget = min(min_examples, len(self.devset))
+        rungs = []
+        while True:
+            means = self.evaluate(candidates, alive, range(budget))
+            ranked = sorted(alive, key=lambda c: -means[c])
+            rungs.append({'examples': budget, 'scores': {c: means[c] for c in ranked}})
+            if len(alive) == 1 or budget >= len(self.devset):
+                return ranked[0], rungs
+            keep = max(1, math.ceil(len(alive) / eta))
+            cutoff = means[ranked[keep - 1]]
+            alive = [c for c in ranked if means[c] >= cutoff]
+            budget = min(budget * eta, len(self.devset))
+
+def propose_candidates(student: dspy.Module, trainset: List[dspy.Example], metric: Callable,
+                       num_candidates: int = OptimizeConfig.NUM_CANDIDATES,
+                       num_threads: int = OptimizeConfig.NUM_THREADS,
+                       seed: int = OptimizeConfig.SEED) -> List[Tuple[str, dspy.Module]]:
+    """DSPy 옵티마이저로 후보 프로그램 생성 (zero-shot, LabeledFewShot, 시드별 BootstrapFewShot)
+
+    부트스트랩은 후보마다 스레드에서 병렬로 실행하며, 같은 학습 예제에 대한 교사 호출은
+    SingleFlightLM에서 한 번만 전송됩니다.
+    """
+    candidates = [('zero-shot', student.deepcopy())]
+    if num_candidates > 1:
+        labeled = dspy.LabeledFewShot(k=OptimizeConfig.MAX_LABELED_DEMOS)
+        candidates.append(('labeled-fewshot', labeled.compile(student.deepcopy(), trainset=trainset)))
+
+    def bootstrap(index: int) -> Tuple[str, dspy.Module]:
+        shuffled = list(trainset)
+        random.Random(seed + index).shuffle(shuffled)
+        optimizer = dspy.BootstrapFewShot(metric=metric, max_bootstrapped_demos=OptimizeConfig.MAX_BOOTSTRAPPED_DEMOS,
+                                          max_labeled_demos=OptimizeConfig.MAX_LABELED_DEMOS, max_rounds=1)
+        return f'bootstrap-{seed + index}', optimizer.compile(student.deepcopy(), trainset=shuffled)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(num_threads, num_candidates))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, bootstrap, index)
+                   for index in range(max(num_candidates - len(candidates), 0))]
+        candidates.extend(future.result() for future in futures)
+    return candidates
+
+def create_program(name: str, script, snapshot: Optional[str] = None) -> dspy.Module:
+    """이미 로드한 스크립트 모듈로 최적화 대상 프로그램 생성 (rag는 검색기가 필요하므로 스냅샷이 있으면 복원)"""
+    if name == 'rag':
+        return script.build_rag(snapshot)
+    return script.TemplateBasedQA()
+
+def display_results(names: List[str], rungs: List[Dict[str, Any]], best: int, evaluator: ParallelEvaluator,
+                    lm: SingleFlightLM, elapsed: float) -> None:
+    print("\n" + "="*50)
+    print("🪜 Successive halving 단계별 점수")
+    for rung in rungs:
+        scores = ', '.join(f"{names[c]}={score:.3f}" for c, score in rung['scores'].items())
+        print(f"- 예제 {rung['examples']}개: {scores}")
+
+    full_grid = len(names) * len(evaluator.devset)
+    stats = lm.dedup_stats
+    print(f"\n🏆 최적 후보: {names[best]}")
+    print(f"📉 평가 실행: {len(evaluator.scores)}/{full_grid}쌍 (전체 평가 대비 {1 - len(evaluator.scores) / full_grid:.0%} 절감)")
+    print(f"🔁 LM 요청: {stats['requests']}건 중 실제 전송 {stats['sent']}건 "
+          f"(메모 재사용 {stats['memo_hits']}건, 진행 중 요청 합류 {stats['joined']}건)")
+    if evaluator.errors:
+        print(f"⚠️ 평가 실패: {len(evaluator.errors)}쌍 (예: {next(iter(evaluator.errors.values()))[:100]})")
+    print(f"⏱️ 소요 시간: {elapsed:.1f}초")
+    print("="*50)
+
+def main():
+    parser = argparse.ArgumentParser(description='QA 데이터셋으로 예제 프로그램의 후보를 병렬 평가하여 최적화')
+    parser.add_argument('--program', choices=sorted(PROGRAMS), default='template')
+    parser.add_argument('--candidates', type=int, default=OptimizeConfig.NUM_CANDIDATES)
+    parser.add_argument('--train-size', type=int, default=OptimizeConfig.TRAIN_SIZE)
+    parser.add_argument('--dev-size', type=int, default=OptimizeConfig.DEV_SIZE)
+    parser.add_argument('--threads', type=int, default=OptimizeConfig.NUM_THREADS)
+    parser.add_argument('--min-examples', type=int, default=OptimizeConfig.MIN_EXAMPLES)
+    parser.add_argument('--eta', type=int, default=OptimizeConfig.ETA)
+    parser.add_argument('--snapshot', help='rag 프로그램의 스냅샷 디렉토리 (retrieve-dspy.py --snapshot)')
+    parser.add_argument('--save', help='최적 후보를 저장할 경로 (.json)')
+    parser.add_argument('--base-url', help='OpenAI 호환 서버 주소 (지정 시 스크립트의 setup_environment 대신 사용)')
+    args = parser.parse_args()
+
+    script_name, input_fields = PROGRAMS[args.program]
+    # 스크립트 최상위 코드가 두 번 실행되지 않도록 한 번만 로드하여 환경 설정과 프로그램 생성에 재사용
+    script = load_script(script_name)
+    if args.base_url:
+        lm = SingleFlightLM('openai/mock-model', api_base=args.base_url, api_key='mock')
+    else:
+        script.setup_environment()
+        configured = dspy.settings.lm
+        lm = SingleFlightLM(configured.model, model_type=configured.model_type, cache=configured.cache,
+                            num_retries=configured.num_retries, **configured.kwargs)
+    dspy.configure(lm=lm)
+
+    # QA 데이터셋에서 학습/평가 예제 생성
+    loader = load_script('dataloader-dspy.py').CustomDataLoader()
+    dataset = loader.load_dataset('qa')
+    examples = build_examples(dataset['data'], args.train_size + args.dev_size)
+    examples = [example.with_inputs(*input_fields) for example in examples]
+    trainset, devset = examples[:args.train_size], examples[args.train_size:]
+    print(f"📚 학습 예제 {len(trainset)}개, 평가 예제 {len(devset)}개")
+
+    started = time.perf_counter()
+    student = create_program(args.program, script, args.snapshot)
+    proposals = propose_candidates(student, trainset, bootstrap_metric, args.candidates, args.threads)
+    names = [name for name, _ in proposals]
+    candidates = [program for _, program in proposals]
+    print(f"🧪 후보 {len(candidates)}개 생성: {', '.join(names)}")
+
+    evaluator = ParallelEvaluator(devset, token_f1, input_fields, args.threads)
+    best, rungs = evaluator.successive_halving(candidates, args.min_examples, args.eta)
+    display_results(names, rungs, best, evaluator, lm, time.perf_counter() - started)
+
+    if args.save:
+        candidates[best].save(args.save)
+        print(f"💾 최적 후보 저장: {args.save}")
+
+if __name__ == "__main__":
+    main()
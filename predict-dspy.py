@@ -1,12 +1,35 @@
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
-from typing import Literal
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM
+import argparse
+import json
+import time
+import uuid
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional
+
+# openai SDK는 배치 모드에서만 사용하므로 필요할 때 import합니다.
+if TYPE_CHECKING:
+    import openai
+
+class BatchAPIConfig:
+    """제공자 배치 API 설정 (야간 대량 처리용, 동기 호출보다 저렴)"""
+    COMPLETION_WINDOW = '24h'    # 배치 완료 허용 시간
+    POLL_INTERVAL = 30.0         # 상태 확인 간격(초)
+    WORK_DIR = 'batches'         # 배치 요청/결과 파일 저장 위치
+    FALLBACK_TO_SYNC = True      # 배치에서 실패한 항목은 동기 호출로 다시 처리
+    TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
 
 def setup_environment():
     """환경 설정 및 LM 초기화"""
     dotenv.load_dotenv()
-    lm = dspy.LM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    lm = CachedLM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
     dspy.configure(lm=lm)
 
 def create_sentiment_classifier():
@@ -28,6 +51,115 @@ def create_sentiment_classifier():
     
     return dspy.Predict(SentimentClassifier)
 
+def build_batch_file(predictor: dspy.Predict, inputs: List[Dict], lm: dspy.LM, path: str) -> int:
+    """각 호출을 어댑터로 메시지화하여 배치 요청 파일(JSONL) 생성, 요청 수 반환"""
+    adapter = dspy.settings.adapter or dspy.ChatAdapter()
+    provider, _, model = lm.model.partition('/')
+    if provider != 'openai':
+        raise ValueError(f"배치 API는 OpenAI 호환 모델만 지원합니다: {lm.model}")
+    # 연결 정보는 요청 본문이 아니라 클라이언트 설정에 사용
+    params = {k: v for k, v in lm.kwargs.items() if k not in ('api_key', 'api_base', 'base_url')}
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, kwargs in enumerate(inputs):
+            messages = adapter.format(predictor.signature, demos=predictor.demos, inputs=kwargs)
+            request = {
+                'custom_id': f'request-{i}',
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': {'model': model, 'messages': messages, **params}
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+    return len(inputs)
+
+def wait_for_batch(client: 'openai.OpenAI', batch_id: str, poll_interval: float = BatchAPIConfig.POLL_INTERVAL):
+    """배치가 종료 상태가 될 때까지 주기적으로 상태 확인"""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in BatchAPIConfig.TERMINAL_STATUSES:
+            return batch
+        counts = batch.request_counts
+        progress = f" ({counts.completed}/{counts.total})" if counts else ""
+        print(f"⏳ 배치 상태: {batch.status}{progress}")
+        time.sleep(poll_interval)
+
+def batch_predict(predictor: dspy.Predict, inputs: List[Dict], lm: Optional[dspy.LM] = None,
+                  client: Optional['openai.OpenAI'] = None,
+                  poll_interval: float = BatchAPIConfig.POLL_INTERVAL) -> List[dspy.Prediction]:
+    """N개의 predictor 호출을 하나의 배치 작업으로 제출하고 입력 순서대로 Prediction 반환
+
+    배치 요청은 단일 dspy.Predict의 시그니처로만 만들 수 있으므로, 다른 모듈은 배치를 건너뛴다고
+    알린 뒤 동기 호출로 처리합니다.
+    """
+    lm = lm or dspy.settings.lm
+    if not isinstance(predictor, dspy.Predict):
+        print(f"⚠️ 배치 API는 dspy.Predict만 지원하므로 {type(predictor).__name__} 호출 "
+              f"{len(inputs)}건은 배치를 건너뛰고 동기 호출로 처리합니다")
+        with dspy.context(lm=lm):
+            return [predictor(**kwargs) for kwargs in inputs]
+
+    import openai
+    adapter = dspy.settings.adapter or dspy.ChatAdapter()
+    client = client or openai.OpenAI(
+        api_key=lm.kwargs.get('api_key') or os.getenv('OPENAI_API_KEY'),
+        base_url=lm.kwargs.get('api_base') or lm.kwargs.get('base_url')
+    )
+
+    # 1. 요청 파일 생성 및 업로드
+    # 같은 초에 제출한 다른 배치의 요청 파일을 덮어쓰지 않도록 고유한 이름 사용
+    path = os.path.join(BatchAPIConfig.WORK_DIR, f"batch-{int(time.time())}-{uuid.uuid4().hex[:12]}.jsonl")
+    count = build_batch_file(predictor, inputs, lm, path)
+    with open(path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose='batch')
+
+    # 2. 배치 제출 및 완료 대기
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window=BatchAPIConfig.COMPLETION_WINDOW
+    )
+    print(f"📦 배치 제출 완료: {batch.id} ({count}건)")
+    batch = wait_for_batch(client, batch.id, poll_interval)
+    print(f"✅ 배치 종료: {batch.status}")
+
+    # 3. 결과를 custom_id로 원래 순서에 매핑
+    results: List[Optional[dspy.Prediction]] = [None] * count
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            index = int(record['custom_id'].rsplit('-', 1)[1])
+            response = record.get('response') or {}
+            if response.get('status_code') != 200:
+                continue
+            text = response['body']['choices'][0]['message']['content']
+            try:
+                results[index] = dspy.Prediction(**adapter.parse(predictor.signature, text))
+            except Exception as e:
+                print(f"⚠️ 배치 결과 파싱 실패 (항목 {index}): {str(e)}")
+
+    # 4. 실패한 항목 처리
+    failed = [i for i, result in enumerate(results) if result is None]
+    if failed:
+        if not BatchAPIConfig.FALLBACK_TO_SYNC:
+            raise RuntimeError(f"배치에서 {len(failed)}건이 실패했습니다: {failed[:10]}")
+        print(f"🔁 실패한 {len(failed)}건은 동기 호출로 다시 처리합니다")
+        with dspy.context(lm=lm):
+            for i in failed:
+                results[i] = predictor(**inputs[i])
+    return results
+
+def analyze_sentiments_batch(sentences: list[str], poll_interval: float = BatchAPIConfig.POLL_INTERVAL) -> None:
+    """배치 API로 문장 리스트의 감정을 분석하고 결과 출력"""
+    predictor = create_sentiment_classifier()
+    results = batch_predict(predictor, [{'text': sentence} for sentence in sentences], poll_interval=poll_interval)
+    
+    for sentence, result in zip(sentences, results):
+        print(f"문장: {sentence}")
+        print(f"감정: {result.sentiment}\n")
+
 def analyze_sentiments(sentences: list[str]) -> None:
     """문장 리스트의 감정을 분석하고 결과 출력"""
     predictor = create_sentiment_classifier()
@@ -38,6 +170,10 @@ def analyze_sentiments(sentences: list[str]) -> None:
         print(f"감정: {result.sentiment}\n")
 
 def main():
+    parser = argparse.ArgumentParser(description='감정 분류')
+    parser.add_argument('--batch', action='store_true', help='제공자 배치 API로 처리 (비대화형 대량 작업용)')
+    args = parser.parse_args()
+    
     # 환경 설정
     setup_environment()
     
@@ -49,7 +185,10 @@ def main():
     ]
     
     # 감정 분석 실행
-    analyze_sentiments(test_sentences)
+    if args.batch:
+        analyze_sentiments_batch(test_sentences)
+    else:
+        analyze_sentiments(test_sentences)
 
 if __name__ == "__main__":
     main()
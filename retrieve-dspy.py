@@ -1,17 +1,27 @@
 # pip install -U dspy-ai ujson rank_bm25
 
+import argparse
+import os
+import time
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM, display_cache_report
 import ujson
 from dspy.utils import download
 from dspy.retrieve import *
+from snapshot import load_snapshot, prefork, save_snapshot
 
 
 def setup_environment():
     """환경 설정 및 LM 초기화"""
     dotenv.load_dotenv()
-    lm = dspy.LM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    lm = CachedLM('openai/gpt-4o-mini', api_key=os.getenv('OPENAI_API_KEY'))
     dspy.configure(lm=lm)
 
 def setup_retriever():
@@ -47,30 +57,75 @@ class RAG(dspy.Module):
         context = self.retriever(question)
         return self.respond(context=context, question=question)
 
+def stream_answer(rag_module, query: str):
+    """답변을 생성하면서 response 필드의 부분 출력을 도착하는 대로 반환
+    
+    필드 경계는 StreamListener가 토큰 단위로 파싱하며,
+    마지막에는 전체 결과가 담긴 dspy.Prediction을 반환합니다.
+    """
+    listeners = [dspy.streaming.StreamListener(signature_field_name="response")]
+    stream_rag = dspy.streamify(rag_module, stream_listeners=listeners, async_streaming=False)
+    yield from stream_rag(question=query)
+
 def process_query(rag_module, query: str) -> None:
-    """쿼리 처리 및 결과 출력"""
+    """쿼리 처리 및 결과를 스트리밍 출력"""
     try:
-        result = rag_module(question=query)
-        
         print(f"\n🔍 검색 쿼리: {query}")
         print("\n💭 생성된 답변:")
-        print(result.answer)
-        print("\n" + "="*50)
+        
+        streamed = False
+        for output in stream_answer(rag_module, query):
+            if isinstance(output, dspy.streaming.StreamResponse):
+                print(output.chunk, end="", flush=True)
+                streamed = True
+            elif isinstance(output, dspy.Prediction) and not streamed:
+                # 캐시 적중 등으로 스트리밍되지 않은 경우 최종 결과를 한 번에 출력
+                print(output.response, end="")
+        
+        print("\n\n" + "="*50)
     
     except Exception as e:
         print(f"Error processing query '{query}': {e}")
         raise
 
+def build_rag(snapshot_dir: str = None) -> RAG:
+    """RAG 모듈 준비
+
+    snapshot_dir이 주어지면 저장된 스냅샷에서 복원하고(임베딩 재계산 없이 인덱스를 메모리 매핑),
+    스냅샷이 없으면 새로 초기화한 뒤 저장합니다.
+    """
+    start = time.perf_counter()
+    if snapshot_dir and os.path.exists(os.path.join(snapshot_dir, 'manifest.json')):
+        rag, adapter = load_snapshot(snapshot_dir)
+        dspy.configure(adapter=adapter)
+        print(f"⚡ 스냅샷 복원 완료: {snapshot_dir} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+        return rag
+
+    rag = RAG(setup_retriever())
+    print(f"🛠️ 초기화 완료 ({time.perf_counter() - start:.1f}초)")
+    if snapshot_dir:
+        save_snapshot(rag, snapshot_dir)
+        print(f"💾 스냅샷 저장: {snapshot_dir}")
+    return rag
+
+def run_worker(rag_module, index: int, workers: int, queries) -> None:
+    """prefork 워커: 자신에게 할당된 쿼리만 처리 (출력이 섞이지 않도록 스트리밍 없이 실행)"""
+    for query in queries[index::workers]:
+        result = rag_module(question=query)
+        print(f"\n👷 워커 {index} (pid {os.getpid()})\n🔍 검색 쿼리: {query}\n💭 생성된 답변: {result.response}")
+
 def main():
+    parser = argparse.ArgumentParser(description='Embeddings 검색기 기반 RAG 예제')
+    parser.add_argument('--snapshot', help='초기화된 프로그램 스냅샷 디렉토리 (없으면 생성)')
+    parser.add_argument('--workers', type=int, default=0, help='스냅샷을 공유하는 prefork 워커 수')
+    args = parser.parse_args()
+
     try:
         # 환경 설정
         setup_environment()
         
-        # 검색기 설정
-        retriever = setup_retriever()
-        
-        # RAG 모듈 초기화 (retriever 전달)
-        rag = RAG(retriever)
+        # RAG 모듈 초기화 (스냅샷이 있으면 복원)
+        rag = build_rag(args.snapshot)
         
         # 테스트 쿼리
         test_queries = [
@@ -79,9 +134,18 @@ def main():
             "깃허브에서 이미지 파일을 관리하는 방법은?"
         ]
         
-        # 각 쿼리에 대해 처리
-        for query in test_queries:
-            process_query(rag, query)
+        if args.workers > 0:
+            # 복원된 프로그램을 fork로 공유하여 워커별로 쿼리 분할 처리
+            codes = prefork(rag, lambda module, index: run_worker(module, index, args.workers, test_queries),
+                            args.workers)
+            print(f"\n✅ 워커 {len(codes)}개 종료 (실패 {sum(1 for code in codes if code != 0)}개)")
+        else:
+            # 각 쿼리에 대해 처리
+            for query in test_queries:
+                process_query(rag, query)
+        
+        # 워커들이 공유하는 디스크 계층의 누적 상태와 이 프로세스의 적중률
+        display_cache_report(dspy.settings.lm)
     
     except Exception as e:
         print(f"Error in main: {e}")
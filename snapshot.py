@@ -0,0 +1,261 @@
+import gc
+import hashlib
+import importlib
+import io
+import json
+import os
+import pickle
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cloudpickle
+import numpy as np
+
+import dspy
+from dspy.retrievers import Embeddings
+
+class SnapshotConfig:
+    """스냅샷 설정"""
+    SECRET_KWARGS = ('api_key',)   # 스냅샷에 저장하지 않는 인증 정보 (복원 시 환경 변수에서 읽음)
+    PROGRAM_FILE = 'program.pkl'
+    TEMPLATES_FILE = 'templates.json'
+    MANIFEST_FILE = 'manifest.json'
+
+def _safe_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in kwargs.items() if k not in SnapshotConfig.SECRET_KWARGS}
+
+class MappedCorpus(Sequence):
+    """오프셋 배열과 UTF-8 바이트 파일로 저장된 문서 목록을 메모리 매핑으로 읽는 읽기 전용 시퀀스
+
+    문서는 접근할 때만 디코딩하므로 프로세스마다 문자열 목록을 다시 만들지 않고,
+    매핑된 페이지는 같은 스냅샷을 연 모든 프로세스가 페이지 캐시로 공유합니다.
+    """
+
+    def __init__(self, directory: Path):
+        self.offsets = np.load(directory / 'corpus_offsets.npy', mmap_mode='r')
+        self.data = np.memmap(directory / 'corpus.bin', dtype=np.uint8, mode='r') \
+            if self.offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+
+    @staticmethod
+    def write(directory: Path, corpus: Sequence[str]) -> None:
+        encoded = [text.encode('utf-8') for text in corpus]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(directory / 'corpus_offsets.npy', offsets)
+        with open(directory / 'corpus.bin', 'wb') as f:
+            for b in encoded:
+                f.write(b)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return bytes(self.data[start:end]).decode('utf-8')
+
+def save_retriever(retriever: Embeddings, directory: Path) -> Dict[str, Any]:
+    """Embeddings 검색기의 임베딩 행렬, 문서, FAISS 인덱스를 메모리 매핑 가능한 파일로 저장"""
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / 'embeddings.npy', np.ascontiguousarray(retriever.corpus_embeddings, dtype=np.float32))
+    MappedCorpus.write(directory, retriever.corpus)
+    if retriever.index is not None:
+        import faiss
+        faiss.write_index(retriever.index, str(directory / 'index.faiss'))
+    return {'k': retriever.k, 'normalize': retriever.normalize}
+
+def load_retriever(directory: Path, meta: Dict[str, Any], embedder) -> Embeddings:
+    """저장된 검색기를 임베딩 재계산 없이 메모리 매핑으로 복원"""
+    retriever = Embeddings.__new__(Embeddings)
+    retriever.embedder = embedder
+    retriever.k = meta['k']
+    retriever.normalize = meta['normalize']
+    retriever.corpus = MappedCorpus(directory)
+    retriever.corpus_embeddings = np.load(directory / 'embeddings.npy', mmap_mode='r')
+    retriever.index = None
+    if (directory / 'index.faiss').exists():
+        import faiss
+        retriever.index = faiss.read_index(str(directory / 'index.faiss'), faiss.IO_FLAG_MMAP)
+    # Unbatchify는 백그라운드 스레드를 사용하므로 fork 후에도 동작하도록 단건 검색 함수로 대체
+    retriever.search_fn = lambda query: retriever._batch_forward([query])[0]
+    return retriever
+
+class _SnapshotPickler(cloudpickle.CloudPickler):
+    """검색기, LM, Embedder를 프로그램 본체와 분리하여 저장하는 피클러
+
+    - 검색기는 별도 디렉토리에 .npy 파일로 저장하여 복원 시 메모리 매핑합니다.
+    - LM/Embedder는 모델 이름과 설정만 저장하고, API 키는 복원 시 환경 변수에서 읽습니다.
+    """
+
+    def __init__(self, file, directory: Path):
+        super().__init__(file)
+        self.directory = directory
+        self.retrievers: Dict[int, str] = {}
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Embeddings):
+            name = self.retrievers.get(id(obj))
+            if name is None:
+                name = f"retriever_{len(self.retrievers)}"
+                self.retrievers[id(obj)] = name
+                meta = save_retriever(obj, self.directory / name)
+                return ('retriever', name, meta, self._embedder_state(obj.embedder))
+            return ('retriever', name, None, None)
+        if isinstance(obj, dspy.LM):
+            cls = type(obj)
+            # 기본 LM과 추가 생성 인자를 init_kwargs()로 알려주는 LM 하위 클래스(CachedLM 등)만 저장 가능
+            # (HedgedLM, ScheduledLM 등은 잠금/스레드 풀 같은 실행 상태를 가지므로 값으로 저장할 수 없음)
+            if cls is not dspy.LM and not hasattr(obj, 'init_kwargs'):
+                raise pickle.PicklingError(
+                    f"{cls.__qualname__}은 스냅샷으로 저장할 수 없습니다. "
+                    "init_kwargs()를 구현하거나 저장 전에 dspy.LM/CachedLM으로 교체하세요.")
+            return ('lm', obj.model, {
+                'model_type': obj.model_type,
+                'cache': obj.cache,
+                'cache_in_memory': obj.cache_in_memory,
+                'num_retries': obj.num_retries,
+                **_safe_kwargs(obj.kwargs),
+                **(obj.init_kwargs() if hasattr(obj, 'init_kwargs') else {})
+            }, f"{cls.__module__}:{cls.__qualname__}")
+        return None
+
+    @staticmethod
+    def _embedder_state(embedder) -> Any:
+        if isinstance(embedder, dspy.Embedder) and isinstance(embedder.model, str):
+            return ('embedder', embedder.model, embedder.batch_size, embedder.caching,
+                    _safe_kwargs(embedder.default_kwargs))
+        # 호출 가능한 객체로 만든 임베더는 값 그대로 저장
+        return ('pickled', cloudpickle.dumps(embedder))
+
+class _SnapshotUnpickler(cloudpickle.pickle.Unpickler):
+    def __init__(self, file, directory: Path):
+        super().__init__(file)
+        self.directory = directory
+        self.retrievers: Dict[str, Embeddings] = {}
+
+    def persistent_load(self, pid):
+        kind = pid[0]
+        if kind == 'lm':
+            _, model, kwargs, class_path = pid
+            module_name, class_name = class_path.split(':')
+            lm_class = getattr(importlib.import_module(module_name), class_name)
+            return lm_class(model, api_key=os.getenv('OPENAI_API_KEY'), **kwargs)
+        if kind == 'retriever':
+            _, name, meta, embedder_state = pid
+            if name not in self.retrievers:
+                self.retrievers[name] = load_retriever(self.directory / name, meta, self._load_embedder(embedder_state))
+            return self.retrievers[name]
+        raise cloudpickle.pickle.UnpicklingError(f"알 수 없는 persistent id: {kind}")
+
+    @staticmethod
+    def _load_embedder(state):
+        if state[0] == 'embedder':
+            _, model, batch_size, caching, kwargs = state
+            return dspy.Embedder(model, batch_size=batch_size, caching=caching,
+                                 api_key=os.getenv('OPENAI_API_KEY'), **kwargs)
+        return cloudpickle.loads(state[1])
+
+def _template_key(signature) -> str:
+    """시그니처의 필드 이름/설명/타입과 지시문으로 템플릿 캐시 키 생성"""
+    fields = [(name, field.json_schema_extra.get('desc'), field.json_schema_extra.get('prefix'), repr(field.annotation))
+              for name, field in {**signature.input_fields, **signature.output_fields}.items()]
+    return hashlib.sha1(repr((signature.instructions, fields)).encode('utf-8')).hexdigest()
+
+class TemplateCacheAdapter(dspy.ChatAdapter):
+    """시그니처별 시스템 메시지 구성 요소(필드 설명, 구조, 작업 설명)를 캐시하는 ChatAdapter
+
+    스냅샷에 미리 렌더링된 템플릿을 불러오면 복원된 워커는 첫 호출부터 템플릿을 다시 만들지 않습니다.
+    """
+
+    def __init__(self, templates: Optional[Dict[str, Dict[str, str]]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.templates: Dict[str, Dict[str, str]] = dict(templates or {})
+
+    def _cached(self, signature, part: str, render: Callable[[Any], str]) -> str:
+        entry = self.templates.setdefault(_template_key(signature), {})
+        if part not in entry:
+            entry[part] = render(signature)
+        return entry[part]
+
+    def format_field_description(self, signature) -> str:
+        return self._cached(signature, 'field_description', super().format_field_description)
+
+    def format_field_structure(self, signature) -> str:
+        return self._cached(signature, 'field_structure', super().format_field_structure)
+
+    def format_task_description(self, signature) -> str:
+        return self._cached(signature, 'task_description', super().format_task_description)
+
+def render_templates(program: dspy.Module, adapter: Optional[TemplateCacheAdapter] = None) -> Dict[str, Dict[str, str]]:
+    """프로그램의 모든 predictor 시그니처에 대한 템플릿을 미리 렌더링"""
+    adapter = adapter or TemplateCacheAdapter()
+    for _, predictor in program.named_predictors():
+        adapter.format_field_description(predictor.signature)
+        adapter.format_field_structure(predictor.signature)
+        adapter.format_task_description(predictor.signature)
+    return adapter.templates
+
+def save_snapshot(program: dspy.Module, path: str) -> Path:
+    """초기화가 끝난 프로그램(프롬프트, 데모, 어댑터 템플릿, 검색기 인덱스)을 디렉토리에 저장"""
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    buffer = io.BytesIO()
+    _SnapshotPickler(buffer, directory).dump(program)
+    (directory / SnapshotConfig.PROGRAM_FILE).write_bytes(buffer.getvalue())
+
+    with open(directory / SnapshotConfig.TEMPLATES_FILE, 'w', encoding='utf-8') as f:
+        json.dump(render_templates(program), f, ensure_ascii=False, indent=2)
+    with open(directory / SnapshotConfig.MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'program': type(program).__name__,
+            'dspy_version': dspy.__version__,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'predictors': [name for name, _ in program.named_predictors()]
+        }, f, ensure_ascii=False, indent=2)
+    return directory
+
+def load_snapshot(path: str) -> Tuple[dspy.Module, TemplateCacheAdapter]:
+    """스냅샷에서 프로그램과 템플릿이 채워진 어댑터 복원 (검색기 인덱스는 메모리 매핑)"""
+    directory = Path(path)
+    manifest = json.loads((directory / SnapshotConfig.MANIFEST_FILE).read_text(encoding='utf-8'))
+    if manifest['dspy_version'] != dspy.__version__:
+        print(f"⚠️ 스냅샷 dspy 버전({manifest['dspy_version']})과 현재 버전({dspy.__version__})이 다릅니다")
+
+    with open(directory / SnapshotConfig.PROGRAM_FILE, 'rb') as f:
+        program = _SnapshotUnpickler(f, directory).load()
+    templates = json.loads((directory / SnapshotConfig.TEMPLATES_FILE).read_text(encoding='utf-8'))
+    return program, TemplateCacheAdapter(templates)
+
+def prefork(program: dspy.Module, worker: Callable[[dspy.Module, int], None], workers: int) -> List[int]:
+    """복원된 프로그램을 공유하는 워커 프로세스를 fork로 실행하고 종료 코드 목록 반환
+
+    fork 전에 gc.freeze()로 현재 객체를 GC 추적 대상에서 제외하여, 자식 프로세스에서 GC가
+    읽기 전용 객체의 페이지를 건드려 copy-on-write 복사가 일어나지 않도록 합니다.
+    """
+    # 부모의 출력 버퍼가 자식에 복제되어 중복 출력되지 않도록 fork 전에 비움
+    sys.stdout.flush()
+    sys.stderr.flush()
+    gc.collect()
+    gc.freeze()
+    pids = []
+    for index in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                worker(program, index)
+            except BaseException as e:
+                print(f"❌ 워커 {index} 실패: {str(e)}")
+                code = 1
+            finally:
+                # os._exit는 버퍼를 비우지 않으므로 파일/파이프로 보낸 워커 출력이 사라지지 않게 먼저 비움
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        pids.append(pid)
+    gc.unfreeze()
+    return [os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) for pid in pids]
@@ -1,12 +1,74 @@
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
 import dspy
 import dotenv
-import os
+from http_pool import configure_http_pool, warm_up
+from lm_cache import CachedLM
+import hashlib
+from typing import Any, Dict, List
+
+class PrefixCacheAdapter(dspy.ChatAdapter):
+    """프롬프트 접두부 캐시 친화적 어댑터
+    
+    지시문, 필드 설명, 출력 형식 안내, few-shot 데모 등 고정 내용은 매 호출마다 바이트 단위로
+    동일한 접두부에 두고, 가변 입력만 마지막 사용자 메시지에 배치합니다.
+    이렇게 하면 제공자의 프롬프트 캐싱(OpenAI 자동 캐싱, Anthropic cache_control)이나
+    로컬 서버의 KV 접두부 재사용이 적용되며, 호출별 캐시 적중 토큰 수를 기록합니다.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.call_reports: List[Dict[str, Any]] = []
+    
+    def user_message_output_requirements(self, signature):
+        # 출력 형식 안내는 고정 내용이므로 마지막 메시지가 아닌 시스템 메시지에 둡니다.
+        return None
+    
+    def format(self, signature, demos, inputs):
+        messages = super().format(signature, demos, inputs)
+        output_requirements = super().user_message_output_requirements(signature)
+        messages[0]["content"] = f"{messages[0]['content']}\n\n{output_requirements}"
+        return messages
+    
+    def __call__(self, lm, lm_kwargs, signature, demos, inputs):
+        if lm.model.startswith('anthropic/'):
+            # Anthropic은 명시적인 cache_control 표시가 있어야 접두부를 캐시합니다.
+            lm_kwargs = {**lm_kwargs, 'cache_control_injection_points': [{'location': 'message', 'role': 'system'}]}
+        
+        history_size = len(lm.history)
+        outputs = super().__call__(lm, lm_kwargs, signature, demos, inputs)
+        
+        # 새로 추가된 호출 기록에서 캐시 적중 접두부 토큰 수 집계
+        for entry in lm.history[history_size:]:
+            prefix = entry["messages"][:-1]
+            usage = entry.get("usage") or {}
+            self.call_reports.append({
+                'signature': signature.__name__,
+                'prefix_hash': hashlib.sha256(repr(prefix).encode()).hexdigest()[:12],
+                'prompt_tokens': usage.get('prompt_tokens', 0),
+                'cached_prefix_tokens': cached_prompt_tokens(usage),
+            })
+        return outputs
+
+def cached_prompt_tokens(usage: Dict[str, Any]) -> int:
+    """제공자별 사용량 정보에서 캐시 적중 프롬프트 토큰 수 추출"""
+    details = usage.get('prompt_tokens_details')
+    if details is not None:
+        cached = details.get('cached_tokens') if isinstance(details, dict) else getattr(details, 'cached_tokens', None)
+        if cached:
+            return cached
+    # Anthropic은 캐시에서 읽은 입력 토큰을 별도 항목으로 보고합니다.
+    return usage.get('cache_read_input_tokens') or 0
 
 def setup_environment():
     """환경 설정 및 LM 초기화"""
     dotenv.load_dotenv()
-    lm = dspy.LM('openai/gpt-4-turbo', api_key=os.getenv('OPENAI_API_KEY'))
-    dspy.configure(lm=lm)
+    # 프로세스 공용 HTTP 연결 풀 설정 및 연결 예열
+    configure_http_pool()
+    warm_up()
+    lm = CachedLM('openai/gpt-4-turbo', api_key=os.getenv('OPENAI_API_KEY'))
+    dspy.configure(lm=lm, adapter=PrefixCacheAdapter())
 
 class QuestionAnswerSignature(dspy.Signature):
     """질문-답변을 위한 시그니처"""
@@ -55,31 +117,59 @@ class TemplateBasedQA(dspy.Module):
             detailed_answer=detailed_response.detailed_answer
         )
         
-        return {
-            'question': question,
-            'detailed_answer': detailed_response.detailed_answer,
-            'summary': summary_response.summary
-        }
+        # 스트리밍 시 최종 결과로 전달될 수 있도록 Prediction으로 반환 (딕셔너리처럼 접근 가능)
+        return dspy.Prediction(
+            question=question,
+            detailed_answer=detailed_response.detailed_answer,
+            summary=summary_response.summary
+        )
+
+def stream_answer(qa_module, query: str, context: str = ""):
+    """상세 답변과 요약의 부분 출력을 생성되는 대로 반환
+    
+    필드 경계는 StreamListener가 토큰 단위로 파싱하며,
+    마지막에는 전체 결과가 담긴 dspy.Prediction을 반환합니다.
+    """
+    listeners = [
+        dspy.streaming.StreamListener(signature_field_name="detailed_answer", predict=qa_module.generate_detailed),
+        dspy.streaming.StreamListener(signature_field_name="summary", predict=qa_module.generate_summary),
+    ]
+    stream_qa = dspy.streamify(qa_module, stream_listeners=listeners, async_streaming=False)
+    yield from stream_qa(question=query, context=context)
 
 def process_query(qa_module, query: str, context: str = "") -> None:
-    """쿼리 처리 및 결과 출력"""
+    """쿼리 처리 및 결과를 스트리밍 출력"""
     try:
-        result = qa_module(question=query, context=context)
-        
         print(f"\n❓ 질문:")
-        print(result['question'])
+        print(query)
         
         if context:
             print(f"\n📚 참고 정보:")
             print(context)
         
-        print(f"\n💭 상세 답변:")
-        print(result['detailed_answer'])
+        headers = {'detailed_answer': "\n💭 상세 답변:", 'summary': "\n\n📌 요약:"}
+        streamed = set()
+        for output in stream_answer(qa_module, query, context):
+            if isinstance(output, dspy.streaming.StreamResponse):
+                if output.signature_field_name not in streamed:
+                    print(headers[output.signature_field_name])
+                    streamed.add(output.signature_field_name)
+                print(output.chunk, end="", flush=True)
+            elif isinstance(output, dspy.Prediction):
+                # 캐시 적중 등으로 스트리밍되지 않은 필드는 최종 결과에서 출력
+                for field, header in headers.items():
+                    if field not in streamed:
+                        print(header)
+                        print(output[field], end="")
         
-        print(f"\n📌 요약:")
-        print(result['summary'])
+        # 호출별 프롬프트 캐시 적중 토큰 수 출력
+        adapter = dspy.settings.adapter
+        if isinstance(adapter, PrefixCacheAdapter):
+            for report in adapter.call_reports:
+                print(f"\n🗂️ 캐시 적중 접두부 토큰: {report['cached_prefix_tokens']}/{report['prompt_tokens']} (접두부 {report['prefix_hash']})")
+            adapter.call_reports.clear()
         
-        print("\n" + "="*50)
+        print("\n\n" + "="*50)
     
     except Exception as e:
         print(f"Error processing query '{query}': {e}")
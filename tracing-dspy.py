@@ -0,0 +1,241 @@
+import os
+# litellm이 import 시점에 원격 모델 가격표를 동기로 내려받지 않도록 설정 (시작 시간 단축)
+os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
+import dspy
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from dspy.utils.callback import ACTIVE_CALL_ID, BaseCallback
+
+class TracingConfig:
+    """트레이싱 설정"""
+    SAMPLE_RATE = 1.0                    # 루트 호출 단위 샘플링 비율 (0~1)
+    OUTPUT_PATH = 'traces/spans.jsonl'   # 스팬 저장 경로
+    OUTPUT_FORMAT = 'jsonl'              # jsonl 또는 otlp (OpenTelemetry OTLP/JSON)
+    SERVICE_NAME = 'dspy-examples'
+
+class JSONLSpanExporter:
+    """완료된 트레이스의 스팬을 한 줄에 하나씩 JSONL 파일에 기록"""
+
+    def __init__(self, path: str = TracingConfig.OUTPUT_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        lines = ''.join(json.dumps(span, ensure_ascii=False, default=str) + '\n' for span in spans)
+        with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+class OTLPJSONSpanExporter(JSONLSpanExporter):
+    """트레이스별로 OpenTelemetry OTLP/JSON(ExportTraceServiceRequest) 한 줄씩 기록
+
+    OpenTelemetry Collector의 otlpjsonfile 리시버 등으로 그대로 수집할 수 있는 형식입니다.
+    """
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {'key': key, 'value': {'boolValue': value}}
+        if isinstance(value, int):
+            return {'key': key, 'value': {'intValue': str(value)}}
+        if isinstance(value, float):
+            return {'key': key, 'value': {'doubleValue': value}}
+        return {'key': key, 'value': {'stringValue': str(value)}}
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        otlp_spans = [{
+            'traceId': span['trace_id'],
+            'spanId': span['span_id'],
+            'parentSpanId': span['parent_span_id'] or '',
+            'name': span['name'],
+            'kind': 1,
+            'startTimeUnixNano': str(span['start_ns']),
+            'endTimeUnixNano': str(span['end_ns']),
+            'attributes': [self._attribute(k, v) for k, v in span['attributes'].items()],
+            'status': {'code': 2, 'message': span['error']} if span['error'] else {'code': 1},
+        } for span in spans]
+        request = {'resourceSpans': [{
+            'resource': {'attributes': [self._attribute('service.name', TracingConfig.SERVICE_NAME)]},
+            'scopeSpans': [{'scope': {'name': 'dspy.tracing'}, 'spans': otlp_spans}],
+        }]}
+        with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+
+class ModuleTracer(BaseCallback):
+    """dspy.Module 하위 호출별 지연 시간·토큰·캐시 적중을 기록하는 저오버헤드 트레이서
+
+    - 모듈/LM/도구 호출마다 스팬을 만들고 호출 계층(부모-자식)을 유지합니다.
+    - LM 스팬에는 지연 시간, 프롬프트/완성 토큰 수, 캐시 적중 여부를 기록합니다.
+    - 샘플링은 루트 호출 단위로 결정하며, 샘플링되지 않은 트레이스는 딕셔너리 조회 외 작업을 하지 않습니다.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = TracingConfig.SAMPLE_RATE):
+        self.exporter = exporter or JSONLSpanExporter()
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+        self.open_spans: Dict[str, Dict[str, Any]] = {}
+        self.lm_instances: Dict[str, Any] = {}
+        self.unsampled: set = set()
+        self.traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.summary: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def _start_span(self, call_id: str, name: str, kind: str, attributes: Optional[Dict] = None) -> None:
+        parent_id = ACTIVE_CALL_ID.get()
+        if parent_id in self.unsampled:
+            self.unsampled.add(call_id)
+            return
+
+        parent = self.open_spans.get(parent_id)
+        if parent is None:
+            # 새 루트 호출: 여기서 트레이스 전체의 샘플링 여부 결정
+            if random.random() >= self.sample_rate:
+                self.unsampled.add(call_id)
+                return
+            trace_id = os.urandom(16).hex()
+        else:
+            trace_id = parent['trace_id']
+
+        self.open_spans[call_id] = {
+            'trace_id': trace_id,
+            'span_id': call_id[:16],
+            'parent_span_id': parent['span_id'] if parent else None,
+            'name': name,
+            'kind': kind,
+            'start_ns': time.time_ns(),
+            'start': time.perf_counter(),
+            'attributes': attributes or {},
+            'error': None,
+        }
+
+    def _end_span(self, call_id: str, exception: Optional[Exception]) -> Optional[Dict[str, Any]]:
+        if call_id in self.unsampled:
+            self.unsampled.discard(call_id)
+            return None
+        span = self.open_spans.pop(call_id, None)
+        if span is None:
+            return None
+
+        span['end_ns'] = time.time_ns()
+        span['duration_ms'] = (time.perf_counter() - span.pop('start')) * 1000
+        if exception is not None:
+            span['error'] = f"{type(exception).__name__}: {exception}"
+
+        with self.lock:
+            trace = self.traces[span['trace_id']]
+            trace.append(span)
+            stats = self.summary[span['name']]
+            stats['count'] += 1
+            stats['total_ms'] += span['duration_ms']
+            stats['prompt_tokens'] += span['attributes'].get('lm.prompt_tokens', 0)
+            stats['completion_tokens'] += span['attributes'].get('lm.completion_tokens', 0)
+            stats['cache_hits'] += span['attributes'].get('lm.cache_hit', False)
+            finished = span['parent_span_id'] is None
+            if finished:
+                self.traces.pop(span['trace_id'])
+
+        if finished:
+            self.exporter.export(trace)
+        return span
+
+    def on_module_start(self, call_id, instance, inputs):
+        name = type(instance).__name__
+        signature = getattr(instance, 'signature', None)
+        if signature is not None and isinstance(instance, dspy.Predict):
+            name = f"{name}({signature.__name__})"
+        self._start_span(call_id, name, 'module')
+
+    def on_module_end(self, call_id, outputs, exception=None):
+        self._end_span(call_id, exception)
+
+    def on_lm_start(self, call_id, instance, inputs):
+        self._start_span(call_id, f"LM({instance.model})", 'lm', {'lm.model': instance.model})
+        if call_id in self.open_spans:
+            self.lm_instances[call_id] = (instance, len(instance.history))
+
+    def on_lm_end(self, call_id, outputs, exception=None):
+        instance, history_size = self.lm_instances.pop(call_id, (None, 0))
+        span = self.open_spans.get(call_id)
+        if span is not None and instance is not None and len(instance.history) > history_size:
+            entry = instance.history[-1]
+            usage = entry.get('usage') or {}
+            span['attributes'].update({
+                'lm.prompt_tokens': usage.get('prompt_tokens', 0),
+                'lm.completion_tokens': usage.get('completion_tokens', 0),
+                # DSPy 캐시 적중 시에는 실제 호출이 없으므로 사용량이 비어 있습니다.
+                'lm.cache_hit': bool(getattr(entry.get('response'), 'cache_hit', False)) or not usage,
+            })
+        self._end_span(call_id, exception)
+
+    def on_tool_start(self, call_id, instance, inputs):
+        self._start_span(call_id, f"Tool({instance.name})", 'tool')
+
+    def on_tool_end(self, call_id, outputs, exception=None):
+        self._end_span(call_id, exception)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """스팬 이름별 호출 수, 평균 지연, 토큰, 캐시 적중 집계"""
+        with self.lock:
+            return {
+                name: {**stats, 'avg_ms': stats['total_ms'] / stats['count']}
+                for name, stats in self.summary.items()
+            }
+
+class TracedRetriever:
+    """검색기 호출을 Retrieval 스팬으로 기록하는 래퍼 (검색기는 콜백을 지원하지 않으므로)"""
+
+    def __init__(self, retriever, tracer: ModuleTracer):
+        self.retriever = retriever
+        self.tracer = tracer
+
+    def __call__(self, query, *args, **kwargs):
+        call_id = os.urandom(16).hex()
+        self.tracer._start_span(call_id, f"Retrieval({type(self.retriever).__name__})", 'retrieval')
+        exception = None
+        try:
+            return self.retriever(query, *args, **kwargs)
+        except Exception as e:
+            exception = e
+            raise
+        finally:
+            self.tracer._end_span(call_id, exception)
+
+def display_report(tracer: ModuleTracer) -> None:
+    """스팬 이름별 집계 출력"""
+    print("\n" + "="*50)
+    print("📊 모듈별 트레이싱 요약")
+    for name, stats in sorted(tracer.report().items(), key=lambda item: -item[1]['total_ms']):
+        print(f"- {name}: {int(stats['count'])}회, 평균 {stats['avg_ms']:.1f}ms, "
+              f"토큰 {int(stats['prompt_tokens'])}+{int(stats['completion_tokens'])}, "
+              f"캐시 적중 {int(stats['cache_hits'])}회")
+    print("="*50)
+
+def main():
+    from rag_with_signature import RAG, process_query, setup_environment, setup_retriever
+
+    # 환경 설정
+    setup_environment()
+
+    # 트레이서 등록 (전역 콜백)
+    exporter = OTLPJSONSpanExporter() if TracingConfig.OUTPUT_FORMAT == 'otlp' else JSONLSpanExporter()
+    tracer = ModuleTracer(exporter=exporter)
+    dspy.configure(callbacks=[tracer])
+
+    # 검색 시간도 별도 스팬으로 기록
+    rag = RAG(TracedRetriever(setup_retriever(), tracer))
+
+    test_queries = [
+        "인공지능의 윤리적 문제점은 무엇인가요?",
+        "클라우드 컴퓨팅의 장단점은?"
+    ]
+    for query in test_queries:
+        process_query(rag, query)
+
+    display_report(tracer)
+    print(f"💾 스팬 저장 위치: {exporter.path}")
+
+if __name__ == "__main__":
+    main()